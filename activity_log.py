@@ -0,0 +1,135 @@
+"""Batched activity log for the admin chat.
+
+Handlers record events with log_activity(), which never waits on the Bot
+API. A background task sends everything queued as digest messages every
+ACTIVITY_LOG_FLUSH_INTERVAL seconds, spacing messages to stay under
+Telegram's per-chat flood limits. Events recorded for the same update are
+merged into one line. When too many events are waiting, the overflow is
+appended to ACTIVITY_LOG_SPILL_PATH instead of growing memory.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from telegram.error import RetryAfter
+
+from config import (
+    LOG_CHAT_ID,
+    ACTIVITY_LOG_FLUSH_INTERVAL,
+    ACTIVITY_LOG_MAX_PENDING,
+    ACTIVITY_LOG_MIN_SEND_INTERVAL,
+    ACTIVITY_LOG_SPILL_PATH,
+)
+
+# Telegram rejects messages longer than this
+MAX_MESSAGE_LENGTH = 4096
+
+# Event key (update id) -> [time, user label, actions], oldest first
+_pending = OrderedDict()
+_activity_stats = {"recorded": 0, "merged": 0, "sent_messages": 0, "spilled": 0, "failed": 0}
+_flusher_task = None
+_last_send = 0.0
+
+def _spill(line: str):
+    try:
+        with open(ACTIVITY_LOG_SPILL_PATH, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+    except OSError as e:
+        print(f"Error spilling activity log: {e}")
+    _activity_stats["spilled"] += 1
+
+def _format(event) -> str:
+    now, user_label, actions = event
+    return f"[{now}] User {user_label} {'; '.join(actions)}"
+
+def log_activity(key, user_label: str, action: str):
+    """Queue an event without waiting; events with the same key share a line"""
+    if not LOG_CHAT_ID:
+        return
+    _activity_stats["recorded"] += 1
+    event = _pending.get(key)
+    if event is not None:
+        if action not in event[2]:
+            event[2].append(action)
+        _activity_stats["merged"] += 1
+        return
+
+    now = datetime.now().strftime("%d/%m/%Y %H:%M")
+    _pending[key] = [now, user_label, [action]]
+    if len(_pending) > ACTIVITY_LOG_MAX_PENDING:
+        _, oldest = _pending.popitem(last=False)
+        _spill(_format(oldest))
+
+def _digests(lines):
+    """Pack lines into as few messages as Telegram's length limit allows"""
+    header = f"SurfSol Casino Bot, activity ({len(lines)} events)"
+    message = header
+    for line in lines:
+        line = line[:MAX_MESSAGE_LENGTH - len(header) - 1]
+        if len(message) + 1 + len(line) > MAX_MESSAGE_LENGTH:
+            yield message
+            message = header
+        message += "\n" + line
+    yield message
+
+async def _send(bot, text: str):
+    global _last_send
+    while True:
+        wait = _last_send + ACTIVITY_LOG_MIN_SEND_INTERVAL - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        _last_send = time.monotonic()
+        try:
+            await bot.send_message(chat_id=LOG_CHAT_ID, text=text)
+            _activity_stats["sent_messages"] += 1
+            return
+        except RetryAfter as e:
+            retry_after = e.retry_after
+            if isinstance(retry_after, timedelta):
+                retry_after = retry_after.total_seconds()
+            await asyncio.sleep(retry_after)
+        except Exception as e:
+            _activity_stats["failed"] += 1
+            print(f"Failed to send activity digest: {e}")
+            return
+
+async def flush_activity_log(bot):
+    """Send everything queued so far"""
+    if not _pending:
+        return
+    lines = [_format(event) for event in _pending.values()]
+    _pending.clear()
+    for text in _digests(lines):
+        await _send(bot, text)
+
+async def _flusher(bot):
+    while True:
+        await asyncio.sleep(ACTIVITY_LOG_FLUSH_INTERVAL)
+        try:
+            await flush_activity_log(bot)
+        except Exception as e:
+            print(f"Error flushing activity log: {e}")
+
+def start_activity_log(bot):
+    """Start the background digest sender (idempotent)"""
+    global _flusher_task
+    if _flusher_task is None:
+        _flusher_task = asyncio.create_task(_flusher(bot))
+
+async def stop_activity_log(bot):
+    """Stop the sender and flush what is left; call on shutdown"""
+    global _flusher_task
+    if _flusher_task is not None:
+        _flusher_task.cancel()
+        try:
+            await _flusher_task
+        except asyncio.CancelledError:
+            pass
+        _flusher_task = None
+    await flush_activity_log(bot)
+
+def get_activity_log_stats() -> dict:
+    stats = dict(_activity_stats)
+    stats["pending"] = len(_pending)
+    return stats
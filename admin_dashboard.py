@@ -1,58 +1,179 @@
 import sqlite3
 import uvicorn
-from fastapi import FastAPI, Request, Form
+from fastapi import FastAPI, Request, Form, Cookie, Depends, HTTPException
 from fastapi.responses import HTMLResponse
 from fastapi.templating import Jinja2Templates
-from database import get_pending_withdrawals, approve_withdrawal, reject_withdrawal
-from config import BOT_TOKEN
+from async_db import get_pending_withdrawals, count_pending_withdrawals, get_metric_series, get_metric_gauges, get_db_profile, approve_withdrawal, reject_withdrawal, approve_withdrawals, reject_withdrawals
+from config import BOT_TOKEN, ADMIN_PAGE_SIZE, ADMIN_BULK_MAX
 import hmac
 import hashlib
+from typing import List, Optional
 from urllib.parse import parse_qs
+from pydantic import BaseModel
+
+class WithdrawalIdsRequest(BaseModel):
+    ids: List[int]
 
 app = FastAPI()
 templates = Jinja2Templates(directory="admin_templates")
 
 DB_NAME = "zolt.db"
+SESSION_COOKIE = "admin_session"
+# Set at login, checked by every action; changes whenever BOT_TOKEN does
+SESSION_TOKEN = hmac.new(BOT_TOKEN.encode(), b"admin-session", hashlib.sha256).hexdigest()
 
 def verify_admin_password(password: str) -> bool:
     """Simple password verification (in production, use proper auth)"""
     # Use bot token as a simple password check (you should change this)
     return password == BOT_TOKEN
 
+def require_admin(admin_session: Optional[str] = Cookie(None)):
+    """Dependency: the request comes from a logged-in admin browser"""
+    if not admin_session or not hmac.compare_digest(admin_session, SESSION_TOKEN):
+        raise HTTPException(status_code=401, detail="Not logged in")
+
+async def _page(before: Optional[int], limit: int):
+    """A page of the queue plus the id to continue from (None on the last page)"""
+    limit = max(1, min(limit, ADMIN_BULK_MAX))
+    withdrawals = await get_pending_withdrawals(limit, before)
+    next_before = withdrawals[-1]["id"] if len(withdrawals) == limit else None
+    return withdrawals, next_before
+
+# (metric, chart label, whether it carries a SOL amount)
+METRICS = [
+    ("deposits", "Deposits", True),
+    ("new_users", "New users", False),
+    ("withdrawals_requested", "Withdrawals requested", True),
+    ("withdrawals_approved", "Withdrawals approved", True),
+    ("withdrawals_rejected", "Withdrawals rejected", True),
+]
+# Bucket size -> number of buckets charted
+METRIC_WINDOWS = {"minute": 60, "hour": 24, "day": 30}
+
+def _check_bucket(bucket: str):
+    if bucket not in METRIC_WINDOWS:
+        raise HTTPException(status_code=400, detail=f"bucket must be one of {', '.join(METRIC_WINDOWS)}")
+
+async def _metrics(bucket: str) -> dict:
+    """Template context for the metrics panel, read from the rollups only"""
+    _check_bucket(bucket)
+    data = await get_metric_series(bucket, METRIC_WINDOWS[bucket])
+    today = (await get_metric_series("day", 1))["series"]
+    gauges = await get_metric_gauges()
+    empty = {"count": [0] * len(data["starts"]), "total": [0.0] * len(data["starts"])}
+    charts = []
+    for name, label, has_amount in METRICS:
+        values = data["series"].get(name, empty)
+        peak = max(values["count"]) or 1
+        charts.append({
+            "label": label,
+            "has_amount": has_amount,
+            "count": sum(values["count"]),
+            "total": sum(values["total"]),
+            "points": [
+                {"start": start, "count": count, "total": total, "height": round(100 * count / peak)}
+                for start, count, total in zip(data["starts"], values["count"], values["total"])
+            ],
+        })
+    return {
+        "bucket": bucket,
+        "buckets": list(METRIC_WINDOWS),
+        "windows": METRIC_WINDOWS,
+        "charts": charts,
+        "pending": gauges.get("pending_withdrawals", {"count": 0, "total": 0}),
+        "today": {
+            name: {"count": today[name]["count"][0], "total": today[name]["total"][0]} if name in today else {"count": 0, "total": 0}
+            for name, _, _ in METRICS
+        },
+    }
+
+async def _dashboard(request: Request, message: str = None):
+    withdrawals, next_before = await _page(None, ADMIN_PAGE_SIZE)
+    return templates.TemplateResponse(request, "dashboard.html", {
+        **await _metrics("hour"),
+        "pending_withdrawals": withdrawals,
+        "pending_count": await count_pending_withdrawals(),
+        "next_before": next_before,
+        "db_profile": await get_db_profile(),
+        "message": message
+    })
+
 @app.get("/", response_class=HTMLResponse)
 async def login_page(request: Request):
-    return templates.TemplateResponse("login.html", {"request": request})
+    return templates.TemplateResponse(request, "login.html")
 
 @app.post("/login")
 async def login(request: Request, password: str = Form(...)):
     if verify_admin_password(password):
-        return templates.TemplateResponse("dashboard.html", {
-            "request": request,
-            "pending_withdrawals": get_pending_withdrawals()
-        })
+        response = await _dashboard(request)
+        response.set_cookie(SESSION_COOKIE, SESSION_TOKEN, httponly=True, samesite="strict")
+        return response
     else:
-        return templates.TemplateResponse("login.html", {
-            "request": request,
+        return templates.TemplateResponse(request, "login.html", {
             "error": "Invalid password"
         })
 
-@app.post("/approve/{withdrawal_id}")
+@app.post("/approve/{withdrawal_id}", dependencies=[Depends(require_admin)])
 async def approve(withdrawal_id: int, request: Request):
-    approve_withdrawal(withdrawal_id)
-    return templates.TemplateResponse("dashboard.html", {
-        "request": request,
-        "pending_withdrawals": get_pending_withdrawals(),
-        "message": f"Withdrawal {withdrawal_id} approved"
-    })
+    await approve_withdrawal(withdrawal_id)
+    return await _dashboard(request, f"Withdrawal {withdrawal_id} approved")
 
-@app.post("/reject/{withdrawal_id}")
+@app.post("/reject/{withdrawal_id}", dependencies=[Depends(require_admin)])
 async def reject(withdrawal_id: int, request: Request):
-    reject_withdrawal(withdrawal_id)
-    return templates.TemplateResponse("dashboard.html", {
-        "request": request,
-        "pending_withdrawals": get_pending_withdrawals(),
-        "message": f"Withdrawal {withdrawal_id} rejected"
+    await reject_withdrawal(withdrawal_id)
+    return await _dashboard(request, f"Withdrawal {withdrawal_id} rejected")
+
+@app.get("/api/withdrawals", dependencies=[Depends(require_admin)])
+async def list_withdrawals(before: Optional[int] = None, limit: int = ADMIN_PAGE_SIZE):
+    """Pending withdrawals, newest first; pass next_before back as `before` for the next page"""
+    withdrawals, next_before = await _page(before, limit)
+    return {"withdrawals": withdrawals, "next_before": next_before}
+
+@app.get("/fragments/withdrawals", response_class=HTMLResponse, dependencies=[Depends(require_admin)])
+async def withdrawal_rows(request: Request, before: Optional[int] = None, limit: int = ADMIN_PAGE_SIZE):
+    """The next page as table rows, for appending to the dashboard"""
+    withdrawals, next_before = await _page(before, limit)
+    response = templates.TemplateResponse(request, "withdrawal_rows.html", {
+        "pending_withdrawals": withdrawals
     })
+    if next_before is not None:
+        response.headers["X-Next-Before"] = str(next_before)
+    return response
+
+@app.get("/api/metrics", dependencies=[Depends(require_admin)])
+async def metrics(bucket: str = "hour"):
+    """Rollup series for the last window of `bucket`s plus current gauges"""
+    _check_bucket(bucket)
+    return {**await get_metric_series(bucket, METRIC_WINDOWS[bucket]), "gauges": await get_metric_gauges()}
+
+@app.get("/fragments/metrics", response_class=HTMLResponse, dependencies=[Depends(require_admin)])
+async def metrics_panel(request: Request, bucket: str = "hour"):
+    """The metrics panel alone, re-rendered for another window"""
+    return templates.TemplateResponse(request, "metrics_panel.html", await _metrics(bucket))
+
+@app.get("/api/db-profile", dependencies=[Depends(require_admin)])
+async def db_profile(minutes: int = 60):
+    """Per-function database timings saved by profiled processes in the last `minutes`"""
+    if minutes <= 0:
+        raise HTTPException(status_code=400, detail="minutes must be positive")
+    return {"functions": await get_db_profile(minutes)}
+
+async def _decide(ids: List[int], decide):
+    if not ids or len(ids) > ADMIN_BULK_MAX:
+        raise HTTPException(status_code=400, detail=f"Send between 1 and {ADMIN_BULK_MAX} ids")
+    processed = await decide(ids)
+    done = set(processed)
+    return {"processed": processed, "skipped": sorted(set(ids) - done)}
+
+@app.post("/api/withdrawals/approve", dependencies=[Depends(require_admin)])
+async def approve_many(request: WithdrawalIdsRequest):
+    """Approve several withdrawals in one transaction; ids no longer pending are skipped"""
+    return await _decide(request.ids, approve_withdrawals)
+
+@app.post("/api/withdrawals/reject", dependencies=[Depends(require_admin)])
+async def reject_many(request: WithdrawalIdsRequest):
+    """Reject several withdrawals in one transaction; ids no longer pending are skipped"""
+    return await _decide(request.ids, reject_withdrawals)
 
 if __name__ == "__main__":
     import os
@@ -109,6 +230,19 @@ if __name__ == "__main__":
         .reject { background: #f44336; color: white; }
         .reject:hover { background: #da190b; }
         .empty { text-align: center; padding: 40px; color: #888; }
+        .toolbar { display: flex; gap: 10px; align-items: center; }
+        .more { display: block; margin: 20px auto; background: #1a1a2e; color: #64ffda; border: 1px solid #333; }
+        .cards { display: flex; gap: 20px; margin-bottom: 20px; }
+        .card { background: #1a1a2e; border: 1px solid #333; border-radius: 10px; padding: 15px; flex: 1; display: flex; flex-direction: column; gap: 5px; }
+        .card span, .card small, .chart small { color: #888; }
+        .card strong { font-size: 24px; color: #64ffda; }
+        .bucket { background: #1a1a2e; color: white; border: 1px solid #333; }
+        .bucket.active { background: #64ffda; color: #0a0a0f; }
+        .charts { display: grid; grid-template-columns: repeat(auto-fill, minmax(320px, 1fr)); gap: 20px; margin-top: 20px; }
+        .chart { background: #1a1a2e; border: 1px solid #333; border-radius: 10px; padding: 10px 15px; }
+        .chart h3 { margin: 0 0 10px; font-size: 14px; }
+        .bars { display: flex; align-items: flex-end; gap: 1px; height: 80px; }
+        .bar { flex: 1; background: #64ffda; min-height: 1px; }
     </style>
 </head>
 <body>
@@ -118,12 +252,20 @@ if __name__ == "__main__":
     <div class="message">{{ message }}</div>
     {% endif %}
     
-    <h2>Pending Withdrawals</h2>
+    <h2>Metrics</h2>
+    {% include "metrics_panel.html" %}
+    
+    <h2>Pending Withdrawals ({{ pending_count }})</h2>
     
     {% if pending_withdrawals %}
+    <div class="toolbar">
+        <button type="button" class="approve" id="approve-selected">Approve selected</button>
+        <button type="button" class="reject" id="reject-selected">Reject selected</button>
+    </div>
     <table>
         <thead>
             <tr>
+                <th><input type="checkbox" id="pick-all"></th>
                 <th>ID</th>
                 <th>User ID</th>
                 <th>Amount (SOL)</th>
@@ -133,34 +275,163 @@ if __name__ == "__main__":
                 <th>Actions</th>
             </tr>
         </thead>
+        <tbody id="rows">
+            {% include "withdrawal_rows.html" %}
+        </tbody>
+    </table>
+    {% if next_before %}
+    <button type="button" class="more" id="more" data-before="{{ next_before }}">Load more</button>
+    {% endif %}
+    {% else %}
+    <div class="empty">No pending withdrawals</div>
+    {% endif %}
+
+    <h2>Database Profile</h2>
+    {% include "db_profile_panel.html" %}
+
+    <script>
+    // Only the affected rows change: decided rows are removed, further
+    // pages are appended as server-rendered row fragments.
+    const rows = document.getElementById('rows');
+    const flash = (text) => {
+        let box = document.querySelector('.message');
+        if (!box) {
+            box = document.createElement('div');
+            box.className = 'message';
+            document.querySelector('h1').after(box);
+        }
+        box.textContent = text;
+    };
+    async function decide(action, ids) {
+        if (!ids.length) return;
+        const response = await fetch(`/api/withdrawals/${action}`, {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({ids: ids.map(Number)}),
+        });
+        const result = await response.json();
+        if (!response.ok) { flash(result.detail || 'Request failed'); return; }
+        for (const id of ids) document.getElementById(`w-${id}`)?.remove();
+        flash(`${result.processed.length} withdrawal(s) ${action === 'approve' ? 'approved' : 'rejected'}` +
+              (result.skipped.length ? `, ${result.skipped.length} already processed` : ''));
+    }
+    const picked = () => [...document.querySelectorAll('.pick:checked')].map((box) => box.value);
+    if (rows) {
+        rows.addEventListener('click', (event) => {
+            const button = event.target.closest('button[data-action]');
+            if (!button) return;
+            event.preventDefault();
+            decide(button.dataset.action, [button.closest('tr').dataset.id]);
+        });
+        document.getElementById('approve-selected').onclick = () => decide('approve', picked());
+        document.getElementById('reject-selected').onclick = () => decide('reject', picked());
+        document.getElementById('pick-all').onchange = (event) =>
+            document.querySelectorAll('.pick').forEach((box) => { box.checked = event.target.checked; });
+    }
+    // Switching the metrics window swaps in a re-rendered panel
+    document.addEventListener('click', async (event) => {
+        const button = event.target.closest('button[data-bucket]');
+        if (!button) return;
+        const response = await fetch(`/fragments/metrics?bucket=${button.dataset.bucket}`);
+        if (response.ok) document.getElementById('metrics').outerHTML = await response.text();
+    });
+    const more = document.getElementById('more');
+    if (more) {
+        more.onclick = async () => {
+            const response = await fetch(`/fragments/withdrawals?before=${more.dataset.before}`);
+            rows.insertAdjacentHTML('beforeend', await response.text());
+            const next = response.headers.get('X-Next-Before');
+            if (next) more.dataset.before = next; else more.remove();
+        };
+    }
+    </script>
+</body>
+</html>"""
+    
+    rows_html = """{% for w in pending_withdrawals %}
+<tr id="w-{{ w.id }}" data-id="{{ w.id }}">
+    <td><input type="checkbox" class="pick" value="{{ w.id }}"></td>
+    <td>{{ w.id }}</td>
+    <td>{{ w.user_id }}</td>
+    <td>{{ "%.4f"|format(w.amount) }}</td>
+    <td style="font-family: monospace; font-size: 12px;">{{ w.address[:8] }}...{{ w.address[-8:] }}</td>
+    <td>{{ w.reason }}</td>
+    <td>{{ w.created_at }}</td>
+    <td>
+        <div class="actions">
+            <form method="post" action="/approve/{{ w.id }}" style="display: inline;">
+                <button type="submit" class="approve" data-action="approve">Approve</button>
+            </form>
+            <form method="post" action="/reject/{{ w.id }}" style="display: inline;">
+                <button type="submit" class="reject" data-action="reject">Reject</button>
+            </form>
+        </div>
+    </td>
+</tr>
+{% endfor %}
+"""
+    
+    metrics_html = """<div id="metrics">
+    <div class="cards">
+        <div class="card"><span>Pending payouts</span><strong>{{ pending.count }}</strong><small>{{ "%.4f"|format(pending.total) }} SOL</small></div>
+        <div class="card"><span>Deposits today</span><strong>{{ today.deposits.count }}</strong><small>{{ "%.4f"|format(today.deposits.total) }} SOL</small></div>
+        <div class="card"><span>New users today</span><strong>{{ today.new_users.count }}</strong></div>
+    </div>
+    <div class="toolbar">
+        {% for b in buckets %}
+        <button type="button" class="bucket{% if b == bucket %} active{% endif %}" data-bucket="{{ b }}">Last {{ windows[b] }} {{ b }}s</button>
+        {% endfor %}
+    </div>
+    <div class="charts">
+        {% for chart in charts %}
+        <div class="chart">
+            <h3>{{ chart.label }} <small>{{ chart.count }}{% if chart.has_amount %} / {{ "%.4f"|format(chart.total) }} SOL{% endif %}</small></h3>
+            <div class="bars">
+                {% for p in chart.points %}
+                <div class="bar" style="height: {{ p.height }}%" title="{{ p.start }}: {{ p.count }}{% if chart.has_amount %} ({{ "%.4f"|format(p.total) }} SOL){% endif %}"></div>
+                {% endfor %}
+            </div>
+        </div>
+        {% endfor %}
+    </div>
+</div>
+"""
+    
+    db_profile_html = """<div id="db-profile">
+    {% if db_profile %}
+    <table>
+        <thead>
+            <tr>
+                <th>Function</th>
+                <th>Calls</th>
+                <th>Total (s)</th>
+                <th>Mean (ms)</th>
+                <th>p99 (ms)</th>
+                <th>Max (ms)</th>
+                <th>Rows</th>
+                <th>Slow</th>
+            </tr>
+        </thead>
         <tbody>
-            {% for w in pending_withdrawals %}
+            {% for f in db_profile %}
             <tr>
-                <td>{{ w.id }}</td>
-                <td>{{ w.user_id }}</td>
-                <td>{{ "%.4f"|format(w.amount) }}</td>
-                <td style="font-family: monospace; font-size: 12px;">{{ w.address[:8] }}...{{ w.address[-8:] }}</td>
-                <td>{{ w.reason }}</td>
-                <td>{{ w.created_at }}</td>
-                <td>
-                    <div class="actions">
-                        <form method="post" action="/approve/{{ w.id }}" style="display: inline;">
-                            <button type="submit" class="approve">Approve</button>
-                        </form>
-                        <form method="post" action="/reject/{{ w.id }}" style="display: inline;">
-                            <button type="submit" class="reject">Reject</button>
-                        </form>
-                    </div>
-                </td>
+                <td>{{ f.function }}</td>
+                <td>{{ f.calls }}</td>
+                <td>{{ "%.3f"|format(f.total_seconds) }}</td>
+                <td>{{ "%.3f"|format(f.mean_seconds * 1000) }}</td>
+                <td>{{ "%.3f"|format(f.p99_seconds * 1000) }}</td>
+                <td>{{ "%.3f"|format(f.max_seconds * 1000) }}</td>
+                <td>{{ f.rows }}</td>
+                <td>{{ f.slow }}</td>
             </tr>
             {% endfor %}
         </tbody>
     </table>
     {% else %}
-    <div class="empty">No pending withdrawals</div>
+    <div class="empty">No profile saved in the last hour (start the API or bot with DB_PROFILE=1)</div>
     {% endif %}
-</body>
-</html>"""
+</div>
+"""
     
     with open("admin_templates/login.html", "w") as f:
         f.write(login_html)
@@ -168,6 +439,15 @@ if __name__ == "__main__":
     with open("admin_templates/dashboard.html", "w") as f:
         f.write(dashboard_html)
     
+    with open("admin_templates/withdrawal_rows.html", "w") as f:
+        f.write(rows_html)
+    
+    with open("admin_templates/metrics_panel.html", "w") as f:
+        f.write(metrics_html)
+    
+    with open("admin_templates/db_profile_panel.html", "w") as f:
+        f.write(db_profile_html)
+    
     # Start server and open browser
     port = 8888
     print(f"Admin Dashboard starting on http://localhost:{port}")
@@ -1,32 +1,70 @@
+import asyncio
 import hmac
-import hashlib
-import json
 import os
 import socket
-import time
-from urllib.parse import parse_qs
-from fastapi import FastAPI, Header, HTTPException, Depends
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Header, HTTPException, Depends, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 
 class WithdrawRequest(BaseModel):
     amount: float
     address: str
 
 class DepositRequest(BaseModel):
-    amount: float
+    # Reported by the client; only confirmed transfers are credited
+    amount: Optional[float] = None
     referral_code: Optional[str] = None
 
+class RolloverRequest(BaseModel):
+    amount: float
+
+class BetEvent(BaseModel):
+    amount: float
+
+class RolloverBatchRequest(BaseModel):
+    events: List[BetEvent]
+
 class WalletSaveRequest(BaseModel):
     public_key: str
     secret_key: str
 
-from config import BOT_TOKEN
-from database import get_user, get_all_users, get_user_initial_deposit, record_deposit, add_pending_withdrawal, get_user_bonus, add_first_deposit_bonus, update_bonus_rollover, generate_referral_code, get_referral_info, process_referral_deposit, add_user
-from solana_utils import get_balance
+from async_db import init_db, close_db, get_user, get_user_initial_deposit, add_pending_withdrawal, get_user_bonus, update_bonus_rollover, apply_bet_events, generate_referral_code, get_referral_info, get_referral_stats, set_referrer, add_user
+from balance_stream import watch_balance, unwatch_balance, close_balance_stream, get_balance_stream_stats
+from leaderboard import get_leaderboard_snapshot, start_leaderboard_refresher, stop_leaderboard_refresher
+from telegram_auth import verify_telegram_data, get_init_data_cache_stats
+from bot_webhook import WEBHOOK_PATH, start_bot_webhook, stop_bot_webhook, check_webhook_secret, enqueue_update
+from config import ROLLOVER_BATCH_MAX, METRICS_TOKEN
+from db_profiler import start_db_profiler, stop_db_profiler
+from deposit_indexer import start_deposit_indexer, stop_deposit_indexer, index_user_wallet, get_indexer_stats
+from referral_codes import encode_referral_code
+from reconciliation import get_wallet_balance, start_reconciler, stop_reconciler, get_reconcile_stats
+from telemetry import CONTENT_TYPE, RequestMetricsMiddleware, render as render_metrics
+from solana_utils import get_balance, get_balance_cache_stats, start_rpc_client, close_rpc_client
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Apply pending schema migrations once, before serving requests
+    await init_db()
+    start_db_profiler("api")
+    await start_rpc_client()
+    start_leaderboard_refresher()
+    start_reconciler()
+    start_deposit_indexer()
+    # Serve the bot from this process when BOT_WEBHOOK_URL is set
+    await start_bot_webhook()
+    yield
+    await stop_leaderboard_refresher()
+    await stop_reconciler()
+    await stop_deposit_indexer()
+    await stop_bot_webhook()
+    await close_balance_stream()
+    await close_rpc_client()
+    await stop_db_profiler()
+    await close_db()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Enable CORS for the frontend
 app.add_middleware(
@@ -35,47 +73,62 @@ app.add_middleware(
     allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Snapshot-Age"],
 )
 
+app.add_middleware(RequestMetricsMiddleware)
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics(authorization: Optional[str] = Header(None)):
+    """Prometheus scrape endpoint (bearer METRICS_TOKEN when set)"""
+    if METRICS_TOKEN and not hmac.compare_digest(authorization or "", f"Bearer {METRICS_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return Response(render_metrics(), media_type=CONTENT_TYPE)
+
 @app.get("/")
 async def root():
     return {"status": "ok", "service": "surfsol-api"}
 
 @app.get("/health")
 async def health():
-    return {"ok": True}
+    return {
+        "ok": True,
+        "balance_cache": get_balance_cache_stats(),
+        "balance_stream": get_balance_stream_stats(),
+        "init_data_cache": get_init_data_cache_stats(),
+        "reconciliation": get_reconcile_stats(),
+        "deposit_indexer": get_indexer_stats(),
+    }
 
-def verify_telegram_data(init_data: str) -> dict:
-    """Verifies the data received from the Telegram Mini App."""
-    try:
-        parsed_data = parse_qs(init_data)
-        hash_str = parsed_data.pop('hash')[0]
-        
-        # Sort data alphabetically
-        data_check_list = []
-        for key in sorted(parsed_data.keys()):
-            data_check_list.append(f"{key}={parsed_data[key][0]}")
-        
-        data_check_string = "\n".join(data_check_list)
-        
-        # Secret key is the HMAC-SHA256 of the bot token with "WebAppData"
-        secret_key = hmac.new("WebAppData".encode(), BOT_TOKEN.encode(), hashlib.sha256).digest()
-        
-        # HMAC-SHA256 of the data check string
-        calculated_hash = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
-        
-        if calculated_hash != hash_str:
-            raise HTTPException(status_code=401, detail="Invalid data")
-            
-        # Check if data is expired (auth_date older than 24 hours)
-        auth_date = int(parsed_data.get('auth_date')[0])
-        if time.time() - auth_date > 86400:
-            raise HTTPException(status_code=401, detail="Data expired")
-            
-        user_info = json.loads(parsed_data.get('user')[0])
-        return user_info
-    except Exception as e:
-        raise HTTPException(status_code=401, detail=str(e))
+@app.post(WEBHOOK_PATH)
+async def telegram_webhook(request: Request, x_telegram_bot_api_secret_token: Optional[str] = Header(None)):
+    """Receive bot updates from Telegram; acknowledged as soon as they are queued"""
+    if not check_webhook_secret(x_telegram_bot_api_secret_token):
+        raise HTTPException(status_code=403, detail="Invalid webhook secret")
+    if not await enqueue_update(await request.json()):
+        raise HTTPException(status_code=503, detail="Bot is not running")
+    return Response(status_code=200)
+
+def _bearer_init_data(authorization: Optional[str]) -> str:
+    if not authorization:
+        raise HTTPException(status_code=401, detail="Missing authorization header")
+    
+    # Extract initData from the Bearer token
+    if not authorization.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Invalid authorization format")
+    
+    return authorization.split(" ")[1]
+
+async def current_user(authorization: Optional[str] = Header(None)) -> dict:
+    """Dependency: verify the Bearer initData and load the bot user once per request"""
+    tg_user = verify_telegram_data(_bearer_init_data(authorization))
+    user_id = tg_user.get('id')
+    db_user = await get_user(user_id)
+    
+    if not db_user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    return {"id": user_id, "tg_user": tg_user, "db_user": db_user}
 
 @app.post("/api/wallet/save")
 async def save_wallet(request: WalletSaveRequest, authorization: Optional[str] = Header(None)):
@@ -94,29 +147,15 @@ async def save_wallet(request: WalletSaveRequest, authorization: Optional[str] =
             pass  # Use default user_id if verification fails
     
     # Save wallet to database
-    add_user(user_id, request.public_key, request.secret_key)
+    await add_user(user_id, request.public_key, request.secret_key)
     
     return {"status": "saved", "public_key": request.public_key, "user_id": user_id}
 
 @app.get("/api/user/info")
-async def get_user_info(authorization: Optional[str] = Header(None)):
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Missing authorization header")
-    
-    # Extract initData from the Bearer token
-    if not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Invalid authorization format")
+async def get_user_info(user: dict = Depends(current_user)):
+    user_id, tg_user, db_user = user['id'], user['tg_user'], user['db_user']
     
-    init_data = authorization.split(" ")[1]
-    tg_user = verify_telegram_data(init_data)
-    
-    user_id = tg_user.get('id')
-    db_user = get_user(user_id)
-    
-    if not db_user:
-        raise HTTPException(status_code=404, detail="User not found in bot database")
-    
-    balance = await get_balance(db_user['public_key'])
+    balance = await get_wallet_balance(user_id, db_user['public_key'])
     
     return {
         "id": user_id,
@@ -127,75 +166,70 @@ async def get_user_info(authorization: Optional[str] = Header(None)):
         "language": db_user.get('language', 'en')
     }
 
-def hide_username(username: str) -> str:
-    """Hide middle of username for privacy: 'CryptoKing' -> 'Cry***ng'"""
-    if not username or len(username) < 4:
-        return username or 'Anonymous'
-    return f"{username[:3]}***{username[-2:]}"
+@app.websocket("/ws/balance")
+async def balance_socket(websocket: WebSocket, init_data: str = ""):
+    """Push the user's wallet balance whenever it changes on chain.
+
+    Browsers can't set headers on a WebSocket, so initData comes in the
+    init_data query parameter. Each message is {"public_key", "balance"}.
+    Refusals are close codes 4401 (bad initData) and 4404 (no wallet);
+    the socket is accepted first, since closing during the handshake only
+    reaches the client as an HTTP 403.
+    """
+    await websocket.accept()
+    try:
+        tg_user = verify_telegram_data(init_data)
+    except HTTPException:
+        await websocket.close(code=4401)
+        return
+    db_user = await get_user(tg_user.get('id'))
+    if not db_user or not db_user.get('public_key'):
+        await websocket.close(code=4404)
+        return
+
+    public_key = db_user['public_key']
+    queue = await watch_balance(public_key)
+
+    async def push():
+        balance = await get_balance(public_key)
+        while True:
+            await websocket.send_json({"public_key": public_key, "balance": balance})
+            balance = await queue.get()
+
+    pusher = asyncio.create_task(push())
+    try:
+        # Nothing is expected from the client; this returns when it disconnects
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        pusher.cancel()
+        try:
+            await pusher
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"Error pushing balance: {e}")
+        await unwatch_balance(public_key, queue)
 
 @app.get("/api/leaderboard")
 async def get_leaderboard():
-    """Get all wallets with balance from real database"""
+    """Serve the precomputed leaderboard snapshot; its age is in X-Snapshot-Age"""
     try:
-        users = get_all_users()
-        
-        # Fetch balances for all users with public keys (show even 0 balance)
-        leaderboard = []
-        for user in users:
-            if user.get('public_key'):
-                try:
-                    balance = await get_balance(user['public_key'])
-                    leaderboard.append({
-                        'username': hide_username(user.get('username') or user.get('first_name')),
-                        'balance': balance,
-                        'public_key': user['public_key']
-                    })
-                except:
-                    # If balance fetch fails, show 0
-                    leaderboard.append({
-                        'username': hide_username(user.get('username') or user.get('first_name')),
-                        'balance': 0,
-                        'public_key': user['public_key']
-                    })
-        
-        # Sort by balance descending
-        leaderboard.sort(key=lambda x: x['balance'], reverse=True)
-        
-        # Add ranks (show all users, not just top 10)
-        result = []
-        for i, entry in enumerate(leaderboard):
-            result.append({
-                'rank': i + 1,
-                'username': entry['username'],
-                'balance': round(entry['balance'], 4),
-                'public_key': entry['public_key']
-            })
-        
-        return result
+        body, age = await get_leaderboard_snapshot()
     except Exception as e:
-        return []
+        print(f"Error reading leaderboard snapshot: {e}")
+        body, age = b"[]", 0.0
+    return Response(content=body, media_type="application/json", headers={"X-Snapshot-Age": f"{age:.1f}"})
 
 @app.post("/api/withdraw")
-async def request_withdrawal(request: WithdrawRequest, authorization: Optional[str] = Header(None)):
+async def request_withdrawal(request: WithdrawRequest, user: dict = Depends(current_user)):
     """Request withdrawal - instant for initial deposits, pending for winnings"""
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Missing authorization header")
-    
-    # Extract initData from the Bearer token
-    if not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Invalid authorization format")
-    
-    init_data = authorization.split(" ")[1]
-    tg_user = verify_telegram_data(init_data)
-    
-    user_id = tg_user.get('id')
-    db_user = get_user(user_id)
-    
-    if not db_user:
-        raise HTTPException(status_code=404, detail="User not found")
+    user_id, db_user = user['id'], user['db_user']
     
-    current_balance = await get_balance(db_user['public_key'])
-    initial_deposit = get_user_initial_deposit(user_id)
+    current_balance = await get_wallet_balance(user_id, db_user['public_key'], fresh=True)
+    initial_deposit = await get_user_initial_deposit(user_id)
     
     if request.amount > current_balance:
         raise HTTPException(status_code=400, detail="Insufficient balance")
@@ -211,7 +245,7 @@ async def request_withdrawal(request: WithdrawRequest, authorization: Optional[s
         }
     else:
         # Add to pending list (winnings)
-        add_pending_withdrawal(user_id, request.amount, request.address, "winnings")
+        await add_pending_withdrawal(user_id, request.amount, request.address, "winnings")
         return {
             "status": "pending",
             "message": "Withdrawal added to pending list (winnings require manual approval)",
@@ -220,77 +254,60 @@ async def request_withdrawal(request: WithdrawRequest, authorization: Optional[s
         }
 
 @app.post("/api/deposit")
-async def record_deposit_endpoint(request: DepositRequest, authorization: Optional[str] = Header(None)):
-    """Record a deposit for the user and add first deposit bonus"""
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Missing authorization header")
-    
-    # Extract initData from the Bearer token
-    if not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Invalid authorization format")
-    
-    init_data = authorization.split(" ")[1]
-    tg_user = verify_telegram_data(init_data)
-    
-    user_id = tg_user.get('id')
-    db_user = get_user(user_id)
-    
-    if not db_user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    record_deposit(user_id, request.amount)
-    
-    # Process referral if provided
-    referral_info = None
+async def record_deposit_endpoint(request: DepositRequest, user: dict = Depends(current_user)):
+    """Credit the user's confirmed on-chain deposits now instead of on the indexer's next pass.
+
+    The amount the client reports is not trusted: deposits are only
+    recorded by the indexer, from transfers found on chain (once per
+    signature), together with referral earnings and the first deposit bonus.
+    """
+    user_id, db_user = user['id'], user['db_user']
+    if not db_user.get('public_key'):
+        raise HTTPException(status_code=400, detail="No wallet")
+
+    # Attribute the user to a referrer before their deposits are credited
     if request.referral_code:
-        referral_info = process_referral_deposit(request.referral_code, request.amount)
-    
-    # Check for first deposit bonus (minimum $5)
-    bonus_info = None
-    if request.amount >= 5:
-        bonus_added = add_first_deposit_bonus(user_id, request.amount)
-        if bonus_added:
-            bonus_info = get_user_bonus(user_id)
-    
+        await set_referrer(user_id, request.referral_code)
+
+    deposits = await index_user_wallet(user_id, db_user['public_key'])
+    if not deposits:
+        return {
+            "status": "pending",
+            "message": "No new confirmed deposit yet; it will be credited once it lands on chain",
+            "amount": 0
+        }
+
     response = {
         "status": "recorded",
         "message": "Deposit recorded successfully",
-        "amount": request.amount
+        "amount": round(sum(deposit['amount'] for deposit in deposits), 9),
+        "deposits": len(deposits)
     }
-    
-    if bonus_info:
+
+    if any(deposit['bonus'] for deposit in deposits):
+        bonus_info = await get_user_bonus(user_id)
         response["bonus"] = bonus_info['bonus_balance']
         response["required_rollover"] = bonus_info['required_rollover']
         response["message"] = "Deposit recorded with bonus!"
-    
-    if referral_info:
+
+    earnings = [deposit['referrer_earnings'] for deposit in deposits if deposit['referrer_earnings'] is not None]
+    if earnings:
         response["referral_processed"] = True
-        response["referrer_earnings"] = referral_info['earnings']
-    
+        response["referrer_earnings"] = sum(earnings)
+
     return response
 
 @app.get("/api/referral")
-async def get_referral(authorization: Optional[str] = Header(None)):
+async def get_referral(user: dict = Depends(current_user)):
     """Get user's referral code and stats"""
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Missing authorization header")
-    
-    # Extract initData from the Bearer token
-    if not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Invalid authorization format")
-    
-    init_data = authorization.split(" ")[1]
-    tg_user = verify_telegram_data(init_data)
+    user_id = user['id']
     
-    user_id = tg_user.get('id')
-    db_user = get_user(user_id)
-    
-    if not db_user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    # Generate or get existing referral code
-    referral_code = generate_referral_code(user_id)
-    referral_stats = get_referral_info(user_id)
+    # Codes are derived from the user id; the row is only created once
+    referral_code = encode_referral_code(user_id)
+    referral_stats = await get_referral_info(user_id)
+    if referral_stats is None:
+        await generate_referral_code(user_id)
+        referral_stats = await get_referral_info(user_id)
     
     return {
         "referral_code": referral_code,
@@ -298,55 +315,52 @@ async def get_referral(authorization: Optional[str] = Header(None)):
         "stats": referral_stats
     }
 
+@app.get("/api/referral/stats")
+async def get_referral_stats_endpoint(days: int = 30, user: dict = Depends(current_user)):
+    """Referral totals, earnings per day and the top referrers"""
+    if not 1 <= days <= 366:
+        raise HTTPException(status_code=400, detail="days must be between 1 and 366")
+    return await get_referral_stats(user['id'], days)
+
 @app.get("/api/bonus")
-async def get_bonus_info(authorization: Optional[str] = Header(None)):
+async def get_bonus_info(user: dict = Depends(current_user)):
     """Get user's bonus information"""
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Missing authorization header")
-    
-    # Extract initData from the Bearer token
-    if not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Invalid authorization format")
+    user_id = user['id']
     
-    init_data = authorization.split(" ")[1]
-    tg_user = verify_telegram_data(init_data)
-    
-    user_id = tg_user.get('id')
-    db_user = get_user(user_id)
-    
-    if not db_user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    bonus_info = get_user_bonus(user_id)
+    bonus_info = await get_user_bonus(user_id)
     return bonus_info
 
 @app.post("/api/bonus/rollover")
-async def update_rollover(request: DepositRequest, authorization: Optional[str] = Header(None)):
+async def update_rollover(request: RolloverRequest, user: dict = Depends(current_user)):
     """Update bonus rollover from winnings"""
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Missing authorization header")
+    user_id = user['id']
     
-    # Extract initData from the Bearer token
-    if not authorization.startswith("Bearer "):
-        raise HTTPException(status_code=401, detail="Invalid authorization format")
-    
-    init_data = authorization.split(" ")[1]
-    tg_user = verify_telegram_data(init_data)
-    
-    user_id = tg_user.get('id')
-    db_user = get_user(user_id)
-    
-    if not db_user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    success = update_bonus_rollover(user_id, request.amount)
-    bonus_info = get_user_bonus(user_id)
+    success = await update_bonus_rollover(user_id, request.amount)
+    bonus_info = await get_user_bonus(user_id)
     
     return {
         "status": "updated" if success else "failed",
         "bonus_info": bonus_info
     }
 
+@app.post("/api/bonus/rollover/batch")
+async def update_rollover_batch(request: RolloverBatchRequest, user: dict = Depends(current_user)):
+    """Apply a batch of bet events (e.g. one multi-ball drop) to the bonus rollover at once"""
+    user_id = user['id']
+
+    if not request.events or len(request.events) > ROLLOVER_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"Send between 1 and {ROLLOVER_BATCH_MAX} events")
+    if any(event.amount <= 0 for event in request.events):
+        raise HTTPException(status_code=400, detail="Event amounts must be positive")
+
+    results = await apply_bet_events([(user_id, event.amount) for event in request.events])
+    bonus_info = results[user_id]
+    return {
+        "status": "converted" if bonus_info['is_converted'] else "updated",
+        "events": len(request.events),
+        "bonus_info": bonus_info
+    }
+
 if __name__ == "__main__":
     import uvicorn
 
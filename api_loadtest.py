@@ -0,0 +1,307 @@
+"""Drive api.py over HTTP with synthetic Mini App users and report its capacity.
+
+Seeds a scratch zolt.db with users, deposits and referrals, starts the
+fake Solana RPC (fake_rpc.py) in this process and the API under uvicorn
+in a subprocess, then replays the same seeded mix of /api/user/info,
+/api/deposit, /api/withdraw, /api/referral and /api/leaderboard requests
+at each concurrency level. Every request carries valid initData signed
+with a test BOT_TOKEN. The report (--json) holds the configuration,
+the environment and per-endpoint throughput and latency percentiles, so
+runs on the same commit and seed are comparable.
+
+    python api_loadtest.py --users 1000 --requests 5000 --concurrency 1 16 64 --json
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlencode
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+# A throwaway bot token and key: the run never talks to Telegram or
+# mainnet, and initData is signed with this token
+TEST_BOT_TOKEN = "1000000000:api-loadtest-token"
+TEST_FERNET_KEY = base64.urlsafe_b64encode(b"api-loadtest".ljust(32, b"-")).decode()
+RPC_PORT = _free_port()
+TEST_ENV = {
+    "BOT_TOKEN": TEST_BOT_TOKEN,
+    "FERNET_KEY": TEST_FERNET_KEY,
+    "RPC_URL": f"http://127.0.0.1:{RPC_PORT}",
+    "WS_RPC_URL": f"ws://127.0.0.1:{RPC_PORT}",
+    # Empty (not unset) so config's load_dotenv() can't fill them back in
+    "LOG_CHAT_ID": "",
+    "BOT_WEBHOOK_URL": "",
+    "REFERRAL_CODE_KEY": "",
+}
+os.environ.update(TEST_ENV)
+
+import base58
+import httpx
+import uvicorn
+
+import database
+from fake_rpc import FakeChain, create_app
+from referral_codes import encode_referral_code
+
+ENDPOINTS = ["user_info", "deposit", "withdraw", "referral", "leaderboard"]
+DEFAULT_MIX = "user_info=40,leaderboard=20,referral=15,deposit=15,withdraw=10"
+FIRST_USER_ID = 7_000_000_000
+WALLET_LAMPORTS = 10 * 10**9
+
+def init_data(user_id: int, auth_date: int) -> str:
+    """Mini App initData for the user, signed the way Telegram signs it"""
+    fields = {
+        "auth_date": str(auth_date),
+        "query_id": f"AAloadtest{user_id}",
+        "user": json.dumps({"id": user_id, "first_name": "Load", "username": f"load{user_id}", "language_code": "en"},
+                           separators=(",", ":")),
+    }
+    secret = hmac.new(b"WebAppData", TEST_BOT_TOKEN.encode(), hashlib.sha256).digest()
+    check_string = "\n".join(f"{key}={fields[key]}" for key in sorted(fields))
+    fields["hash"] = hmac.new(secret, check_string.encode(), hashlib.sha256).hexdigest()
+    return urlencode(fields)
+
+def wallet(user_id: int) -> str:
+    return base58.b58encode(hashlib.sha256(f"loadtest:{user_id}".encode()).digest()).decode()
+
+def seed(users: int, referred_share: float, rng: random.Random, chain: FakeChain) -> dict:
+    """Users with a funded wallet, one deposit each, referral rows and referred deposits"""
+    database.init_db()
+    referred = 0
+    for i in range(users):
+        user_id = FIRST_USER_ID + i
+        public_key = wallet(user_id)
+        database.add_user(user_id, public_key, "loadtest")
+        database.record_deposit(user_id, round(rng.uniform(0.5, 3.0), 4))
+        database.generate_referral_code(user_id)
+        chain.balances[public_key] = WALLET_LAMPORTS
+        if i and rng.random() < referred_share:
+            referral_code = encode_referral_code(FIRST_USER_ID + rng.randrange(i))
+            database.set_referrer(user_id, referral_code)
+            amount = round(rng.uniform(50, 200), 2)
+            database.record_deposit(user_id, amount)
+            database.process_referral_deposit(referral_code, amount)
+            referred += 1
+    database.close_connection()
+    return {"users": users, "deposits": users + referred, "referred_users": referred}
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name not in ENDPOINTS:
+            raise SystemExit(f"Unknown endpoint '{name}' in --mix (one of {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight)
+    return mix
+
+def plan(requests: int, users: int, mix: dict, rng: random.Random) -> list:
+    """The (endpoint, user_id, amount) sequence every concurrency level replays"""
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    steps = []
+    for name in rng.choices(names, weights, k=requests):
+        user_id = FIRST_USER_ID + rng.randrange(users)
+        if name == "deposit":
+            amount = round(rng.uniform(0.1, 10.0), 4)
+        elif name == "withdraw":
+            amount = round(rng.uniform(0.01, 1.0), 4)
+        else:
+            amount = None
+        steps.append((name, user_id, amount))
+    return steps
+
+def _request(step, headers: dict, chain: FakeChain):
+    name, user_id, amount = step
+    auth = {"Authorization": f"Bearer {headers[user_id]}"}
+    if name == "user_info":
+        return "GET", "/api/user/info", auth, None
+    if name == "deposit":
+        # A real transfer first: the API only credits what the indexer finds on chain
+        chain.transfer(wallet(user_id), int(amount * 10**9))
+        return "POST", "/api/deposit", auth, {"amount": amount}
+    if name == "withdraw":
+        return "POST", "/api/withdraw", auth, {"amount": amount, "address": wallet(user_id + 1)}
+    if name == "referral":
+        return "GET", "/api/referral", auth, None
+    return "GET", "/api/leaderboard", {}, None
+
+def _percentile(ordered: list, q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+def summarize(samples: list, elapsed: float) -> dict:
+    """samples: [(latency_s, status)]"""
+    latencies = sorted(latency for latency, _ in samples)
+    errors = {}
+    for _, status in samples:
+        if not 200 <= status < 300:
+            errors[str(status)] = errors.get(str(status), 0) + 1
+    if not latencies:
+        return {"requests": 0, "errors": {}}
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "requests_per_s": round(len(samples) / elapsed, 1),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+        "p50_ms": round(_percentile(latencies, 0.50) * 1000, 2),
+        "p90_ms": round(_percentile(latencies, 0.90) * 1000, 2),
+        "p99_ms": round(_percentile(latencies, 0.99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2),
+    }
+
+async def run_level(base_url: str, concurrency: int, steps: list, headers: dict, chain: FakeChain) -> dict:
+    samples = {name: [] for name in ENDPOINTS}
+    queue = iter(steps)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        async def worker():
+            for step in queue:
+                method, path, auth, body = _request(step, headers, chain)
+                start = time.perf_counter()
+                try:
+                    response = await client.request(method, path, headers=auth, json=body)
+                    status = response.status_code
+                except httpx.HTTPError:
+                    status = 0  # transport failure
+                samples[step[0]].append((time.perf_counter() - start, status))
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - t0
+
+    every = [sample for name in ENDPOINTS for sample in samples[name]]
+    return {
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        **summarize(every, elapsed),
+        "endpoints": {name: summarize(samples[name], elapsed) for name in ENDPOINTS if samples[name]},
+    }
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+def start_api(workdir: str, port: int, workers: int) -> subprocess.Popen:
+    """api.py under uvicorn with workdir as cwd, so it opens the seeded zolt.db there"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = {**os.environ, **TEST_ENV, "PYTHONPATH": os.pathsep.join(filter(None, [here, os.environ.get("PYTHONPATH")]))}
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        cwd=workdir, env=env,
+    )
+
+async def wait_until_up(base_url: str, api: subprocess.Popen, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            if api.poll() is not None:
+                raise RuntimeError(f"API exited with code {api.returncode}")
+            try:
+                if (await client.get("/health")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.1)
+    raise RuntimeError("API did not come up")
+
+async def main_async(args):
+    rng = random.Random(args.seed)
+    mix = parse_mix(args.mix)
+    chain = FakeChain(args.rpc_latency)
+    rpc = uvicorn.Server(uvicorn.Config(create_app(chain), host="127.0.0.1", port=RPC_PORT, log_level="warning"))
+    rpc_task = asyncio.create_task(rpc.serve())
+    while not rpc.started:
+        await asyncio.sleep(0.01)
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        database.DB_NAME = os.path.join(workdir, "zolt.db")
+        t0 = time.perf_counter()
+        seeded = seed(args.users, args.referred_share, rng, chain)
+        seeded["seconds"] = round(time.perf_counter() - t0, 2)
+        steps = plan(args.requests, args.users, mix, rng)
+        auth_date = int(time.time())
+        headers = {FIRST_USER_ID + i: init_data(FIRST_USER_ID + i, auth_date) for i in range(args.users)}
+
+        port = _free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        api = start_api(workdir, port, args.workers)
+        try:
+            await wait_until_up(base_url, api)
+            # Lets the startup leaderboard build and reconciliation finish
+            await asyncio.sleep(args.settle)
+            for concurrency in args.concurrency:
+                result = await run_level(base_url, concurrency, steps, headers, chain)
+                results.append(result)
+                if not args.json:
+                    print(f"concurrency={concurrency} requests={result['requests']} "
+                          f"req/s={result['requests_per_s']} p50={result['p50_ms']}ms "
+                          f"p99={result['p99_ms']}ms errors={result['errors']}")
+        finally:
+            api.terminate()
+            try:
+                api.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                api.kill()
+
+    rpc.should_exit = True
+    await rpc_task
+    report = {
+        "harness": "api_loadtest",
+        "format": 1,
+        "config": {
+            "users": args.users, "requests": args.requests, "concurrency": args.concurrency,
+            "mix": mix, "seed": args.seed, "referred_share": args.referred_share,
+            "rpc_latency_s": args.rpc_latency, "workers": args.workers, "settle_s": args.settle,
+        },
+        "environment": {
+            "commit": _commit(), "python": platform.python_version(),
+            "platform": platform.platform(), "cpus": os.cpu_count(),
+        },
+        "seed_data": seeded,
+        "results": results,
+        "rpc_calls": dict(chain.calls),
+    }
+    if args.json:
+        output = json.dumps(report, indent=2)
+        if args.output:
+            with open(args.output, "w") as f:
+                f.write(output + "\n")
+        else:
+            print(output)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=5000, help="requests per concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="endpoint=weight,... (endpoints: %s)" % ", ".join(ENDPOINTS))
+    parser.add_argument("--seed", type=int, default=1, help="seeds the synthetic data and the request sequence")
+    parser.add_argument("--referred-share", type=float, default=0.3, help="share of users with a referrer")
+    parser.add_argument("--rpc-latency", type=float, default=0.05, help="seconds per fake RPC request")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--settle", type=float, default=2.0, help="seconds to wait after startup")
+    parser.add_argument("--json", action="store_true")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    asyncio.run(main_async(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
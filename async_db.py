@@ -0,0 +1,98 @@
+"""Awaitable wrappers around database.py for the API and bot handlers.
+
+Every call runs on a single dedicated DB thread, so the event loop never
+blocks on SQLite I/O and all writes go through one pooled connection in
+order (SQLite only allows one writer at a time anyway).
+"""
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import database
+from telemetry import DB_CALL_SECONDS, DB_QUEUE_SECONDS
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+_queue_timer = DB_QUEUE_SECONDS.labels()
+# Called as profiler(name, seconds, result, args, kwargs) on the DB thread
+# after each successful call (see db_profiler); None = not profiling
+_profiler = None
+
+async def run_in_db_thread(fn, *args, **kwargs):
+    """Run a blocking database function on the DB thread and await its result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+def set_profiler(profiler):
+    """Install (or with None, remove) the hook every database call is reported to"""
+    global _profiler
+    _profiler = profiler
+
+def _awaitable(fn):
+    name = fn.__name__
+    timer = DB_CALL_SECONDS.labels(name)
+
+    def timed(queued_at, *args, **kwargs):
+        start = time.perf_counter()
+        _queue_timer.observe(start - queued_at)
+        try:
+            result = fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            timer.observe(elapsed)
+        if _profiler is not None:
+            _profiler(name, elapsed, result, args, kwargs)
+        return result
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return await run_in_db_thread(timed, time.perf_counter(), *args, **kwargs)
+    return wrapper
+
+async def close_db():
+    """Close the DB thread's connection; call on shutdown"""
+    await run_in_db_thread(database.close_connection)
+
+init_db = _awaitable(database.init_db)
+add_user = _awaitable(database.add_user)
+get_user_initial_deposit = _awaitable(database.get_user_initial_deposit)
+record_deposit = _awaitable(database.record_deposit)
+update_user_language = _awaitable(database.update_user_language)
+verify_user = _awaitable(database.verify_user)
+set_user_wallet = _awaitable(database.set_user_wallet)
+get_user = _awaitable(database.get_user)
+get_all_users = _awaitable(database.get_all_users)
+add_pending_withdrawal = _awaitable(database.add_pending_withdrawal)
+get_pending_withdrawals = _awaitable(database.get_pending_withdrawals)
+count_pending_withdrawals = _awaitable(database.count_pending_withdrawals)
+approve_withdrawal = _awaitable(database.approve_withdrawal)
+reject_withdrawal = _awaitable(database.reject_withdrawal)
+approve_withdrawals = _awaitable(database.approve_withdrawals)
+reject_withdrawals = _awaitable(database.reject_withdrawals)
+record_payout = _awaitable(database.record_payout)
+get_user_bonus = _awaitable(database.get_user_bonus)
+add_first_deposit_bonus = _awaitable(database.add_first_deposit_bonus)
+update_bonus_rollover = _awaitable(database.update_bonus_rollover)
+apply_bet_events = _awaitable(database.apply_bet_events)
+convert_bonus_to_crypto = _awaitable(database.convert_bonus_to_crypto)
+generate_referral_code = _awaitable(database.generate_referral_code)
+get_referral_info = _awaitable(database.get_referral_info)
+get_referral_stats = _awaitable(database.get_referral_stats)
+process_referral_deposit = _awaitable(database.process_referral_deposit)
+get_media_files = _awaitable(database.get_media_files)
+save_media_file = _awaitable(database.save_media_file)
+delete_media_file = _awaitable(database.delete_media_file)
+post_ledger_transaction = _awaitable(database.post_ledger_transaction)
+get_ledger_balance = _awaitable(database.get_ledger_balance)
+get_user_ledger_balances = _awaitable(database.get_user_ledger_balances)
+reconcile_wallet_balances = _awaitable(database.reconcile_wallet_balances)
+check_ledger = _awaitable(database.check_ledger)
+get_referrer_code = _awaitable(database.get_referrer_code)
+get_wallet_cursors = _awaitable(database.get_wallet_cursors)
+get_wallet_cursor = _awaitable(database.get_wallet_cursor)
+set_wallet_cursor = _awaitable(database.set_wallet_cursor)
+get_ledger_opened_at = _awaitable(database.get_ledger_opened_at)
+set_referrer = _awaitable(database.set_referrer)
+get_metric_series = _awaitable(database.get_metric_series)
+get_metric_gauges = _awaitable(database.get_metric_gauges)
+get_db_profile = _awaitable(database.get_db_profile)
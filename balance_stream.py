@@ -0,0 +1,155 @@
+"""Push wallet balance changes to WebSocket clients.
+
+One upstream Solana websocket carries an accountSubscribe per watched
+wallet. Subscriptions are reference-counted: the first client watching a
+wallet subscribes it, the last one to leave unsubscribes it. Every change
+is fanned out to all clients watching that wallet.
+"""
+import asyncio
+import itertools
+import json
+
+import websockets
+
+from config import WS_RPC_URL
+from solana_utils import remember_balance
+
+# Public key -> set of client queues (each holds only the latest balance)
+_watchers = {}
+# Public key <-> upstream subscription id
+_subscriptions = {}
+_subscription_keys = {}
+# Request id -> public key awaiting its subscription id
+_pending_subscribes = {}
+_request_ids = itertools.count(1)
+_upstream = None
+_upstream_task = None
+
+def _offer(queue: asyncio.Queue, balance: float):
+    """Replace whatever the client hasn't consumed yet with the newest balance"""
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(balance)
+
+async def _send(message: dict):
+    if _upstream is not None:
+        try:
+            await _upstream.send(json.dumps(message))
+        except Exception as e:
+            print(f"Error sending to balance stream: {e}")
+
+async def _subscribe(public_key: str):
+    if _upstream is None:
+        return  # sent for every watched wallet once the connection is up
+    request_id = next(_request_ids)
+    _pending_subscribes[request_id] = public_key
+    await _send({
+        "jsonrpc": "2.0",
+        "id": request_id,
+        "method": "accountSubscribe",
+        "params": [public_key, {"encoding": "base64", "commitment": "confirmed"}]
+    })
+
+async def _unsubscribe(public_key: str):
+    subscription = _subscriptions.pop(public_key, None)
+    if subscription is None:
+        return
+    _subscription_keys.pop(subscription, None)
+    await _send_unsubscribe(subscription)
+
+async def _send_unsubscribe(subscription: int):
+    await _send({
+        "jsonrpc": "2.0",
+        "id": next(_request_ids),
+        "method": "accountUnsubscribe",
+        "params": [subscription]
+    })
+
+async def _handle(message: dict):
+    if message.get("method") == "accountNotification":
+        params = message["params"]
+        public_key = _subscription_keys.get(params["subscription"])
+        if public_key is None:
+            return
+        balance = params["result"]["value"]["lamports"] / 10**9
+        remember_balance(public_key, balance)
+        for queue in _watchers.get(public_key, ()):
+            _offer(queue, balance)
+        return
+
+    public_key = _pending_subscribes.pop(message.get("id"), None)
+    if public_key is None or "result" not in message:
+        return
+    subscription = message["result"]
+    if public_key in _watchers and public_key not in _subscriptions:
+        _subscriptions[public_key] = subscription
+        _subscription_keys[subscription] = public_key
+    else:
+        # Everyone left before it was confirmed, or a duplicate
+        await _send_unsubscribe(subscription)
+
+async def _run_upstream():
+    """Keep the upstream connection open, resubscribing after every reconnect"""
+    global _upstream
+    backoff = 1
+    while True:
+        try:
+            async with websockets.connect(WS_RPC_URL) as ws:
+                _upstream = ws
+                backoff = 1
+                for public_key in list(_watchers):
+                    await _subscribe(public_key)
+                async for raw in ws:
+                    await _handle(json.loads(raw))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Balance stream disconnected: {e}")
+        finally:
+            _upstream = None
+            _subscriptions.clear()
+            _subscription_keys.clear()
+            _pending_subscribes.clear()
+        await asyncio.sleep(backoff)
+        backoff = min(backoff * 2, 30)
+
+async def watch_balance(public_key: str) -> asyncio.Queue:
+    """Register a client for a wallet; balances arrive on the returned queue"""
+    global _upstream_task
+    if _upstream_task is None:
+        _upstream_task = asyncio.create_task(_run_upstream())
+    queue = asyncio.Queue(maxsize=1)
+    first = public_key not in _watchers
+    _watchers.setdefault(public_key, set()).add(queue)
+    if first:
+        await _subscribe(public_key)
+    return queue
+
+async def unwatch_balance(public_key: str, queue: asyncio.Queue):
+    """Drop a client; the upstream subscription goes when the last one leaves"""
+    queues = _watchers.get(public_key)
+    if queues is None:
+        return
+    queues.discard(queue)
+    if not queues:
+        del _watchers[public_key]
+        await _unsubscribe(public_key)
+
+def get_balance_stream_stats() -> dict:
+    return {
+        "watched_wallets": len(_watchers),
+        "clients": sum(len(queues) for queues in _watchers.values()),
+        "upstream_subscriptions": len(_subscriptions),
+        "connected": _upstream is not None,
+    }
+
+async def close_balance_stream():
+    """Stop the upstream connection; call on shutdown"""
+    global _upstream_task
+    if _upstream_task is not None:
+        _upstream_task.cancel()
+        try:
+            await _upstream_task
+        except asyncio.CancelledError:
+            pass
+        _upstream_task = None
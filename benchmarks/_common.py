@@ -0,0 +1,62 @@
+"""Shared setup for the benchmark scripts.
+
+Puts the repo on sys.path and, through api_loadtest, sets a throwaway
+BOT_TOKEN, FERNET_KEY and an RPC_URL pointing at the fake RPC before
+config is imported, so no benchmark touches zolt.db, Telegram or mainnet.
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import timeit
+from contextlib import asynccontextmanager
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from api_loadtest import RPC_PORT, init_data, wallet  # noqa: E402  (sets the test environment)
+
+import uvicorn  # noqa: E402
+
+import database  # noqa: E402
+from fake_rpc import FakeChain, create_app  # noqa: E402
+
+__all__ = ["RPC_PORT", "init_data", "wallet", "scratch_db", "fake_rpc", "per_call", "percentile", "report"]
+
+def scratch_db() -> str:
+    """Point database.py at a new empty database in a temp directory and migrate it"""
+    database.close_connection()
+    database.DB_NAME = os.path.join(tempfile.mkdtemp(prefix="surfsol-bench-"), "zolt.db")
+    database.init_db()
+    return database.DB_NAME
+
+@asynccontextmanager
+async def fake_rpc(latency: float = 0.0):
+    """Serve fake_rpc.FakeChain on RPC_URL for the duration of the block"""
+    chain = FakeChain(latency)
+    server = uvicorn.Server(uvicorn.Config(create_app(chain), host="127.0.0.1", port=RPC_PORT, log_level="warning"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    try:
+        yield chain
+    finally:
+        server.should_exit = True
+        await task
+
+def per_call(fn, number: int, repeat: int = 3) -> float:
+    """Best-of-`repeat` seconds per call"""
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+def report(results: dict, as_json: bool):
+    """Print {name: {metric: value}} as lines, or as JSON"""
+    if as_json:
+        print(json.dumps(results, indent=2))
+        return
+    for name, metrics in results.items():
+        print(f"{name:28} " + "  ".join(f"{key}={value}" for key, value in metrics.items()))
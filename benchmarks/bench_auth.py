@@ -0,0 +1,53 @@
+"""Time to verify one Mini App initData string: the old per-request
+verification (secret derived on every call), a cache miss in
+telegram_auth and a cache hit.
+
+    python benchmarks/bench_auth.py --calls 20000
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import time
+from urllib.parse import parse_qs
+
+import _common
+import telegram_auth
+from config import BOT_TOKEN
+
+def _old_verify(init_data: str) -> dict:
+    """verify_telegram_data as api.py had it before telegram_auth"""
+    parsed_data = parse_qs(init_data)
+    hash_str = parsed_data.pop('hash')[0]
+    data_check_string = "\n".join(f"{key}={parsed_data[key][0]}" for key in sorted(parsed_data.keys()))
+    secret_key = hmac.new("WebAppData".encode(), BOT_TOKEN.encode(), hashlib.sha256).digest()
+    calculated_hash = hmac.new(secret_key, data_check_string.encode(), hashlib.sha256).hexdigest()
+    if calculated_hash != hash_str:
+        raise ValueError("Invalid data")
+    if time.time() - int(parsed_data.get('auth_date')[0]) > 86400:
+        raise ValueError("Data expired")
+    return json.loads(parsed_data.get('user')[0])
+
+def _miss(init_data: str) -> dict:
+    telegram_auth._verified.clear()
+    return telegram_auth.verify_telegram_data(init_data)
+
+def run(calls: int) -> dict:
+    init_data = _common.init_data(1, int(time.time()))
+    expected = _old_verify(init_data)
+    results = {}
+    for name, verify in (("old", _old_verify), ("cache_miss", _miss), ("cache_hit", telegram_auth.verify_telegram_data)):
+        assert verify(init_data) == expected
+        seconds = _common.per_call(lambda: verify(init_data), number=calls)
+        results[name] = {"us_per_call": round(seconds * 10**6, 2)}
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=20000)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+    _common.report(run(args.calls), args.json)
+
+if __name__ == "__main__":
+    main()
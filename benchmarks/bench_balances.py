@@ -0,0 +1,51 @@
+"""Many wallet balances through get_balances (getMultipleAccounts, 100 keys
+per request) versus one getBalance per key (how the leaderboard fetched
+them before), against the fake JSON-RPC server.
+
+    python benchmarks/bench_balances.py --keys 10000 --per-key 1000
+"""
+import argparse
+import asyncio
+import time
+
+import _common
+import solana_utils
+
+async def _per_key(keys) -> dict:
+    return {key: await solana_utils.get_balance(key, fresh=True) for key in keys}
+
+async def _bulk(keys) -> dict:
+    return await solana_utils.get_balances(keys, fresh=True)
+
+async def _run(keys: int, per_key: int) -> dict:
+    wallets = [_common.wallet(i) for i in range(keys)]
+    results = {}
+    async with _common.fake_rpc() as chain:
+        for i, key in enumerate(wallets):
+            chain.balances[key] = i * 1000
+        # The old path is one round trip per key, so it gets a smaller sample
+        for name, fetch, sample in (("per_key", _per_key, wallets[:per_key]), ("get_balances", _bulk, wallets)):
+            calls = sum(chain.calls.values())
+            start = time.perf_counter()
+            balances = await fetch(sample)
+            elapsed = time.perf_counter() - start
+            assert balances[sample[-1]] == (len(sample) - 1) * 1000 / 10**9
+            results[name] = {
+                "keys": len(sample),
+                "requests": sum(chain.calls.values()) - calls,
+                "ms": round(elapsed * 1000, 1),
+                "us_per_key": round(elapsed / len(sample) * 10**6, 1),
+            }
+        await solana_utils.close_rpc_client()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--keys", type=int, default=10000)
+    parser.add_argument("--per-key", type=int, default=1000, help="keys fetched one by one for the baseline")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+    _common.report(asyncio.run(_run(args.keys, args.per_key)), args.json)
+
+if __name__ == "__main__":
+    main()
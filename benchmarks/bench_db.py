@@ -0,0 +1,56 @@
+"""Ops/s of database.py calls on the pooled per-thread connection versus a
+fresh connection per call (how every function worked before pooling).
+
+    python benchmarks/bench_db.py --users 1000 --calls 5000
+"""
+import argparse
+import random
+import sqlite3
+
+import _common
+import database
+
+def _per_call_connection():
+    # Default PRAGMAs, closed when the function's reference goes away
+    return sqlite3.connect(database.DB_NAME, timeout=database.DB_TIMEOUT)
+
+def run(users: int, calls: int) -> dict:
+    _common.scratch_db()
+    rng = random.Random(1)
+    for user_id in range(1, users + 1):
+        database.add_user(user_id, f"pk{user_id}", "key")
+        database.record_deposit(user_id, round(rng.uniform(1, 50), 2))
+        database.add_first_deposit_bonus(user_id, 5)
+    ids = [rng.randint(1, users) for _ in range(calls)]
+
+    operations = {
+        "get_user": lambda: [database.get_user(i) for i in ids],
+        "get_user_bonus": lambda: [database.get_user_bonus(i) for i in ids],
+        "get_user_initial_deposit": lambda: [database.get_user_initial_deposit(i) for i in ids],
+        "record_deposit": lambda: [database.record_deposit(i, 1.0) for i in ids],
+    }
+    pooled_connection = database.get_connection
+    results = {}
+    for name, operation in operations.items():
+        row = {}
+        for mode, get_connection in (("per_call", _per_call_connection), ("pooled", pooled_connection)):
+            database.get_connection = get_connection
+            try:
+                seconds = _common.per_call(operation, number=1, repeat=3) / len(ids)
+            finally:
+                database.get_connection = pooled_connection
+            row[f"{mode}_ops_s"] = round(1 / seconds)
+        row["speedup"] = round(row["pooled_ops_s"] / row["per_call_ops_s"], 1)
+        results[name] = row
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--calls", type=int, default=5000, help="calls per operation and mode")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+    _common.report(run(args.users, args.calls), args.json)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""/health latency while clients hammer /api/deposit, with database calls on
+the DB thread (async_db) versus run inline on the event loop (how the API
+called database.py before).
+
+Everything runs in this process: the API over httpx's ASGI transport and
+the fake RPC under uvicorn. Each deposit client makes a fake-chain
+transfer to its wallet and then posts /api/deposit, so every request
+indexes and records a new deposit.
+
+    python benchmarks/bench_db_thread.py --clients 50 --seconds 5
+"""
+import argparse
+import asyncio
+import json
+import subprocess
+import sys
+import time
+
+import _common
+import async_db
+import database
+import httpx
+
+FIRST_USER_ID = 8_000_000_000
+MODES = ["inline", "db_thread"]
+
+async def _inline(fn, *args, **kwargs):
+    return fn(*args, **kwargs)
+
+async def _run(clients: int, seconds: float, inline: bool) -> dict:
+    _common.scratch_db()
+    for i in range(clients):
+        database.add_user(FIRST_USER_ID + i, _common.wallet(FIRST_USER_ID + i), "bench")
+
+    import api
+    original = async_db.run_in_db_thread
+    if inline:
+        async_db.run_in_db_thread = _inline
+    deposits = 0
+    health = []
+    try:
+        async with _common.fake_rpc() as chain:
+            transport = httpx.ASGITransport(app=api.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://api") as client:
+                stop = time.perf_counter() + seconds
+
+                async def depositor(user_id: int):
+                    nonlocal deposits
+                    headers = {"Authorization": f"Bearer {_common.init_data(user_id, int(time.time()))}"}
+                    while time.perf_counter() < stop:
+                        chain.transfer(_common.wallet(user_id), 10**8)
+                        response = await client.post("/api/deposit", json={}, headers=headers)
+                        deposits += response.status_code == 200
+
+                async def prober():
+                    while time.perf_counter() < stop:
+                        start = time.perf_counter()
+                        await client.get("/health")
+                        health.append(time.perf_counter() - start)
+                        await asyncio.sleep(0.005)
+
+                await asyncio.gather(prober(), *(depositor(FIRST_USER_ID + i) for i in range(clients)))
+    finally:
+        async_db.run_in_db_thread = original
+    return {
+        "deposits_per_s": round(deposits / seconds, 1),
+        "health_probes": len(health),
+        "health_p50_ms": round(_common.percentile(health, 0.50) * 1000, 2),
+        "health_p99_ms": round(_common.percentile(health, 0.99) * 1000, 2),
+        "health_max_ms": round(max(health) * 1000, 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=5.0, help="duration of each mode")
+    parser.add_argument("--json", action="store_true")
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.mode:
+        print(json.dumps(asyncio.run(_run(args.clients, args.seconds, args.mode == "inline"))))
+        return
+    # One process per mode, so module-level state (RPC client, locks, caches) starts clean
+    results = {}
+    for mode in MODES:
+        output = subprocess.run(
+            [sys.executable, __file__, "--clients", str(args.clients), "--seconds", str(args.seconds), "--mode", mode],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        results[mode] = json.loads(output.splitlines()[-1])
+    _common.report(results, args.json)
+
+if __name__ == "__main__":
+    main()
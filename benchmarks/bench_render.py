@@ -0,0 +1,85 @@
+"""Bot render-path microbenchmark: escape_md and the main, about and wallet
+screens, as main.py built them per call before MENUS versus now. Old and
+new output are checked equal before timing.
+
+    python benchmarks/bench_render.py --number 50000
+"""
+import argparse
+import re
+
+import _common
+import main as bot
+from main import MESSAGES, MENUS, MINI_APP_URL, InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo
+
+ADDRESS = _common.wallet(1)
+BALANCE = 12.345678
+
+def _old_escape_md(text: str) -> str:
+    reserved_chars = r'_*[]()~`>#+-=|{}.!'
+    return re.sub(f'([{re.escape(reserved_chars)}])', r'\\\1', str(text))
+
+def _old_main_menu(lang: str):
+    keyboard = [
+        [
+            InlineKeyboardButton(MESSAGES[lang]['play_btn'], web_app=WebAppInfo(url=MINI_APP_URL)),
+        ],
+        [
+            InlineKeyboardButton(MESSAGES[lang]['about_btn'], callback_data='about'),
+            InlineKeyboardButton(MESSAGES[lang]['resp_btn'], callback_data='responsible')
+        ],
+        [
+            InlineKeyboardButton(MESSAGES[lang]['how_btn'], callback_data='how_to'),
+            InlineKeyboardButton(MESSAGES[lang]['support_btn'], url='https://t.me/solsurfcasino')
+        ]
+    ]
+    return MESSAGES[lang]['welcome'], InlineKeyboardMarkup(keyboard)
+
+def _new_main_menu(lang: str):
+    view = MENUS[lang].main
+    return view.text, view.reply_markup
+
+def _old_about(lang: str):
+    keyboard = [[InlineKeyboardButton(MESSAGES[lang]['back_btn'], callback_data='start_menu')]]
+    return MESSAGES[lang]['about'], InlineKeyboardMarkup(keyboard)
+
+def _new_about(lang: str):
+    view = MENUS[lang].about
+    return view.text, view.reply_markup
+
+def _wallet(escape_md, keyboard):
+    def render(lang: str):
+        text = MESSAGES[lang]['wallet_title'].format(address=escape_md(ADDRESS), balance=escape_md(f"{BALANCE:.4f}"))
+        return text, keyboard(lang)
+    return render
+
+def _old_wallet_keyboard(lang: str):
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton(MESSAGES[lang]['refresh_btn'], callback_data='wallet')],
+        [InlineKeyboardButton(MESSAGES[lang]['back_btn'], callback_data='start_menu')]
+    ])
+
+CASES = {
+    "escape_md": (_old_escape_md, bot.escape_md, "Balance: 1.2345 SOL (see [docs]) - thanks!"),
+    "main_menu": (_old_main_menu, _new_main_menu, "en"),
+    "about_screen": (_old_about, _new_about, "en"),
+    "wallet_screen": (_wallet(_old_escape_md, _old_wallet_keyboard), _wallet(bot.escape_md, lambda lang: MENUS[lang].wallet_keyboard), "en"),
+}
+
+def run(number: int) -> dict:
+    results = {}
+    for name, (old, new, arg) in CASES.items():
+        assert old(arg) == new(arg), name
+        old_s = _common.per_call(lambda: old(arg), number=number)
+        new_s = _common.per_call(lambda: new(arg), number=number)
+        results[name] = {"old_us": round(old_s * 10**6, 2), "new_us": round(new_s * 10**6, 2)}
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=50000, help="iterations per timing (best of 3)")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+    _common.report(run(args.number), args.json)
+
+if __name__ == "__main__":
+    main()
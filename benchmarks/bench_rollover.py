@@ -0,0 +1,82 @@
+"""Bonus rollover bet events through the API, one /api/bonus/rollover
+request per ball versus one /api/bonus/rollover/batch request per drop.
+
+Each user gets a first deposit bonus (2.0, so 120 to roll over) and then
+plays --drops drops of --balls balls; with the default bet sizes most
+users convert partway through. Runs over httpx's ASGI transport on a
+scratch database and checks the ledger balances afterwards.
+
+    python benchmarks/bench_rollover.py --users 20 --drops 4 --balls 25
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import _common
+import database
+import httpx
+
+FIRST_USER_ID = 9_000_000_000
+
+async def _play(client, user_id: int, drops: list, batch: bool) -> int:
+    headers = {"Authorization": f"Bearer {_common.init_data(user_id, int(time.time()))}"}
+    requests = 0
+    for balls in drops:
+        if batch:
+            response = await client.post("/api/bonus/rollover/batch", json={"events": [{"amount": a} for a in balls]}, headers=headers)
+            response.raise_for_status()
+            requests += 1
+            continue
+        for amount in balls:
+            response = await client.post("/api/bonus/rollover", json={"amount": amount}, headers=headers)
+            response.raise_for_status()
+            requests += 1
+    return requests
+
+async def _run(users: int, drops: int, balls: int) -> dict:
+    _common.scratch_db()
+    rng = random.Random(1)
+    plays = {}
+    for mode_index, mode in enumerate(("per_event", "batch")):
+        for i in range(users):
+            user_id = FIRST_USER_ID + mode_index * users + i
+            database.add_user(user_id, _common.wallet(user_id), "bench")
+            database.record_deposit(user_id, 10.0)
+            database.add_first_deposit_bonus(user_id, 10.0)
+            plays.setdefault(mode, {})[user_id] = [[round(rng.uniform(0.5, 2.0), 2) for _ in range(balls)] for _ in range(drops)]
+
+    import api
+    results = {}
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://api") as client:
+        for mode, users_drops in plays.items():
+            start = time.perf_counter()
+            requests = sum(await asyncio.gather(*(
+                _play(client, user_id, user_drops, mode == "batch") for user_id, user_drops in users_drops.items()
+            )))
+            elapsed = time.perf_counter() - start
+            events = users * drops * balls
+            converted = sum(database.get_user_bonus(user_id)['is_converted'] for user_id in users_drops)
+            results[mode] = {
+                "events": events,
+                "requests": requests,
+                "seconds": round(elapsed, 3),
+                "us_per_event": round(elapsed / events * 10**6, 1),
+                "converted_users": converted,
+            }
+    ledger = database.check_ledger()
+    assert ledger["balanced"] and not ledger["mismatched_accounts"], ledger
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--drops", type=int, default=4)
+    parser.add_argument("--balls", type=int, default=25)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+    _common.report(asyncio.run(_run(args.users, args.drops, args.balls)), args.json)
+
+if __name__ == "__main__":
+    main()
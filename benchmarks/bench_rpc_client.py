@@ -0,0 +1,49 @@
+"""Sequential getBalance calls through the shared keep-alive RPC client
+versus an AsyncClient opened and closed per call (how get_balance worked
+before), against the fake JSON-RPC server.
+
+    python benchmarks/bench_rpc_client.py --calls 500
+"""
+import argparse
+import asyncio
+import time
+
+import _common
+import solana_utils
+from config import RPC_URL
+from solana.rpc.async_api import AsyncClient
+from solders.pubkey import Pubkey
+
+async def _per_call(key: str) -> float:
+    async with AsyncClient(RPC_URL) as client:
+        response = await client.get_balance(Pubkey.from_string(key))
+    return response.value / 10**9
+
+async def _shared(key: str) -> float:
+    # fresh=True skips the balance cache, so every call reaches the RPC
+    return await solana_utils.get_balance(key, fresh=True)
+
+async def _run(calls: int) -> dict:
+    key = _common.wallet(1)
+    results = {}
+    async with _common.fake_rpc() as chain:
+        chain.balances[key] = 10**9
+        for name, fetch in (("per_call_client", _per_call), ("shared_client", _shared)):
+            await fetch(key)
+            start = time.perf_counter()
+            for _ in range(calls):
+                await fetch(key)
+            elapsed = time.perf_counter() - start
+            results[name] = {"ms_per_call": round(elapsed / calls * 1000, 2), "calls_per_s": round(calls / elapsed)}
+        await solana_utils.close_rpc_client()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+    _common.report(asyncio.run(_run(args.calls)), args.json)
+
+if __name__ == "__main__":
+    main()
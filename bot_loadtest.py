@@ -0,0 +1,190 @@
+"""Replay synthetic Telegram updates against the webhook bot.
+
+Starts a local stand-in for the Bot API and the Solana RPC (each with
+configurable latency), runs the bot in webhook mode behind api.py, POSTs
+synthetic updates to /telegram/webhook and reports throughput, per-update
+latency and whether every user's updates were handled strictly in order.
+
+    python bot_loadtest.py --users 50 --updates-per-user 12 --concurrency 1 32
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import socket
+import tempfile
+import time
+
+# Every run talks only to the stand-ins, never to Telegram or mainnet
+_RPC_PORT_HOLDER = socket.socket()
+_RPC_PORT_HOLDER.bind(("127.0.0.1", 0))
+STANDIN_PORT = _RPC_PORT_HOLDER.getsockname()[1]
+_RPC_PORT_HOLDER.close()
+os.environ["RPC_URL"] = f"http://127.0.0.1:{STANDIN_PORT}/rpc"
+os.environ["BALANCE_CACHE_TTL"] = "0"  # every wallet view pays the RPC round trip
+# Empty (not unset) so config's load_dotenv() can't fill them back in
+os.environ["LOG_CHAT_ID"] = ""
+os.environ["BOT_WEBHOOK_URL"] = ""
+
+import httpx
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from telegram import Update
+from telegram.ext import TypeHandler
+
+import database
+import api
+import bot_webhook
+from main import build_application
+
+# Presses after /start, cycled per user; wallet views hit the (slow) RPC
+SCRIPT = ["set_lang_en", "confirm_age", "wallet", "start_menu", "about", "start_menu",
+          "wallet", "how_to", "responsible", "start_menu", "play", "wallet"]
+
+def make_standin(api_latency: float, rpc_latency: float):
+    """Bot API + JSON-RPC stand-in; returns the ASGI app and its call counter"""
+    calls = {"bot_api": 0, "rpc": 0}
+
+    async def bot_method(request: Request):
+        calls["bot_api"] += 1
+        await asyncio.sleep(api_latency)
+        method = request.path_params["method"]
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Stand-in", "username": "standin_bot"}
+        elif method.startswith(("send", "edit")):
+            result = {"message_id": 1, "date": int(time.time()), "chat": {"id": 1, "type": "private"}}
+        else:
+            result = True
+        return JSONResponse({"ok": True, "result": result})
+
+    async def rpc(request: Request):
+        calls["rpc"] += 1
+        await asyncio.sleep(rpc_latency)
+        body = await request.json()
+        return JSONResponse({"jsonrpc": "2.0", "id": body.get("id"),
+                             "result": {"context": {"slot": 1}, "value": 1_500_000_000}})
+
+    app = Starlette(routes=[
+        Route("/bot{token}/{method}", bot_method, methods=["GET", "POST"]),
+        Route("/rpc", rpc, methods=["POST"]),
+    ])
+    return app, calls
+
+def synthetic_updates(users: int, per_user: int, first_user: int):
+    """Interleaved /start + button presses, round-robin across users"""
+    update_ids = itertools.count(1)
+    per_user_payloads = []
+    for user_id in range(first_user, first_user + users):
+        sender = {"id": user_id, "is_bot": False, "first_name": "Load", "username": f"load{user_id}"}
+        chat = {"id": user_id, "type": "private"}
+        payloads = [{"message": {
+            "message_id": 1, "date": int(time.time()), "chat": chat, "from": sender,
+            "text": "/start", "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+        }}]
+        for data in itertools.islice(itertools.cycle(SCRIPT), per_user - 1):
+            payloads.append({"callback_query": {
+                "id": str(user_id), "from": sender, "chat_instance": str(user_id), "data": data,
+                "message": {"message_id": 1, "date": int(time.time()), "chat": chat, "text": "menu"},
+            }})
+        per_user_payloads.append(payloads)
+    for round_ in itertools.zip_longest(*per_user_payloads):
+        for payload in round_:
+            if payload is not None:
+                payload["update_id"] = next(update_ids)
+                yield payload
+
+async def run_once(concurrency: int, users: int, per_user: int, first_user: int, base_url: str) -> dict:
+    started, finished = {}, {}
+    done = asyncio.Event()
+    total = users * per_user
+
+    async def on_start(update, context):
+        started[update.update_id] = (update.effective_user.id, time.perf_counter())
+
+    async def on_finish(update, context):
+        finished[update.update_id] = time.perf_counter()
+        if len(finished) == total:
+            done.set()
+
+    application = build_application(concurrent_updates=concurrency, base_url=base_url)
+    application.add_handler(TypeHandler(Update, on_start), group=-1)
+    application.add_handler(TypeHandler(Update, on_finish), group=1)
+    await bot_webhook.start_bot_webhook(application, webhook_url="http://loadtest.invalid")
+
+    posted = {}
+    transport = httpx.ASGITransport(app=api.app)
+    headers = {"X-Telegram-Bot-Api-Secret-Token": bot_webhook.WEBHOOK_SECRET}
+    t0 = time.perf_counter()
+    async with httpx.AsyncClient(transport=transport, base_url="http://api") as client:
+        for payload in synthetic_updates(users, per_user, first_user):
+            posted[payload["update_id"]] = time.perf_counter()
+            response = await client.post(bot_webhook.WEBHOOK_PATH, json=payload, headers=headers)
+            response.raise_for_status()
+    await asyncio.wait_for(done.wait(), timeout=600)
+    elapsed = time.perf_counter() - t0
+    await bot_webhook.stop_bot_webhook()
+
+    # Per-user ordering: each update starts after the previous one finished
+    violations = 0
+    by_user = {}
+    for update_id in sorted(started):
+        by_user.setdefault(started[update_id][0], []).append(update_id)
+    for update_ids in by_user.values():
+        for prev, cur in zip(update_ids, update_ids[1:]):
+            if started[cur][1] < finished[prev]:
+                violations += 1
+
+    latencies = sorted(finished[i] - posted[i] for i in finished)
+    return {
+        "concurrency": concurrency,
+        "updates": total,
+        "elapsed_s": round(elapsed, 3),
+        "updates_per_s": round(total / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 1),
+        "ordering_violations": violations,
+    }
+
+async def main_async(args):
+    standin, calls = make_standin(args.api_latency, args.rpc_latency)
+    server = uvicorn.Server(uvicorn.Config(standin, host="127.0.0.1", port=STANDIN_PORT, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_NAME = os.path.join(tmp, "loadtest.db")
+        for i, concurrency in enumerate(args.concurrency):
+            # Fresh users per run so every run walks the same onboarding path
+            result = await run_once(concurrency, args.users, args.updates_per_user,
+                                    first_user=1_000_000 * (i + 1),
+                                    base_url=f"http://127.0.0.1:{STANDIN_PORT}/bot")
+            results.append(result)
+            if not args.json:
+                print(", ".join(f"{key}={value}" for key, value in result.items()))
+
+    server.should_exit = True
+    await server_task
+    if args.json:
+        print(json.dumps({"results": results, "standin_calls": calls}, indent=2))
+
+def main():
+    for name in ("httpx", "httpx2", "telegram"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--updates-per-user", type=int, default=12)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 32])
+    parser.add_argument("--api-latency", type=float, default=0.03, help="seconds per Bot API call")
+    parser.add_argument("--rpc-latency", type=float, default=0.2, help="seconds per RPC call")
+    parser.add_argument("--json", action="store_true")
+    asyncio.run(main_async(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
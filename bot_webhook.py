@@ -0,0 +1,65 @@
+"""Run the Telegram bot in webhook mode inside the API process.
+
+When BOT_WEBHOOK_URL is set, api.py starts the bot application in its
+lifespan and Telegram POSTs updates to /telegram/webhook. Each update is
+acknowledged as soon as it is queued; the bot processes it concurrently
+with other users' updates (see update_processor.py). The bot shares the
+API's database connection, RPC client and profiler, which the API opens
+and closes.
+"""
+import hashlib
+import hmac
+
+from telegram import Update
+
+from config import BOT_TOKEN, BOT_WEBHOOK_URL, BOT_WEBHOOK_SECRET
+
+WEBHOOK_PATH = "/telegram/webhook"
+
+# Telegram echoes this in X-Telegram-Bot-Api-Secret-Token on every delivery
+WEBHOOK_SECRET = BOT_WEBHOOK_SECRET or hashlib.sha256(f"webhook:{BOT_TOKEN}".encode()).hexdigest()
+
+_application = None
+
+async def start_bot_webhook(application=None, webhook_url: str = BOT_WEBHOOK_URL):
+    """Start the bot and register the webhook; no-op unless a webhook URL is configured"""
+    global _application
+    if _application is not None or not webhook_url:
+        return
+    if application is None:
+        from main import build_application
+        application = build_application()
+
+    await application.initialize()
+    # The API lifespan owns the DB, RPC client and profiler; main.py's hooks skip them
+    application.bot_data["embedded"] = True
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+    await application.bot.set_webhook(
+        url=webhook_url.rstrip("/") + WEBHOOK_PATH,
+        secret_token=WEBHOOK_SECRET,
+        allowed_updates=Update.ALL_TYPES,
+    )
+    _application = application
+
+async def stop_bot_webhook():
+    """Stop the bot after the updates already queued are processed; call on shutdown"""
+    global _application
+    if _application is None:
+        return
+    application, _application = _application, None
+    await application.stop()
+    if application.post_shutdown:
+        await application.post_shutdown(application)
+    await application.shutdown()
+
+def check_webhook_secret(secret: str) -> bool:
+    return hmac.compare_digest(secret or "", WEBHOOK_SECRET)
+
+async def enqueue_update(payload: dict) -> bool:
+    """Queue one webhook payload for processing; False if the bot isn't running"""
+    if _application is None:
+        return False
+    await _application.update_queue.put(Update.de_json(payload, _application.bot))
+    return True
@@ -8,7 +8,96 @@ HOUSE_WALLET_ADDRESS = os.getenv("HOUSE_WALLET_ADDRESS", "GTZkkfszq8sLsqsdWNfjuM
 FERNET_KEY = os.getenv("FERNET_KEY")
 LOG_CHAT_ID = os.getenv("LOG_CHAT_ID")
 RPC_URL = os.getenv("RPC_URL", "https://api.mainnet-beta.solana.com")
+WS_RPC_URL = os.getenv("WS_RPC_URL", RPC_URL.replace("https://", "wss://", 1).replace("http://", "ws://", 1))
 MINI_APP_URL = os.getenv("MINI_APP_URL", "https://surfsol-casino1.vercel.app/")
+# Main menu banner: an image URL or a local file path
+WELCOME_BANNER = os.getenv("WELCOME_BANNER", "https://placehold.co/1200x800/0077be/FFFFFF/png?text=SURFSOL+CASINO")
+
+# Shared Solana RPC client: request timeout (seconds), connection pool
+# size and how long idle keep-alive connections are held open (seconds)
+RPC_TIMEOUT = float(os.getenv("RPC_TIMEOUT", "10"))
+RPC_POOL_SIZE = int(os.getenv("RPC_POOL_SIZE", "20"))
+RPC_KEEPALIVE_EXPIRY = float(os.getenv("RPC_KEEPALIVE_EXPIRY", "60"))
+# How many getMultipleAccounts chunks may be in flight at once
+RPC_BATCH_CONCURRENCY = int(os.getenv("RPC_BATCH_CONCURRENCY", "4"))
+
+# Wallet balance cache: seconds a balance stays fresh and max wallets kept
+BALANCE_CACHE_TTL = float(os.getenv("BALANCE_CACHE_TTL", "15"))
+BALANCE_CACHE_SIZE = int(os.getenv("BALANCE_CACHE_SIZE", "10000"))
+
+# Leaderboard snapshot: rebuild interval (seconds), how old a wallet's
+# balance may get before it is re-checked, and max re-checks per rebuild
+LEADERBOARD_REFRESH_INTERVAL = float(os.getenv("LEADERBOARD_REFRESH_INTERVAL", "30"))
+LEADERBOARD_STALE_AFTER = float(os.getenv("LEADERBOARD_STALE_AFTER", "120"))
+LEADERBOARD_MAX_CHECKS = int(os.getenv("LEADERBOARD_MAX_CHECKS", "5000"))
+
+# Seconds between on-chain reconciliations of the ledger's wallet accounts
+LEDGER_RECONCILE_INTERVAL = float(os.getenv("LEDGER_RECONCILE_INTERVAL", "60"))
+
+# Deposit indexer: seconds between passes, wallets indexed at once,
+# transactions fetched per batch and max new signatures per wallet per pass
+INDEXER_INTERVAL = float(os.getenv("INDEXER_INTERVAL", "20"))
+INDEXER_WORKERS = int(os.getenv("INDEXER_WORKERS", "8"))
+INDEXER_BATCH_SIZE = int(os.getenv("INDEXER_BATCH_SIZE", "20"))
+INDEXER_MAX_SIGNATURES = int(os.getenv("INDEXER_MAX_SIGNATURES", "1000"))
+
+# Max bet events accepted by one /api/bonus/rollover/batch request
+ROLLOVER_BATCH_MAX = int(os.getenv("ROLLOVER_BATCH_MAX", "500"))
+
+# Admin withdrawal queue: rows per page and max ids per bulk action
+ADMIN_PAGE_SIZE = int(os.getenv("ADMIN_PAGE_SIZE", "50"))
+ADMIN_BULK_MAX = int(os.getenv("ADMIN_BULK_MAX", "1000"))
+
+# Metric rollups: hours of per-minute and days of per-hour buckets kept
+# (per-day buckets are kept forever)
+METRICS_MINUTE_RETENTION_HOURS = int(os.getenv("METRICS_MINUTE_RETENTION_HOURS", "48"))
+METRICS_HOUR_RETENTION_DAYS = int(os.getenv("METRICS_HOUR_RETENTION_DAYS", "90"))
+
+# Prometheus metrics: optional bearer token required by the API's
+# /metrics, and where the standalone (polling) bot serves its own
+# (empty port = don't serve)
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+BOT_METRICS_HOST = os.getenv("BOT_METRICS_HOST", "127.0.0.1")
+BOT_METRICS_PORT = os.getenv("BOT_METRICS_PORT", "9101")
+
+# Verified initData cache: seconds a verified string is trusted without
+# re-checking its HMAC and max strings kept
+INIT_DATA_CACHE_TTL = float(os.getenv("INIT_DATA_CACHE_TTL", "300"))
+INIT_DATA_CACHE_SIZE = int(os.getenv("INIT_DATA_CACHE_SIZE", "4096"))
+
+# Bot user profile cache: max profiles kept in memory
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "50000"))
+
+# Admin chat activity digests: seconds between digests, max events held
+# before the overflow is spilled to a file, and minimum seconds between
+# messages (Telegram allows about 20 per minute in a group)
+ACTIVITY_LOG_FLUSH_INTERVAL = float(os.getenv("ACTIVITY_LOG_FLUSH_INTERVAL", "10"))
+ACTIVITY_LOG_MAX_PENDING = int(os.getenv("ACTIVITY_LOG_MAX_PENDING", "5000"))
+ACTIVITY_LOG_MIN_SEND_INTERVAL = float(os.getenv("ACTIVITY_LOG_MIN_SEND_INTERVAL", "3"))
+ACTIVITY_LOG_SPILL_PATH = os.getenv("ACTIVITY_LOG_SPILL_PATH", "activity_log_spill.txt")
+
+# Bot update handling: updates processed at once (one user's updates
+# always run in order), and the public base URL Telegram should deliver
+# webhooks to (unset = long polling). The secret defaults to one derived
+# from BOT_TOKEN.
+BOT_CONCURRENT_UPDATES = int(os.getenv("BOT_CONCURRENT_UPDATES", "32"))
+BOT_WEBHOOK_URL = os.getenv("BOT_WEBHOOK_URL")
+BOT_WEBHOOK_SECRET = os.getenv("BOT_WEBHOOK_SECRET")
+
+# Key for the referral code permutation; defaults to one derived from
+# FERNET_KEY. Changing it changes every user's code.
+REFERRAL_CODE_KEY = os.getenv("REFERRAL_CODE_KEY")
+
+# Database profiling of async_db calls: off unless DB_PROFILE=1. Calls
+# slower than DB_SLOW_QUERY_MS are appended to DB_SLOW_QUERY_LOG; p99s
+# come from each function's last DB_PROFILE_SAMPLES durations, and every
+# process saves its summary for the admin dashboard every
+# DB_PROFILE_FLUSH_INTERVAL seconds
+DB_PROFILE = os.getenv("DB_PROFILE", "0") == "1"
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "100"))
+DB_SLOW_QUERY_LOG = os.getenv("DB_SLOW_QUERY_LOG", "slow_queries.log")
+DB_PROFILE_SAMPLES = int(os.getenv("DB_PROFILE_SAMPLES", "1024"))
+DB_PROFILE_FLUSH_INTERVAL = float(os.getenv("DB_PROFILE_FLUSH_INTERVAL", "30"))
 
 if not BOT_TOKEN:
     raise ValueError("BOT_TOKEN not found in environment variables")
@@ -1,158 +1,125 @@
+import json
 import sqlite3
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta, timezone
+
+from config import METRICS_MINUTE_RETENTION_HOURS, METRICS_HOUR_RETENTION_DAYS
+from migrations import apply_migrations
+from referral_codes import encode_referral_code, decode_referral_code
 
 DB_NAME = "zolt.db"
+# Larger than any rowid; the first keyset page starts below it
+MAX_ID = 2**63 - 1
+
+# Connection tuning (cache_size is in KiB when negative)
+DB_TIMEOUT = 30
+DB_CACHE_SIZE_KB = 16000
+DB_MMAP_SIZE = 128 * 1024 * 1024
+DB_STATEMENT_CACHE = 256
+
+_local = threading.local()
+
+def _open_connection(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=DB_TIMEOUT, cached_statements=DB_STATEMENT_CACHE)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+def get_connection() -> sqlite3.Connection:
+    """Return this thread's pooled connection, opening it on first use"""
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.path != DB_NAME:
+        if conn is not None:
+            conn.close()
+        conn = _open_connection(DB_NAME)
+        _local.conn = conn
+        _local.path = DB_NAME
+    return conn
+
+def close_connection():
+    """Close this thread's pooled connection (if any)"""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
 
 def init_db():
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    
-    # Create all tables
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            user_id INTEGER PRIMARY KEY,
-            public_key TEXT,
-            encrypted_private_key TEXT,
-            language TEXT DEFAULT 'en',
-            is_verified INTEGER DEFAULT 0,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Create deposits table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS deposits (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            amount REAL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Create pending_withdrawals table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS pending_withdrawals (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            amount REAL,
-            address TEXT,
-            reason TEXT,
-            status TEXT DEFAULT 'pending',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            processed_at TIMESTAMP NULL
-        )
-    ''')
-    
-    # Create user_bonuses table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS user_bonuses (
-            user_id INTEGER PRIMARY KEY,
-            bonus_balance REAL DEFAULT 0,
-            total_rolled REAL DEFAULT 0,
-            required_rollover REAL DEFAULT 0,
-            is_converted INTEGER DEFAULT 0,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Create referrals table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS referrals (
-            user_id INTEGER PRIMARY KEY,
-            referral_code TEXT UNIQUE,
-            referred_by INTEGER NULL,
-            total_deposits REAL DEFAULT 0,
-            referral_earnings REAL DEFAULT 0,
-            referral_count INTEGER DEFAULT 0,
-            tier_level INTEGER DEFAULT 1,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Migration: Add missing columns if table already existed
-    cursor.execute("PRAGMA table_info(users)")
-    columns = [column[1] for column in cursor.fetchall()]
-    
-    if 'language' not in columns:
-        cursor.execute('ALTER TABLE users ADD COLUMN language TEXT DEFAULT "en"')
-    if 'is_verified' not in columns:
-        cursor.execute('ALTER TABLE users ADD COLUMN is_verified INTEGER DEFAULT 0')
-        
-    conn.commit()
-    conn.close()
-
-def add_user(user_id, public_key=None, encrypted_private_key=None, language='en'):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+    """Bring the schema up to date; call once at process startup"""
+    apply_migrations(get_connection())
+
+def add_user(user_id, public_key=None, encrypted_private_key=None, language='en') -> bool:
+    """Insert a new user; returns False if the user already exists"""
+    conn = get_connection()
     try:
-        cursor.execute('''
-            INSERT INTO users (user_id, public_key, encrypted_private_key, language)
-            VALUES (?, ?, ?, ?)
-        ''', (user_id, public_key, encrypted_private_key, language))
-        conn.commit()
+        with conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO users (user_id, public_key, encrypted_private_key, language)
+                VALUES (?, ?, ?, ?)
+            ''', (user_id, public_key, encrypted_private_key, language))
+            _bump_metric(cursor, 'new_users')
+        return True
     except sqlite3.IntegrityError:
-        pass  # User already exists
-    finally:
-        conn.close()
+        return False  # User already exists
 
 def get_user_initial_deposit(user_id: int) -> float:
     """Get user's initial deposit amount (for withdrawal logic)"""
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS deposits (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            amount REAL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
     cursor.execute('''
         SELECT MIN(amount) FROM deposits WHERE user_id = ?
     ''', (user_id,))
     result = cursor.fetchone()
-    conn.close()
     return result[0] if result and result[0] else 0
 
-def record_deposit(user_id: int, amount: float):
-    """Record a deposit for the user"""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS deposits (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            amount REAL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    cursor.execute('''
-        INSERT INTO deposits (user_id, amount)
-        VALUES (?, ?)
-    ''', (user_id, amount))
-    conn.commit()
-    conn.close()
+def record_deposit(user_id: int, amount: float, signature: str = None) -> bool:
+    """Record a deposit for the user.
+
+    Deposits seen on chain pass their transaction signature; recording the
+    same signature again is a no-op and returns False.
+    """
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute('''
+                INSERT INTO deposits (user_id, amount, signature)
+                VALUES (?, ?, ?)
+            ''', (user_id, amount, signature))
+        except sqlite3.IntegrityError:
+            return False  # signature already recorded
+        units = to_units(amount)
+        _post(cursor, 'deposit', [_user_leg(user_id, 'wallet', units), (CHAIN_ACCOUNT, None, -units)],
+              reference=f"deposit:{signature or cursor.lastrowid}")
+        _bump_metric(cursor, 'deposits', amount)
+    return True
 
 def update_user_language(user_id, language):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('UPDATE users SET language = ? WHERE user_id = ?', (language, user_id))
-    conn.commit()
-    conn.close()
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute('UPDATE users SET language = ? WHERE user_id = ?', (language, user_id))
 
 def verify_user(user_id):
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('UPDATE users SET is_verified = 1 WHERE user_id = ?', (user_id,))
-    conn.commit()
-    conn.close()
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute('UPDATE users SET is_verified = 1 WHERE user_id = ?', (user_id,))
+
+def set_user_wallet(user_id, public_key, encrypted_private_key):
+    """Attach a freshly generated wallet to an existing user"""
+    conn = get_connection()
+    with conn:
+        conn.execute('UPDATE users SET public_key = ?, encrypted_private_key = ? WHERE user_id = ?', (public_key, encrypted_private_key, user_id))
 
 def get_user(user_id):
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute('SELECT public_key, encrypted_private_key, language, is_verified FROM users WHERE user_id = ?', (user_id,))
     user = cursor.fetchone()
-    conn.close()
     if user:
         return {
             "public_key": user[0],
@@ -164,11 +131,10 @@ def get_user(user_id):
 
 def get_all_users():
     """Get all users from database for leaderboard"""
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute('SELECT user_id, public_key, language FROM users WHERE public_key IS NOT NULL')
     users = cursor.fetchall()
-    conn.close()
     return [
         {
             "user_id": u[0],
@@ -181,39 +147,32 @@ def get_all_users():
 
 def add_pending_withdrawal(user_id: int, amount: float, address: str, reason: str):
     """Add withdrawal to pending list"""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS pending_withdrawals (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            amount REAL,
-            address TEXT,
-            reason TEXT,
-            status TEXT DEFAULT 'pending',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            processed_at TIMESTAMP NULL
-        )
-    ''')
-    cursor.execute('''
-        INSERT INTO pending_withdrawals (user_id, amount, address, reason)
-        VALUES (?, ?, ?, ?)
-    ''', (user_id, amount, address, reason))
-    conn.commit()
-    conn.close()
-
-def get_pending_withdrawals():
-    """Get all pending withdrawals for admin dashboard"""
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO pending_withdrawals (user_id, amount, address, reason)
+            VALUES (?, ?, ?, ?)
+        ''', (user_id, amount, address, reason))
+        _bump_metric(cursor, 'withdrawals_requested', amount)
+        _adjust_gauge(cursor, 'pending_withdrawals', 1, amount)
+
+def get_pending_withdrawals(limit: int = 50, before_id: int = None):
+    """One page of pending withdrawals, newest first.
+
+    Keyset pagination: pass the last id of a page as before_id to get the
+    next one, so every page costs the same however long the queue is.
+    """
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute('''
         SELECT id, user_id, amount, address, reason, created_at
         FROM pending_withdrawals
-        WHERE status = 'pending'
-        ORDER BY created_at DESC
-    ''')
+        WHERE status = 'pending' AND id < ?
+        ORDER BY id DESC
+        LIMIT ?
+    ''', (before_id if before_id is not None else MAX_ID, limit))
     withdrawals = cursor.fetchall()
-    conn.close()
     return [
         {
             "id": w[0],
@@ -226,51 +185,81 @@ def get_pending_withdrawals():
         for w in withdrawals
     ]
 
+def count_pending_withdrawals() -> int:
+    return get_metric_gauges().get('pending_withdrawals', {}).get('count', 0)
+
+def _decide_withdrawals(withdrawal_ids, status: str):
+    """Move pending withdrawals to `status` in one transaction; returns the ids changed"""
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE pending_withdrawals
+            SET status = ?, processed_at = CURRENT_TIMESTAMP
+            WHERE id IN (SELECT value FROM json_each(?)) AND status = 'pending'
+            RETURNING id, user_id, amount
+        ''', (status, json.dumps([int(i) for i in withdrawal_ids])))
+        rows = cursor.fetchall()
+        if rows:
+            amount = sum(row[2] for row in rows)
+            _bump_metric(cursor, f'withdrawals_{status}', amount, len(rows))
+            _adjust_gauge(cursor, 'pending_withdrawals', -len(rows), -amount)
+        if status == 'approved':
+            for withdrawal_id, user_id, amount in rows:
+                units = to_units(amount)
+                _post(cursor, 'withdrawal', [_user_leg(user_id, 'wallet', -units), (CHAIN_ACCOUNT, None, units)],
+                      reference=f"withdrawal:{withdrawal_id}")
+    return sorted(row[0] for row in rows)
+
+def approve_withdrawals(withdrawal_ids):
+    """Approve pending withdrawals in bulk; returns the ids approved"""
+    return _decide_withdrawals(withdrawal_ids, 'approved')
+
+def reject_withdrawals(withdrawal_ids):
+    """Reject pending withdrawals in bulk; returns the ids rejected"""
+    return _decide_withdrawals(withdrawal_ids, 'rejected')
+
 def approve_withdrawal(withdrawal_id: int):
     """Approve a pending withdrawal"""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('''
-        UPDATE pending_withdrawals
-        SET status = 'approved', processed_at = CURRENT_TIMESTAMP
-        WHERE id = ?
-    ''', (withdrawal_id,))
-    conn.commit()
-    conn.close()
+    return bool(approve_withdrawals([withdrawal_id]))
 
 def reject_withdrawal(withdrawal_id: int):
     """Reject a pending withdrawal"""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('''
-        UPDATE pending_withdrawals
-        SET status = 'rejected', processed_at = CURRENT_TIMESTAMP
-        WHERE id = ?
-    ''', (withdrawal_id,))
-    conn.commit()
-    conn.close()
+    return bool(reject_withdrawals([withdrawal_id]))
+
+def record_payout(user_id: int, address: str, signature: str):
+    """Mark the user's oldest in-flight payout to `address` as landed on chain.
+
+    Returns the withdrawal id, or None if none matched or the signature was
+    already recorded.
+    """
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE pending_withdrawals
+            SET payout_signature = ?, payout_landed_at = CURRENT_TIMESTAMP
+            WHERE id = (
+                SELECT id FROM pending_withdrawals
+                WHERE user_id = ? AND address = ? AND status = 'approved' AND payout_landed_at IS NULL
+                ORDER BY id
+                LIMIT 1
+            ) AND NOT EXISTS (SELECT 1 FROM pending_withdrawals WHERE payout_signature = ?)
+            RETURNING id
+        ''', (signature, user_id, address, signature))
+        row = cursor.fetchone()
+    return row[0] if row else None
 
 def get_user_bonus(user_id: int):
     """Get user's bonus balance and rollover info"""
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS user_bonuses (
-            user_id INTEGER PRIMARY KEY,
-            bonus_balance REAL DEFAULT 0,
-            total_rolled REAL DEFAULT 0,
-            required_rollover REAL DEFAULT 0,
-            is_converted INTEGER DEFAULT 0,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
     cursor.execute('''
         SELECT bonus_balance, total_rolled, required_rollover, is_converted
         FROM user_bonuses
         WHERE user_id = ?
     ''', (user_id,))
     result = cursor.fetchone()
-    conn.close()
     
     if result:
         return {
@@ -299,109 +288,119 @@ def add_first_deposit_bonus(user_id: int, deposit_amount: float):
     # Required rollover is 60x the bonus amount
     required_rollover = bonus_amount * 60
     
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS user_bonuses (
-            user_id INTEGER PRIMARY KEY,
-            bonus_balance REAL DEFAULT 0,
-            total_rolled REAL DEFAULT 0,
-            required_rollover REAL DEFAULT 0,
-            is_converted INTEGER DEFAULT 0,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    cursor.execute('''
-        INSERT OR REPLACE INTO user_bonuses (user_id, bonus_balance, required_rollover)
-        VALUES (?, ?, ?)
-    ''', (user_id, bonus_amount, required_rollover))
-    conn.commit()
-    conn.close()
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT OR REPLACE INTO user_bonuses (user_id, bonus_balance, required_rollover)
+            VALUES (?, ?, ?)
+        ''', (user_id, bonus_amount, required_rollover))
+        units = to_units(bonus_amount)
+        _post(cursor, 'bonus_grant', [_user_leg(user_id, 'bonus', units), ('house:bonus', None, -units)])
     
     return True
 
-def update_bonus_rollover(user_id: int, amount_rolled: float):
-    """Update bonus rollover amount"""
-    bonus_info = get_user_bonus(user_id)
-    if bonus_info['is_converted']:
-        return False  # Already converted
-    
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+def _roll_over(cursor, user_id: int, amount_rolled: float, units: int):
+    """Apply rollover and, once complete, the conversion in one UPDATE; None if not applied"""
     cursor.execute('''
         UPDATE user_bonuses
-        SET total_rolled = total_rolled + ?,
-            bonus_balance = bonus_balance - ?
-        WHERE user_id = ? AND is_converted = 0
-    ''', (amount_rolled, amount_rolled, user_id))
-    conn.commit()
-    conn.close()
-    
-    # Check if rollover is complete
-    updated_bonus = get_user_bonus(user_id)
-    if updated_bonus['total_rolled'] >= updated_bonus['required_rollover']:
-        convert_bonus_to_crypto(user_id)
-    
-    return True
+        SET total_rolled = total_rolled + :amount,
+            bonus_balance = CASE WHEN total_rolled + :amount >= required_rollover THEN 0 ELSE bonus_balance - :amount END,
+            is_converted = total_rolled + :amount >= required_rollover
+        WHERE user_id = :user_id AND is_converted = 0
+        RETURNING bonus_balance, total_rolled, required_rollover, is_converted
+    ''', {"amount": amount_rolled, "user_id": user_id})
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    _post(cursor, 'bonus_rollover', [_user_leg(user_id, 'bonus', -units), ('house:bonus', None, units)])
+    if row[3]:
+        _close_bonus_account(cursor, user_id)
+    return row
+
+def update_bonus_rollover(user_id: int, amount_rolled: float):
+    """Update bonus rollover amount"""
+    conn = get_connection()
+    with conn:
+        if _roll_over(conn.cursor(), user_id, amount_rolled, to_units(amount_rolled)) is not None:
+            return True
+    return not get_user_bonus(user_id)['is_converted']
+
+def apply_bet_events(events):
+    """Apply [(user_id, amount_rolled)] bet events in one transaction; returns {user_id: bonus info}
+
+    Events are summed per user, so each user costs one UPDATE however many
+    bets arrived, and the conversion happens in that same UPDATE.
+    """
+    totals = {}
+    for user_id, amount in events:
+        amount_sum, units = totals.get(user_id, (0.0, 0))
+        totals[user_id] = (amount_sum + amount, units + to_units(amount))
+
+    conn = get_connection()
+    results = {}
+    with conn:
+        cursor = conn.cursor()
+        for user_id, (amount_sum, units) in totals.items():
+            row = _roll_over(cursor, user_id, amount_sum, units)
+            if row is None:
+                cursor.execute('''
+                    SELECT bonus_balance, total_rolled, required_rollover, is_converted
+                    FROM user_bonuses WHERE user_id = ?
+                ''', (user_id,))
+                row = cursor.fetchone() or (0, 0, 0, 0)
+            results[user_id] = {
+                'bonus_balance': row[0],
+                'total_rolled': row[1],
+                'required_rollover': row[2],
+                'is_converted': bool(row[3])
+            }
+    return results
+
+def _close_bonus_account(cursor, user_id: int):
+    # The bonus account closes; the payout itself arrives on chain
+    cursor.execute('SELECT balance FROM ledger_balances WHERE account = ?', (user_account(user_id, 'bonus'),))
+    row = cursor.fetchone()
+    if row and row[0]:
+        _post(cursor, 'bonus_converted', [_user_leg(user_id, 'bonus', -row[0]), ('house:bonus', None, row[0])])
 
 def convert_bonus_to_crypto(user_id: int):
     """Convert completed bonus to crypto"""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('''
-        UPDATE user_bonuses
-        SET is_converted = 1, bonus_balance = 0
-        WHERE user_id = ?
-    ''', (user_id,))
-    conn.commit()
-    conn.close()
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE user_bonuses
+            SET is_converted = 1, bonus_balance = 0
+            WHERE user_id = ?
+        ''', (user_id,))
+        _close_bonus_account(cursor, user_id)
 
 def generate_referral_code(user_id: int):
     """Generate unique referral code for user"""
-    import random
-    import string
-    
-    # Generate 8-character code
-    chars = string.ascii_uppercase + string.digits
-    code = ''.join(random.choices(chars, k=8))
-    
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS referrals (
-            user_id INTEGER PRIMARY KEY,
-            referral_code TEXT UNIQUE,
-            referred_by INTEGER NULL,
-            total_deposits REAL DEFAULT 0,
-            referral_earnings REAL DEFAULT 0,
-            referral_count INTEGER DEFAULT 0,
-            tier_level INTEGER DEFAULT 1,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-    
-    # Check if user already has a code
-    cursor.execute('SELECT referral_code FROM referrals WHERE user_id = ?', (user_id,))
-    existing = cursor.fetchone()
-    if existing:
-        conn.close()
-        return existing[0]
-    
-    # Generate unique code
-    while True:
-        cursor.execute('SELECT referral_code FROM referrals WHERE referral_code = ?', (code,))
-        if not cursor.fetchone():
-            break
-        code = ''.join(random.choices(chars, k=8))
-    
-    cursor.execute('INSERT INTO referrals (user_id, referral_code) VALUES (?, ?)', (user_id, code))
-    conn.commit()
-    conn.close()
+    code = encode_referral_code(user_id)
+    conn = get_connection()
+    with conn:
+        conn.execute('INSERT OR IGNORE INTO referrals (user_id, referral_code) VALUES (?, ?)', (user_id, code))
     return code
 
+def _find_referrer(cursor, referral_code: str):
+    """(user_id, referral_count) of a code's owner, or None"""
+    # Codes handed out before derived codes; checked first because decoding
+    # is case-insensitive and a legacy code can also read as a derived one
+    cursor.execute('SELECT user_id, referral_count FROM referrals WHERE legacy_code = ?', (referral_code,))
+    row = cursor.fetchone()
+    if row:
+        return row
+    referrer_id = decode_referral_code(referral_code)
+    if referrer_id is None:
+        return None
+    cursor.execute('SELECT user_id, referral_count FROM referrals WHERE user_id = ?', (referrer_id,))
+    return cursor.fetchone()
+
 def get_referral_info(user_id: int):
     """Get user's referral information"""
-    conn = sqlite3.connect(DB_NAME)
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute('''
         SELECT referral_code, referred_by, total_deposits, referral_earnings, referral_count, tier_level
@@ -409,7 +408,6 @@ def get_referral_info(user_id: int):
         WHERE user_id = ?
     ''', (user_id,))
     result = cursor.fetchone()
-    conn.close()
     
     if result:
         return {
@@ -422,47 +420,433 @@ def get_referral_info(user_id: int):
         }
     return None
 
-def process_referral_deposit(referral_code: str, deposit_amount: float):
-    """Process deposit from referred user"""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    
-    # Find referrer
-    cursor.execute('SELECT user_id, referral_count FROM referrals WHERE referral_code = ?', (referral_code,))
-    referrer = cursor.fetchone()
-    
-    if not referrer:
-        conn.close()
-        return None
-    
-    referrer_id, referral_count = referrer
-    
-    # Calculate referral earnings (10% of deposit, max $5 per $50)
-    # For every $50 deposited, referrer gets $5
-    deposit_chunks = int(deposit_amount / 50)
-    earnings = deposit_chunks * 5
-    
-    # Check for tier upgrade (10 referrals -> tier 2 -> $5.5 per $50)
-    tier_level = 2 if referral_count >= 10 else 1
-    if tier_level == 2:
-        earnings = deposit_chunks * 5.5
-    
-    if earnings > 0:
-        # Update referrer stats
-        cursor.execute('''
-            UPDATE referrals
-            SET total_deposits = total_deposits + ?,
-                referral_earnings = referral_earnings + ?,
-                referral_count = referral_count + 1,
-                tier_level = ?
-            WHERE user_id = ?
-        ''', (deposit_amount, earnings, tier_level, referrer_id))
-        
-        conn.commit()
-    
-    conn.close()
+def process_referral_deposit(referral_code: str, deposit_amount: float, reference: str = None):
+    """Process deposit from referred user.
+
+    With a reference (e.g. the deposit's signature) a deposit is only
+    credited once; repeats return None.
+    """
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+
+        # Find referrer
+        referrer = _find_referrer(cursor, referral_code)
+
+        if not referrer:
+            return None
+
+        referrer_id, referral_count = referrer
+
+        # Calculate referral earnings (10% of deposit, max $5 per $50)
+        # For every $50 deposited, referrer gets $5
+        deposit_chunks = int(deposit_amount / 50)
+        earnings = deposit_chunks * 5
+
+        # Check for tier upgrade (10 referrals -> tier 2 -> $5.5 per $50)
+        tier_level = 2 if referral_count >= 10 else 1
+        if tier_level == 2:
+            earnings = deposit_chunks * 5.5
+
+        if earnings > 0:
+            units = to_units(earnings)
+            if _post(cursor, 'referral_earning', [_user_leg(referrer_id, 'referral', units), ('house:referral', None, -units)],
+                     reference=reference) is None:
+                return None  # already credited
+
+            # Update referrer stats
+            cursor.execute('''
+                UPDATE referrals
+                SET total_deposits = total_deposits + ?,
+                    referral_earnings = referral_earnings + ?,
+                    referral_count = referral_count + 1,
+                    tier_level = ?
+                WHERE user_id = ?
+            ''', (deposit_amount, earnings, tier_level, referrer_id))
+            cursor.execute('''
+                INSERT INTO referral_daily (referrer_id, day, deposits, deposit_volume, earnings)
+                VALUES (?, date('now'), 1, ?, ?)
+                ON CONFLICT (referrer_id, day) DO UPDATE SET
+                    deposits = deposits + 1,
+                    deposit_volume = deposit_volume + excluded.deposit_volume,
+                    earnings = earnings + excluded.earnings
+            ''', (referrer_id, deposit_amount, earnings))
+
     return {
         'referrer_id': referrer_id,
         'earnings': earnings,
         'tier_level': tier_level
     }
+
+def get_referral_stats(user_id: int, days: int = 30, top: int = 10):
+    """Referral totals, daily buckets for the last `days` days and the top referrers.
+
+    Reads only the rollups kept by process_referral_deposit, so the cost
+    doesn't grow with the number of referred deposits.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT referral_count, total_deposits, referral_earnings, tier_level
+        FROM referrals
+        WHERE user_id = ?
+    ''', (user_id,))
+    row = cursor.fetchone() or (0, 0, 0, 1)
+    cursor.execute('''
+        SELECT day, deposits, deposit_volume, earnings
+        FROM referral_daily
+        WHERE referrer_id = ? AND day > date('now', ?)
+        ORDER BY day
+    ''', (user_id, f'-{days} days'))
+    daily = [
+        {'day': day, 'deposits': deposits, 'deposit_volume': volume, 'earnings': earnings}
+        for day, deposits, volume, earnings in cursor.fetchall()
+    ]
+    cursor.execute('''
+        SELECT user_id, referral_count, referral_earnings
+        FROM referrals
+        WHERE referral_earnings > 0
+        ORDER BY referral_earnings DESC, user_id
+        LIMIT ?
+    ''', (top,))
+    leaderboard = [
+        {'rank': rank, 'referral_count': count, 'referral_earnings': earnings, 'is_you': referrer_id == user_id}
+        for rank, (referrer_id, count, earnings) in enumerate(cursor.fetchall(), 1)
+    ]
+    return {
+        'referral_count': row[0],
+        'total_deposits': row[1],
+        'referral_earnings': row[2],
+        'tier_level': row[3],
+        'daily': daily,
+        'leaderboard': leaderboard
+    }
+
+def get_referrer_code(user_id: int):
+    """Referral code of whoever referred this user, if anyone"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT r.referral_code
+        FROM referrals u
+        JOIN referrals r ON r.user_id = u.referred_by
+        WHERE u.user_id = ?
+    ''', (user_id,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def set_referrer(user_id: int, referral_code: str) -> bool:
+    """Attribute the user to the referral code's owner; returns False if the
+    code is unknown, is the user's own, or the user already has a referrer
+    """
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        referrer = _find_referrer(cursor, referral_code)
+        if not referrer or referrer[0] == user_id:
+            return False
+        cursor.execute('INSERT OR IGNORE INTO referrals (user_id, referral_code) VALUES (?, ?)',
+                       (user_id, encode_referral_code(user_id)))
+        cursor.execute('UPDATE referrals SET referred_by = ? WHERE user_id = ? AND referred_by IS NULL',
+                       (referrer[0], user_id))
+        return cursor.rowcount == 1
+
+def get_wallet_cursors() -> dict:
+    """Deposit indexer cursors: public key -> newest signature already indexed"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT public_key, last_signature FROM wallet_cursors')
+    return dict(cursor.fetchall())
+
+def get_wallet_cursor(public_key: str):
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT last_signature FROM wallet_cursors WHERE public_key = ?', (public_key,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def set_wallet_cursor(public_key: str, signature: str, slot: int = None):
+    """Move the wallet's cursor forward (never back to an older slot)"""
+    conn = get_connection()
+    with conn:
+        conn.execute('''
+            INSERT INTO wallet_cursors (public_key, last_signature, last_slot, updated_at)
+            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(public_key) DO UPDATE SET
+                last_signature = excluded.last_signature,
+                last_slot = excluded.last_slot,
+                updated_at = excluded.updated_at
+            WHERE excluded.last_slot IS NULL OR wallet_cursors.last_slot IS NULL
+               OR excluded.last_slot >= wallet_cursors.last_slot
+        ''', (public_key, signature, slot))
+
+def get_ledger_opened_at():
+    """Unix time the ledger was opened from the deposits table (None before that migration)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT CAST(strftime('%s', applied_at) AS INTEGER) FROM schema_version WHERE version = ?",
+                   (LEDGER_MIGRATION,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def get_media_files():
+    """All stored Telegram file ids: name -> (source fingerprint, file_id)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT name, source, file_id FROM media_files')
+    return {name: (source, file_id) for name, source, file_id in cursor.fetchall()}
+
+def save_media_file(name: str, source: str, file_id: str):
+    """Remember the file_id Telegram assigned to an uploaded asset"""
+    conn = get_connection()
+    with conn:
+        conn.execute('''
+            INSERT INTO media_files (name, source, file_id, updated_at)
+            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(name) DO UPDATE SET
+                source = excluded.source,
+                file_id = excluded.file_id,
+                updated_at = excluded.updated_at
+        ''', (name, source, file_id))
+
+def delete_media_file(name: str):
+    conn = get_connection()
+    with conn:
+        conn.execute('DELETE FROM media_files WHERE name = ?', (name,))
+
+# Double-entry ledger. Every transaction's entries sum to zero and are
+# written together with the running balance of each account they touch,
+# so a balance is a primary-key lookup. Amounts are integers in
+# billionths of a unit (lamports for SOL). User accounts are named
+# "user:<id>:<kind>" (wallet, bonus, referral); their counterparts are
+# "external:chain" (funds entering or leaving on chain) and "house:*".
+LEDGER_SCALE = 10**9
+# Migration that opened the ledger with the balances recorded until then
+LEDGER_MIGRATION = 4
+CHAIN_ACCOUNT = "external:chain"
+
+def to_units(amount: float) -> int:
+    return int(round(amount * LEDGER_SCALE))
+
+def user_account(user_id: int, kind: str = 'wallet') -> str:
+    return f"user:{user_id}:{kind}"
+
+def _user_leg(user_id: int, kind: str, amount: int):
+    return (user_account(user_id, kind), user_id, amount)
+
+def _post(cursor, kind: str, legs, reference: str = None):
+    """Write one balanced transaction inside the caller's DB transaction.
+
+    legs are (account, user_id or None, amount) and must sum to zero.
+    Returns the transaction id, or None if reference was already posted.
+    """
+    if sum(amount for _, _, amount in legs) != 0:
+        raise ValueError(f"Unbalanced ledger transaction: {legs}")
+    try:
+        cursor.execute('INSERT INTO ledger_transactions (kind, reference) VALUES (?, ?)', (kind, reference))
+    except sqlite3.IntegrityError:
+        return None  # already posted
+    tx_id = cursor.lastrowid
+    cursor.executemany(
+        'INSERT INTO ledger_entries (tx_id, account, amount) VALUES (?, ?, ?)',
+        [(tx_id, account, amount) for account, _, amount in legs]
+    )
+    cursor.executemany('''
+        INSERT INTO ledger_balances (account, user_id, balance) VALUES (?, ?, ?)
+        ON CONFLICT(account) DO UPDATE SET
+            balance = balance + excluded.balance,
+            updated_at = CURRENT_TIMESTAMP
+    ''', legs)
+    return tx_id
+
+def post_ledger_transaction(kind: str, legs, reference: str = None):
+    """Post a balanced transaction on its own; see _post"""
+    conn = get_connection()
+    with conn:
+        return _post(conn.cursor(), kind, legs, reference)
+
+def get_ledger_balance(user_id: int, kind: str = 'wallet'):
+    """A user's account balance, or None if nothing was ever posted to it"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT balance FROM ledger_balances WHERE account = ?', (user_account(user_id, kind),))
+    row = cursor.fetchone()
+    return row[0] / LEDGER_SCALE if row else None
+
+def get_user_ledger_balances(user_id: int) -> dict:
+    """All of a user's account balances, keyed by kind (wallet, bonus, referral)"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT account, balance FROM ledger_balances WHERE user_id = ?', (user_id,))
+    return {account.rsplit(':', 1)[1]: balance / LEDGER_SCALE for account, balance in cursor.fetchall()}
+
+def reconcile_wallet_balances(observed: dict) -> list:
+    """Bring wallet accounts in line with on-chain balances (user id -> SOL).
+
+    Approved payouts that haven't left the wallet yet are already debited
+    in the ledger, so they are taken off the chain balance first. Each
+    difference is posted as a reconciliation against the chain account in
+    one DB transaction. Returns [(user_id, drift in SOL)].
+    """
+    adjustments = []
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT user_id, amount FROM pending_withdrawals
+            WHERE status = 'approved' AND payout_landed_at IS NULL
+        ''')
+        in_flight = {}
+        for user_id, amount in cursor.fetchall():
+            in_flight[user_id] = in_flight.get(user_id, 0) + to_units(amount)
+        for user_id, balance in observed.items():
+            cursor.execute('SELECT balance FROM ledger_balances WHERE account = ?', (user_account(user_id),))
+            row = cursor.fetchone()
+            drift = to_units(balance) - in_flight.get(user_id, 0) - (row[0] if row else 0)
+            if drift or row is None:
+                _post(cursor, 'reconciliation', [_user_leg(user_id, 'wallet', drift), (CHAIN_ACCOUNT, None, -drift)])
+                adjustments.append((user_id, drift / LEDGER_SCALE))
+    return adjustments
+
+def check_ledger() -> dict:
+    """Audit: balances sum to zero and each equals the sum of its entries"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT COALESCE(SUM(balance), 0) FROM ledger_balances')
+    total = cursor.fetchone()[0]
+    cursor.execute('''
+        SELECT b.account, b.balance, COALESCE(e.total, 0)
+        FROM ledger_balances b
+        LEFT JOIN (SELECT account, SUM(amount) AS total FROM ledger_entries GROUP BY account) e
+            ON e.account = b.account
+        WHERE b.balance != COALESCE(e.total, 0)
+    ''')
+    mismatched = [{"account": a, "balance": b, "entries": e} for a, b, e in cursor.fetchall()]
+    return {"balanced": total == 0, "total": total, "mismatched_accounts": mismatched}
+
+# Metric rollups. Writes that matter operationally bump per-minute,
+# per-hour and per-day buckets (count and amount) in their own
+# transaction, so dashboards read a bounded range of rollup rows instead
+# of scanning deposits, users or pending_withdrawals. Gauges (bucket
+# 'gauge') hold current totals such as the pending payout queue.
+METRIC_BUCKETS = {
+    'minute': ('%Y-%m-%d %H:%M', timedelta(minutes=1)),
+    'hour': ('%Y-%m-%d %H:00', timedelta(hours=1)),
+    'day': ('%Y-%m-%d', timedelta(days=1)),
+}
+_last_metric_prune = None
+
+def _bump_metric(cursor, metric: str, amount: float = 0, count: int = 1):
+    cursor.execute('''
+        INSERT INTO metric_rollups (bucket, start, metric, count, total) VALUES
+            ('minute', strftime('%Y-%m-%d %H:%M', 'now'), :metric, :count, :amount),
+            ('hour', strftime('%Y-%m-%d %H:00', 'now'), :metric, :count, :amount),
+            ('day', date('now'), :metric, :count, :amount)
+        ON CONFLICT (bucket, start, metric) DO UPDATE SET
+            count = count + excluded.count,
+            total = total + excluded.total
+    ''', {"metric": metric, "count": count, "amount": amount})
+    _prune_metric_rollups(cursor)
+
+def _adjust_gauge(cursor, metric: str, count: int, amount: float):
+    cursor.execute('''
+        INSERT INTO metric_rollups (bucket, start, metric, count, total) VALUES ('gauge', '', ?, ?, ?)
+        ON CONFLICT (bucket, start, metric) DO UPDATE SET
+            count = count + excluded.count,
+            total = total + excluded.total
+    ''', (metric, count, amount))
+
+def _prune_metric_rollups(cursor):
+    """Drop expired minute and hour buckets, at most once an hour"""
+    global _last_metric_prune
+    hour = datetime.now(timezone.utc).strftime(METRIC_BUCKETS['hour'][0])
+    if hour == _last_metric_prune:
+        return
+    _last_metric_prune = hour
+    cursor.execute(
+        "DELETE FROM metric_rollups WHERE bucket = 'minute' AND start < strftime('%Y-%m-%d %H:%M', 'now', ?)",
+        (f'-{METRICS_MINUTE_RETENTION_HOURS} hours',),
+    )
+    cursor.execute(
+        "DELETE FROM metric_rollups WHERE bucket = 'hour' AND start < strftime('%Y-%m-%d %H:00', 'now', ?)",
+        (f'-{METRICS_HOUR_RETENTION_DAYS} days',),
+    )
+
+def get_metric_series(bucket: str = 'hour', points: int = 24) -> dict:
+    """The last `points` buckets (oldest first, current one included) of every metric.
+
+    Returns {"starts": [...], "series": {metric: {"count": [...], "total": [...]}}}
+    with empty buckets filled in as zeros.
+    """
+    fmt, step = METRIC_BUCKETS[bucket]
+    now = datetime.now(timezone.utc)
+    starts = sorted({(now - step * i).strftime(fmt) for i in range(points)})[-points:]
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT start, metric, count, total
+        FROM metric_rollups
+        WHERE bucket = ? AND start >= ?
+    ''', (bucket, starts[0]))
+    index = {start: i for i, start in enumerate(starts)}
+    series = {}
+    for start, metric, count, total in cursor.fetchall():
+        i = index.get(start)
+        if i is None:
+            continue
+        values = series.setdefault(metric, {"count": [0] * len(starts), "total": [0.0] * len(starts)})
+        values["count"][i] = count
+        values["total"][i] = total
+    return {"bucket": bucket, "starts": starts, "series": series}
+
+def get_metric_gauges() -> dict:
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT metric, count, total FROM metric_rollups WHERE bucket = 'gauge'")
+    return {metric: {"count": count, "total": total} for metric, count, total in cursor.fetchall()}
+
+def save_db_profile(process: str, summary):
+    """Replace a process's profiling snapshot (rows from db_profiler.summary())
+
+    Snapshots not refreshed for a day (processes since restarted) are dropped.
+    """
+    conn = get_connection()
+    with conn:
+        cursor = conn.cursor()
+        cursor.executemany('''
+            INSERT INTO db_profile (process, function, calls, total_seconds, max_seconds, p99_seconds, rows, slow)
+            VALUES (:process, :function, :calls, :total_seconds, :max_seconds, :p99_seconds, :rows, :slow)
+            ON CONFLICT (process, function) DO UPDATE SET
+                calls = excluded.calls,
+                total_seconds = excluded.total_seconds,
+                max_seconds = excluded.max_seconds,
+                p99_seconds = excluded.p99_seconds,
+                rows = excluded.rows,
+                slow = excluded.slow,
+                updated_at = CURRENT_TIMESTAMP
+        ''', [{"process": process, **row} for row in summary])
+        cursor.execute("DELETE FROM db_profile WHERE updated_at < datetime('now', '-1 day')")
+
+def get_db_profile(max_age_minutes: int = 60) -> list:
+    """Per-function totals across processes that saved a snapshot recently, slowest total first.
+
+    p99_seconds is the worst of the processes' p99s (an upper bound).
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT function, SUM(calls), SUM(total_seconds), MAX(max_seconds), MAX(p99_seconds),
+               SUM(rows), SUM(slow), COUNT(*)
+        FROM db_profile
+        WHERE updated_at >= datetime('now', ?)
+        GROUP BY function
+        ORDER BY 3 DESC
+    ''', (f'-{max_age_minutes} minutes',))
+    return [
+        {
+            "function": function, "calls": calls, "total_seconds": total,
+            "mean_seconds": total / calls if calls else 0.0, "max_seconds": worst,
+            "p99_seconds": p99, "rows": rows, "slow": slow, "processes": processes,
+        }
+        for function, calls, total, worst, p99, rows, slow, processes in cursor.fetchall()
+    ]
@@ -0,0 +1,175 @@
+"""Per-function profiling of database.py calls with a slow-query log.
+
+async_db reports every call (duration, result, arguments) to the hook
+installed with async_db.set_profiler(); with none installed it costs one
+`is None` check per call, so this can stay wired up in production and be
+turned on with DB_PROFILE=1. Each function keeps a call count, total and
+max duration, rows returned and its last DB_PROFILE_SAMPLES durations
+(for the p99). Calls slower than DB_SLOW_QUERY_MS are appended to
+DB_SLOW_QUERY_LOG, with only numeric arguments written out (the rest are
+keys, addresses and the like). Every process periodically saves its
+summary to the db_profile table, which the admin dashboard reads.
+"""
+import asyncio
+import os
+import sys
+import time
+from collections import deque
+
+import async_db
+import database
+from config import DB_PROFILE, DB_SLOW_QUERY_MS, DB_SLOW_QUERY_LOG, DB_PROFILE_SAMPLES, DB_PROFILE_FLUSH_INTERVAL
+
+_stats = {}
+_slow_log = None
+_flusher_task = None
+_process = None
+
+class _FunctionStats:
+    __slots__ = ("calls", "total", "max", "rows", "slow", "samples")
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.slow = 0
+        self.samples = deque(maxlen=DB_PROFILE_SAMPLES)
+
+# database.py functions whose dict result is a single record; other dicts
+# (get_wallet_cursors, get_media_files, ...) map a key to one row each
+_RECORD_RESULTS = {"get_user", "get_user_bonus", "get_referral_info", "get_referral_stats", "process_referral_deposit", "check_ledger"}
+
+def _rows(function: str, result) -> int:
+    """Rows a database.py function returned: lists and dicts count their items, a row or record is one"""
+    if function == "get_metric_series":
+        return len(result["series"]) * len(result["starts"])
+    if isinstance(result, list) or (isinstance(result, dict) and function not in _RECORD_RESULTS):
+        return len(result)
+    if result is None or isinstance(result, bool):
+        return 0
+    return 1
+
+def _describe(args, kwargs) -> str:
+    def show(value):
+        return repr(value) if isinstance(value, (int, float)) else type(value).__name__
+    parts = [show(value) for value in args] + [f"{name}={show(value)}" for name, value in kwargs.items()]
+    return ", ".join(parts)
+
+def _log_slow(function: str, seconds: float, rows: int, args, kwargs):
+    global _slow_log
+    try:
+        if _slow_log is None:
+            _slow_log = open(DB_SLOW_QUERY_LOG, "a", buffering=1)
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S")
+        _slow_log.write(f"{stamp} {function}({_describe(args, kwargs)}) {seconds * 1000:.1f} ms, {rows} rows\n")
+    except Exception as e:
+        print(f"Error writing slow query log: {e}")
+
+def record(function: str, seconds: float, result, args, kwargs):
+    """The async_db profiler hook; runs on the DB thread after each call"""
+    stats = _stats.get(function)
+    if stats is None:
+        stats = _stats[function] = _FunctionStats()
+    rows = _rows(function, result)
+    stats.calls += 1
+    stats.total += seconds
+    stats.rows += rows
+    stats.samples.append(seconds)
+    if seconds > stats.max:
+        stats.max = seconds
+    if seconds * 1000 >= DB_SLOW_QUERY_MS:
+        stats.slow += 1
+        _log_slow(function, seconds, rows, args, kwargs)
+
+def _p99(samples) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] if ordered else 0.0
+
+def summary() -> list:
+    """This process's per-function stats, slowest total first"""
+    rows = [
+        {
+            "function": function, "calls": stats.calls, "total_seconds": stats.total,
+            "max_seconds": stats.max, "p99_seconds": _p99(list(stats.samples)),
+            "rows": stats.rows, "slow": stats.slow,
+        }
+        for function, stats in list(_stats.items())
+    ]
+    rows.sort(key=lambda row: row["total_seconds"], reverse=True)
+    return rows
+
+def enable():
+    async_db.set_profiler(record)
+
+def disable():
+    async_db.set_profiler(None)
+
+def reset():
+    _stats.clear()
+
+async def flush_db_profile():
+    """Save this process's summary for the admin dashboard"""
+    rows = summary()
+    if rows:
+        # Not through async_db, so saving the profile isn't profiled itself
+        await async_db.run_in_db_thread(database.save_db_profile, _process, rows)
+
+async def _flusher():
+    while True:
+        await asyncio.sleep(DB_PROFILE_FLUSH_INTERVAL)
+        try:
+            await flush_db_profile()
+        except Exception as e:
+            print(f"Error saving database profile: {e}")
+
+def start_db_profiler(role: str, enabled: bool = DB_PROFILE):
+    """Profile this process's DB calls if enabled and save the summary periodically (idempotent)"""
+    global _flusher_task, _process
+    if not enabled or _flusher_task is not None:
+        return
+    _process = f"{role}:{os.getpid()}"
+    enable()
+    _flusher_task = asyncio.create_task(_flusher())
+
+async def stop_db_profiler():
+    """Stop profiling and save the final summary; call on shutdown"""
+    global _flusher_task, _slow_log
+    if _flusher_task is None:
+        return
+    disable()
+    _flusher_task.cancel()
+    try:
+        await _flusher_task
+    except asyncio.CancelledError:
+        pass
+    _flusher_task = None
+    try:
+        await flush_db_profile()
+    except Exception as e:
+        print(f"Error saving database profile: {e}")
+    if _slow_log is not None:
+        _slow_log.close()
+        _slow_log = None
+
+def main():
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Show the saved database profile")
+    parser.add_argument("--minutes", type=int, default=60, help="only processes that saved within this many minutes")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+    database.init_db()
+    rows = database.get_db_profile(args.minutes)
+    if args.json:
+        json.dump(rows, sys.stdout, indent=2)
+        print()
+        return
+    print(f"{'function':32} {'calls':>9} {'total s':>9} {'mean ms':>9} {'p99 ms':>9} {'max ms':>9} {'rows':>9} {'slow':>6}")
+    for row in rows:
+        print(f"{row['function']:32} {row['calls']:>9} {row['total_seconds']:>9.3f} {row['mean_seconds'] * 1000:>9.3f} "
+              f"{row['p99_seconds'] * 1000:>9.3f} {row['max_seconds'] * 1000:>9.3f} {row['rows']:>9} {row['slow']:>6}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""Index incoming SOL deposits to user wallets from the chain.
+
+Each pass walks every user wallet's new signatures with
+getSignaturesForAddress, starting after the wallet's persisted cursor,
+fetches those transactions in batches and records each positive balance
+change as a deposit (plus the referrer's earnings and the first deposit
+bonus). This is the only place deposits are recorded: /api/deposit just
+indexes the caller's wallet right away. Deposits and referral earnings
+are keyed by the transaction signature, so a pass interrupted half way
+can simply be run again. Payouts from the house wallet are not deposits,
+and a wallet's history from before the ledger was opened (its balance
+then is the ledger's opening balance) is skipped. Transfers out of a
+wallet to the address of an approved withdrawal mark that payout as
+landed, which reconciliation needs. Wallets are spread over a fixed pool
+of workers.
+
+    python deposit_indexer.py --once     # one pass against RPC_URL
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from solders.pubkey import Pubkey
+from solders.signature import Signature
+
+from config import HOUSE_WALLET_ADDRESS, INDEXER_INTERVAL, INDEXER_WORKERS, INDEXER_BATCH_SIZE, INDEXER_MAX_SIGNATURES
+from async_db import get_all_users, get_wallet_cursors, get_wallet_cursor, set_wallet_cursor, get_ledger_opened_at, record_deposit, get_referrer_code, process_referral_deposit, add_first_deposit_bonus, record_payout
+from solana_utils import get_rpc_client
+
+# getSignaturesForAddress returns at most this many signatures per call
+SIGNATURES_PAGE_LIMIT = 1000
+# Smallest deposit that earns the first deposit bonus
+FIRST_DEPOSIT_BONUS_MIN = 5
+
+_UNKNOWN = object()
+
+_indexer_stats = {"passes": 0, "last_pass_at": None, "wallets": 0, "signatures": 0, "deposits": 0, "errors": 0}
+_indexer_task = None
+# Wallet -> lock, so a pass and an /api/deposit call don't index it at once
+_wallet_locks = {}
+_ledger_opened_at = _UNKNOWN
+
+async def _new_signatures(public_key: str, until: str):
+    """Signatures newer than `until`, oldest first, as (signature, slot, succeeded, block_time).
+
+    getSignaturesForAddress pages from the newest signature back, so every
+    page down to `until` is fetched and only the oldest
+    INDEXER_MAX_SIGNATURES are kept: the cursor then only ever moves past
+    signatures that were processed, and the rest wait for the next pass.
+    """
+    client = get_rpc_client()
+    account = Pubkey.from_string(public_key)
+    found = []
+    before = None
+    while True:
+        response = await client.get_signatures_for_address(
+            account,
+            before=Signature.from_string(before) if before else None,
+            until=Signature.from_string(until) if until else None,
+            limit=SIGNATURES_PAGE_LIMIT,
+        )
+        page = response.value
+        found.extend(page)
+        if len(page) < SIGNATURES_PAGE_LIMIT:
+            break
+        before = str(page[-1].signature)
+    found.reverse()
+    return [
+        (str(status.signature), status.slot, status.err is None, status.block_time)
+        for status in found[:INDEXER_MAX_SIGNATURES]
+    ]
+
+def _deposit_lamports(transaction: dict, public_key: str) -> int:
+    """How much the transaction added to the wallet (0 if it didn't, or if it's a house payout)"""
+    meta = transaction.get("meta") or {}
+    if meta.get("err") is not None:
+        return 0
+    keys = list(transaction["transaction"]["message"]["accountKeys"])
+    loaded = meta.get("loadedAddresses") or {}
+    keys += loaded.get("writable", []) + loaded.get("readonly", [])
+    if public_key not in keys:
+        return 0
+    if HOUSE_WALLET_ADDRESS in keys:
+        house = keys.index(HOUSE_WALLET_ADDRESS)
+        if house == 0 or meta["postBalances"][house] < meta["preBalances"][house]:
+            return 0
+    i = keys.index(public_key)
+    return max(meta["postBalances"][i] - meta["preBalances"][i], 0)
+
+def _payout_recipients(transaction: dict, public_key: str) -> list:
+    """Accounts the transaction paid from the wallet (empty unless the wallet's balance went down)"""
+    meta = transaction.get("meta") or {}
+    if meta.get("err") is not None:
+        return []
+    keys = list(transaction["transaction"]["message"]["accountKeys"])
+    if public_key not in keys:
+        return []
+    i = keys.index(public_key)
+    if meta["postBalances"][i] >= meta["preBalances"][i]:
+        return []
+    return [
+        key for j, key in enumerate(keys)
+        if key != public_key and meta["postBalances"][j] > meta["preBalances"][j]
+    ]
+
+async def _fetch_transaction(signature: str):
+    response = await get_rpc_client().get_transaction(
+        Signature.from_string(signature), encoding="json", max_supported_transaction_version=0
+    )
+    return json.loads(response.value.to_json()) if response.value is not None else None
+
+async def _opened_at():
+    global _ledger_opened_at
+    if _ledger_opened_at is _UNKNOWN:
+        _ledger_opened_at = await get_ledger_opened_at()
+    return _ledger_opened_at
+
+async def _record(user_id: int, signature: str, lamports: int):
+    """Record one deposit with its referral earnings and bonus; None if already recorded"""
+    amount = lamports / 10**9
+    if not await record_deposit(user_id, amount, signature=signature):
+        return None
+    deposit = {"signature": signature, "amount": amount, "referrer_earnings": None, "bonus": False}
+    referral_code = await get_referrer_code(user_id)
+    if referral_code:
+        referral = await process_referral_deposit(referral_code, amount, reference=f"referral:{signature}")
+        if referral:
+            deposit["referrer_earnings"] = referral["earnings"]
+    if amount >= FIRST_DEPOSIT_BONUS_MIN:
+        deposit["bonus"] = await add_first_deposit_bonus(user_id, amount)
+    return deposit
+
+async def index_wallet(user_id: int, public_key: str, cursor: str = None) -> list:
+    """Record the wallet's deposits since `cursor`; returns the new ones"""
+    lock = _wallet_locks.setdefault(public_key, asyncio.Lock())
+    async with lock:
+        signatures = await _new_signatures(public_key, cursor)
+        if cursor is None:
+            # Never indexed: what came before the ledger's opening is in its opening balance
+            opened_at = await _opened_at()
+            if opened_at is not None:
+                after = [s for s in signatures if s[3] is None or s[3] >= opened_at]
+                if signatures and not after:
+                    await set_wallet_cursor(public_key, signatures[-1][0], signatures[-1][1])
+                signatures = after
+        _indexer_stats["signatures"] += len(signatures)
+        recorded = []
+        for i in range(0, len(signatures), INDEXER_BATCH_SIZE):
+            batch = signatures[i:i + INDEXER_BATCH_SIZE]
+            # Failed transactions moved no funds; the cursor still moves past them
+            transactions = await asyncio.gather(*(
+                _fetch_transaction(signature) if succeeded else asyncio.sleep(0)
+                for signature, _, succeeded, _ in batch
+            ))
+            for (signature, _, _, _), transaction in zip(batch, transactions):
+                if not transaction:
+                    continue
+                lamports = _deposit_lamports(transaction, public_key)
+                if lamports:
+                    deposit = await _record(user_id, signature, lamports)
+                    if deposit:
+                        recorded.append(deposit)
+                    continue
+                for address in _payout_recipients(transaction, public_key):
+                    if await record_payout(user_id, address, signature):
+                        break
+            # Everything up to here is recorded; resume after it next time
+            last_signature, last_slot, _, _ = batch[-1]
+            await set_wallet_cursor(public_key, last_signature, last_slot)
+        return recorded
+
+async def index_user_wallet(user_id: int, public_key: str) -> list:
+    """Index one wallet now (e.g. right after the user says they deposited)"""
+    deposits = await index_wallet(user_id, public_key, await get_wallet_cursor(public_key))
+    _indexer_stats["deposits"] += len(deposits)
+    return deposits
+
+async def index_deposits(users: list = None, failed: set = None) -> int:
+    """One pass over every user wallet (or just `users`); returns the number of new deposits.
+
+    Public keys of wallets whose pass raised are added to `failed` if given.
+    """
+    if users is None:
+        users = [user for user in await get_all_users() if user.get('public_key')]
+    cursors = await get_wallet_cursors()
+    queue = asyncio.Queue()
+    for user in users:
+        queue.put_nowait(user)
+    recorded = 0
+
+    async def worker():
+        nonlocal recorded
+        while True:
+            try:
+                user = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                deposits = await index_wallet(user['user_id'], user['public_key'], cursors.get(user['public_key']))
+                recorded += len(deposits)
+            except Exception as e:
+                _indexer_stats["errors"] += 1
+                if failed is not None:
+                    failed.add(user['public_key'])
+                print(f"Error indexing deposits for {user['public_key']}: {e}")
+
+    await asyncio.gather(*(worker() for _ in range(min(INDEXER_WORKERS, len(users)) or 1)))
+    _indexer_stats["passes"] += 1
+    _indexer_stats["last_pass_at"] = time.time()
+    _indexer_stats["wallets"] = len(users)
+    _indexer_stats["deposits"] += recorded
+    return recorded
+
+async def _indexer():
+    while True:
+        try:
+            await index_deposits()
+        except Exception as e:
+            print(f"Error indexing deposits: {e}")
+        await asyncio.sleep(INDEXER_INTERVAL)
+
+def start_deposit_indexer():
+    """Start the background indexing loop (idempotent)"""
+    global _indexer_task
+    if _indexer_task is None:
+        _indexer_task = asyncio.create_task(_indexer())
+
+async def stop_deposit_indexer():
+    global _indexer_task
+    if _indexer_task is not None:
+        _indexer_task.cancel()
+        try:
+            await _indexer_task
+        except asyncio.CancelledError:
+            pass
+        _indexer_task = None
+
+def get_indexer_stats() -> dict:
+    return dict(_indexer_stats)
+
+async def _run_once():
+    from async_db import init_db, close_db
+    from solana_utils import close_rpc_client
+
+    await init_db()
+    try:
+        recorded = await index_deposits()
+        print(f"Recorded {recorded} new deposits: {get_indexer_stats()}")
+    finally:
+        await close_rpc_client()
+        await close_db()
+
+def main():
+    parser = argparse.ArgumentParser(description="Index on-chain deposits to user wallets")
+    parser.add_argument("--once", action="store_true", help="run a single pass and exit")
+    args = parser.parse_args()
+    if args.once:
+        asyncio.run(_run_once())
+    else:
+        async def forever():
+            from async_db import init_db
+            await init_db()
+            await _indexer()
+        asyncio.run(forever())
+
+if __name__ == "__main__":
+    main()
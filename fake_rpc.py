@@ -0,0 +1,197 @@
+"""A small in-memory stand-in for the Solana JSON-RPC API.
+
+Enough of the API for the bot, the API and the deposit indexer to run
+without a real cluster: getBalance, getMultipleAccounts,
+getSignaturesForAddress and getTransaction over HTTP, and
+accountSubscribe/accountUnsubscribe over a websocket on the same port
+(for balance_stream). Transfers are created through POST
+/_fake/transfer, so deposits can be scripted:
+
+    python fake_rpc.py --port 8899 --latency 0.05
+    curl -X POST localhost:8899/_fake/transfer -d '{"to": "<pubkey>", "lamports": 1000000000}'
+    RPC_URL=http://127.0.0.1:8899 python deposit_indexer.py --once
+"""
+import argparse
+import asyncio
+import hashlib
+import itertools
+import time
+
+import base58
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route, WebSocketRoute
+from starlette.websockets import WebSocket, WebSocketDisconnect
+
+SYSTEM_PROGRAM = "11111111111111111111111111111111"
+# Where fake deposits come from
+FAUCET = "FaucetXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX"
+TRANSFER_FEE = 5000
+
+class FakeChain:
+    """Balances plus an append-only list of SOL transfers"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.slot = 1
+        self.balances = {}
+        # signature -> transaction dict; per-address signatures, newest last
+        self.transactions = {}
+        self.signatures = {}
+        self.calls = {}
+        # accountSubscribe id -> (address, notify callback)
+        self.subscriptions = {}
+        self._subscription_ids = itertools.count(1)
+
+    def transfer(self, to: str, lamports: int, source: str = FAUCET) -> str:
+        self.slot += 1
+        signature = base58.b58encode(hashlib.sha512(f"{self.slot}:{source}:{to}:{lamports}".encode()).digest()).decode()
+        keys = [source, to, SYSTEM_PROGRAM]
+        pre = [self.balances.get(source, 10**18), self.balances.get(to, 0), 1]
+        post = [pre[0] - lamports - TRANSFER_FEE, pre[1] + lamports, 1]
+        self.balances[source], self.balances[to] = post[0], post[1]
+        self.transactions[signature] = {
+            "slot": self.slot,
+            "blockTime": int(time.time()),
+            "transaction": {
+                "signatures": [signature],
+                "message": {
+                    "accountKeys": keys,
+                    "header": {"numRequiredSignatures": 1, "numReadonlySignedAccounts": 0, "numReadonlyUnsignedAccounts": 1},
+                    "recentBlockhash": SYSTEM_PROGRAM,
+                    "instructions": [{"programIdIndex": 2, "accounts": [0, 1], "data": "3Bxs4h24hBtQy9rw", "stackHeight": None}],
+                },
+            },
+            "meta": {
+                "err": None, "status": {"Ok": None}, "fee": TRANSFER_FEE,
+                "preBalances": pre, "postBalances": post,
+                "innerInstructions": [], "logMessages": [], "preTokenBalances": [], "postTokenBalances": [],
+                "rewards": [], "loadedAddresses": {"writable": [], "readonly": []}, "computeUnitsConsumed": 150,
+            },
+            "version": "legacy",
+        }
+        for key in (source, to):
+            self.signatures.setdefault(key, []).append(signature)
+            self._notify(key)
+        return signature
+
+    def subscribe(self, address: str, notify) -> int:
+        subscription = next(self._subscription_ids)
+        self.subscriptions[subscription] = (address, notify)
+        return subscription
+
+    def unsubscribe(self, subscription: int) -> bool:
+        return self.subscriptions.pop(subscription, None) is not None
+
+    def _notify(self, address: str):
+        for subscription, (key, notify) in list(self.subscriptions.items()):
+            if key == address:
+                notify({
+                    "jsonrpc": "2.0", "method": "accountNotification",
+                    "params": {"subscription": subscription, "result": {"context": {"slot": self.slot}, "value": self._account(address)}},
+                })
+
+    def _signatures_for_address(self, address, options):
+        newest_first = list(reversed(self.signatures.get(address, [])))
+        before, until = options.get("before"), options.get("until")
+        if before in newest_first:
+            newest_first = newest_first[newest_first.index(before) + 1:]
+        if until in newest_first:
+            newest_first = newest_first[:newest_first.index(until)]
+        return [
+            {"signature": sig, "slot": self.transactions[sig]["slot"], "err": None, "memo": None,
+             "blockTime": self.transactions[sig]["blockTime"], "confirmationStatus": "finalized"}
+            for sig in newest_first[:options.get("limit") or 1000]
+        ]
+
+    def _account(self, key):
+        if key not in self.balances:
+            return None
+        return {"lamports": self.balances[key], "owner": SYSTEM_PROGRAM, "data": ["", "base64"],
+                "executable": False, "rentEpoch": 0, "space": 0}
+
+    def handle(self, request: dict) -> dict:
+        method, params = request.get("method"), request.get("params") or []
+        self.calls[method] = self.calls.get(method, 0) + 1
+        context = {"slot": self.slot}
+        if method == "getBalance":
+            result = {"context": context, "value": self.balances.get(params[0], 0)}
+        elif method == "getMultipleAccounts":
+            result = {"context": context, "value": [self._account(key) for key in params[0]]}
+        elif method == "getSignaturesForAddress":
+            result = self._signatures_for_address(params[0], params[1] if len(params) > 1 else {})
+        elif method == "getTransaction":
+            result = self.transactions.get(params[0])
+        else:
+            return {"jsonrpc": "2.0", "id": request.get("id"), "error": {"code": -32601, "message": "Method not found"}}
+        return {"jsonrpc": "2.0", "id": request.get("id"), "result": result}
+
+def create_app(chain: FakeChain) -> Starlette:
+    async def rpc(request: Request):
+        if chain.latency:
+            await asyncio.sleep(chain.latency)
+        body = await request.json()
+        if isinstance(body, list):
+            return JSONResponse([chain.handle(item) for item in body])
+        return JSONResponse(chain.handle(body))
+
+    async def pubsub(websocket: WebSocket):
+        await websocket.accept()
+        # Replies and notifications go out in order through one queue
+        outbox = asyncio.Queue()
+        owned = set()
+
+        async def forward():
+            while True:
+                await websocket.send_json(await outbox.get())
+
+        sender = asyncio.create_task(forward())
+        try:
+            while True:
+                request = await websocket.receive_json()
+                method, params = request.get("method"), request.get("params") or []
+                chain.calls[method] = chain.calls.get(method, 0) + 1
+                if method == "accountSubscribe":
+                    result = chain.subscribe(params[0], outbox.put_nowait)
+                    owned.add(result)
+                elif method == "accountUnsubscribe":
+                    result = chain.unsubscribe(params[0])
+                    owned.discard(params[0])
+                else:
+                    outbox.put_nowait({"jsonrpc": "2.0", "id": request.get("id"), "error": {"code": -32601, "message": "Method not found"}})
+                    continue
+                outbox.put_nowait({"jsonrpc": "2.0", "id": request.get("id"), "result": result})
+        except WebSocketDisconnect:
+            pass
+        finally:
+            sender.cancel()
+            for subscription in owned:
+                chain.unsubscribe(subscription)
+
+    async def transfer(request: Request):
+        body = await request.json()
+        return JSONResponse({"signature": chain.transfer(body["to"], int(body["lamports"]), body.get("from", FAUCET))})
+
+    async def stats(request: Request):
+        return JSONResponse({"slot": chain.slot, "calls": chain.calls, "transactions": len(chain.transactions),
+                             "subscriptions": len(chain.subscriptions)})
+
+    return Starlette(routes=[
+        Route("/", rpc, methods=["POST"]),
+        WebSocketRoute("/", pubsub),
+        Route("/_fake/transfer", transfer, methods=["POST"]),
+        Route("/_fake/stats", stats, methods=["GET"]),
+    ])
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="In-memory Solana JSON-RPC stand-in")
+    parser.add_argument("--port", type=int, default=8899)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every RPC request")
+    args = parser.parse_args()
+    uvicorn.run(create_app(FakeChain(args.latency)), host="127.0.0.1", port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Precomputed leaderboard snapshot for /api/leaderboard.
+
+A background task rebuilds the ranking on a schedule, re-checking only
+the wallets whose balance is stale, and keeps the serialized JSON ready
+so the endpoint never touches the database or RPC.
+"""
+import asyncio
+import json
+import time
+
+from config import LEADERBOARD_REFRESH_INTERVAL, LEADERBOARD_STALE_AFTER, LEADERBOARD_MAX_CHECKS
+from async_db import get_all_users
+from solana_utils import get_balances
+
+# Public key -> (checked_at, balance)
+_wallet_balances = {}
+_snapshot = {"generated_at": None, "body": b"[]", "entries": 0}
+_refresh_lock = asyncio.Lock()
+_refresher_task = None
+
+def hide_username(username: str) -> str:
+    """Hide middle of username for privacy: 'CryptoKing' -> 'Cry***ng'"""
+    if not username or len(username) < 4:
+        return username or 'Anonymous'
+    return f"{username[:3]}***{username[-2:]}"
+
+async def refresh_leaderboard():
+    """Re-check stale wallets and rebuild the snapshot"""
+    async with _refresh_lock:
+        users = [user for user in await get_all_users() if user.get('public_key')]
+        now = time.monotonic()
+
+        # Never-seen wallets first, then the longest unchecked
+        stale = [
+            user['public_key'] for user in users
+            if now - _wallet_balances.get(user['public_key'], (float('-inf'), 0))[0] >= LEADERBOARD_STALE_AFTER
+        ]
+        stale.sort(key=lambda key: _wallet_balances.get(key, (float('-inf'), 0))[0])
+        stale = stale[:LEADERBOARD_MAX_CHECKS]
+        if stale:
+            balances = await get_balances(stale)
+            checked_at = time.monotonic()
+            for key, balance in balances.items():
+                _wallet_balances[key] = (checked_at, balance)
+
+        # Forget wallets that no longer belong to a user
+        current = {user['public_key'] for user in users}
+        for key in list(_wallet_balances):
+            if key not in current:
+                del _wallet_balances[key]
+
+        leaderboard = sorted(
+            (
+                {
+                    'username': hide_username(user.get('username') or user.get('first_name')),
+                    'balance': _wallet_balances.get(user['public_key'], (0, 0))[1],
+                    'public_key': user['public_key']
+                }
+                for user in users
+            ),
+            key=lambda x: x['balance'],
+            reverse=True
+        )
+        result = [
+            {
+                'rank': i + 1,
+                'username': entry['username'],
+                'balance': round(entry['balance'], 4),
+                'public_key': entry['public_key']
+            }
+            for i, entry in enumerate(leaderboard)
+        ]
+
+        _snapshot["body"] = json.dumps(result, separators=(',', ':')).encode()
+        _snapshot["entries"] = len(result)
+        _snapshot["generated_at"] = time.time()
+
+async def get_leaderboard_snapshot():
+    """Return (serialized JSON, age in seconds), building the first snapshot if needed"""
+    if _snapshot["generated_at"] is None:
+        await refresh_leaderboard()
+    return _snapshot["body"], time.time() - _snapshot["generated_at"]
+
+async def _refresher():
+    while True:
+        try:
+            await refresh_leaderboard()
+        except Exception as e:
+            print(f"Error refreshing leaderboard: {e}")
+        await asyncio.sleep(LEADERBOARD_REFRESH_INTERVAL)
+
+def start_leaderboard_refresher():
+    """Start the background refresh loop (idempotent)"""
+    global _refresher_task
+    if _refresher_task is None:
+        _refresher_task = asyncio.create_task(_refresher())
+
+async def stop_leaderboard_refresher():
+    global _refresher_task
+    if _refresher_task is not None:
+        _refresher_task.cancel()
+        try:
+            await _refresher_task
+        except asyncio.CancelledError:
+            pass
+        _refresher_task = None
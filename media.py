@@ -0,0 +1,104 @@
+"""Reuse Telegram file ids for the bot's images.
+
+The first time an asset is sent, Telegram fetches or receives the file
+and returns a file_id; every later send passes that id instead, so
+Telegram doesn't download the image again and the bot doesn't wait on
+the external host. Ids are stored in the media_files table together
+with a fingerprint of the asset's source (the URL, or a hash of a local
+file), so changing the asset invalidates its stored id automatically.
+"""
+import hashlib
+from pathlib import Path
+
+from telegram.error import BadRequest
+
+from config import LOG_CHAT_ID, WELCOME_BANNER
+from telemetry import register_cache
+from async_db import get_media_files, save_media_file, delete_media_file
+
+# Asset name -> URL or local file path
+MEDIA_ASSETS = {
+    "welcome_banner": WELCOME_BANNER,
+}
+
+# Asset name -> file_id valid for the asset's current source
+_file_ids = {}
+_media_stats = {"reused": 0, "uploaded": 0, "invalidated": 0}
+
+def _is_url(source: str) -> bool:
+    return source.startswith(("http://", "https://"))
+
+def _fingerprint(source: str) -> str:
+    if _is_url(source):
+        return source
+    return "sha256:" + hashlib.sha256(Path(source).read_bytes()).hexdigest()
+
+def _upload(source: str):
+    return source if _is_url(source) else Path(source)
+
+async def _remember(name: str, message):
+    if message is None or not message.photo:
+        return
+    file_id = message.photo[-1].file_id
+    _file_ids[name] = file_id
+    _media_stats["uploaded"] += 1
+    await save_media_file(name, _fingerprint(MEDIA_ASSETS[name]), file_id)
+
+async def load_media():
+    """Load stored file ids, dropping those whose asset has changed since"""
+    stored = await get_media_files()
+    for name, source in MEDIA_ASSETS.items():
+        row = stored.get(name)
+        if row is None:
+            continue
+        fingerprint, file_id = row
+        if fingerprint == _fingerprint(source):
+            _file_ids[name] = file_id
+        else:
+            await invalidate_media(name)
+
+async def warm_up_media(bot, chat_id=LOG_CHAT_ID):
+    """Load stored ids and upload any asset without one to chat_id (the admin chat)"""
+    await load_media()
+    if not chat_id:
+        return  # the first user-facing send will upload instead
+    for name, source in MEDIA_ASSETS.items():
+        if name in _file_ids:
+            continue
+        try:
+            message = await bot.send_photo(chat_id=chat_id, photo=_upload(source), disable_notification=True)
+            await _remember(name, message)
+            await message.delete()
+        except Exception as e:
+            print(f"Error warming up media '{name}': {e}")
+
+async def invalidate_media(name: str):
+    """Forget an asset's file_id, e.g. after replacing the image; the next send uploads it"""
+    _file_ids.pop(name, None)
+    _media_stats["invalidated"] += 1
+    await delete_media_file(name)
+
+async def reply_photo(message, name: str, **kwargs):
+    """message.reply_photo() for a registered asset, reusing its file_id when known"""
+    file_id = _file_ids.get(name)
+    if file_id is not None:
+        try:
+            sent = await message.reply_photo(photo=file_id, **kwargs)
+            _media_stats["reused"] += 1
+            return sent
+        except BadRequest as e:
+            if "file" not in str(e).lower():
+                raise
+            # Telegram no longer accepts the id; upload the asset again
+            await invalidate_media(name)
+
+    sent = await message.reply_photo(photo=_upload(MEDIA_ASSETS[name]), **kwargs)
+    await _remember(name, sent)
+    return sent
+
+def get_media_stats() -> dict:
+    stats = dict(_media_stats)
+    stats["cached"] = len(_file_ids)
+    return stats
+
+register_cache("media_file_id", get_media_stats, hits=("reused",), misses=("uploaded",))
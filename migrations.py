@@ -0,0 +1,342 @@
+"""Versioned schema migrations for zolt.db.
+
+Each migration runs once, in order, inside its own transaction and is
+recorded in the schema_version table. Operators can inspect and apply
+them from the command line:
+
+    python migrations.py status
+    python migrations.py apply
+"""
+import argparse
+import sqlite3
+
+def _baseline(conn: sqlite3.Connection):
+    """Tables as they existed before versioned migrations"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            public_key TEXT,
+            encrypted_private_key TEXT,
+            language TEXT DEFAULT 'en',
+            is_verified INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS deposits (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            amount REAL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS pending_withdrawals (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            amount REAL,
+            address TEXT,
+            reason TEXT,
+            status TEXT DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            processed_at TIMESTAMP NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_bonuses (
+            user_id INTEGER PRIMARY KEY,
+            bonus_balance REAL DEFAULT 0,
+            total_rolled REAL DEFAULT 0,
+            required_rollover REAL DEFAULT 0,
+            is_converted INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS referrals (
+            user_id INTEGER PRIMARY KEY,
+            referral_code TEXT UNIQUE,
+            referred_by INTEGER NULL,
+            total_deposits REAL DEFAULT 0,
+            referral_earnings REAL DEFAULT 0,
+            referral_count INTEGER DEFAULT 0,
+            tier_level INTEGER DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Databases created by very early builds lack these columns
+    columns = [column[1] for column in conn.execute("PRAGMA table_info(users)")]
+    if 'language' not in columns:
+        conn.execute("ALTER TABLE users ADD COLUMN language TEXT DEFAULT 'en'")
+    if 'is_verified' not in columns:
+        conn.execute('ALTER TABLE users ADD COLUMN is_verified INTEGER DEFAULT 0')
+
+def _ledger(conn: sqlite3.Connection):
+    """Double-entry ledger tables, opened with the balances recorded so far"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS ledger_transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            reference TEXT UNIQUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS ledger_entries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tx_id INTEGER NOT NULL REFERENCES ledger_transactions (id),
+            account TEXT NOT NULL,
+            amount INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_ledger_entries_account ON ledger_entries (account, id)')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS ledger_balances (
+            account TEXT PRIMARY KEY,
+            user_id INTEGER,
+            balance INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_ledger_balances_user ON ledger_balances (user_id) WHERE user_id IS NOT NULL')
+
+    # Opening balances from the per-feature tables (amounts in billionths)
+    openings = {}
+    sources = [
+        ('wallet', 'external:chain', 'SELECT user_id, SUM(amount) FROM deposits GROUP BY user_id'),
+        ('wallet', 'external:chain', "SELECT user_id, -SUM(amount) FROM pending_withdrawals WHERE status = 'approved' GROUP BY user_id"),
+        ('bonus', 'house:bonus', 'SELECT user_id, bonus_balance FROM user_bonuses WHERE is_converted = 0'),
+        ('referral', 'house:referral', 'SELECT user_id, referral_earnings FROM referrals'),
+    ]
+    for kind, counter, sql in sources:
+        for user_id, amount in conn.execute(sql):
+            key = (f"user:{user_id}:{kind}", user_id, counter)
+            openings[key] = openings.get(key, 0) + int(round((amount or 0) * 10**9))
+
+    for (account, user_id, counter), amount in openings.items():
+        if not amount:
+            continue
+        tx_id = conn.execute("INSERT INTO ledger_transactions (kind) VALUES ('opening_balance')").lastrowid
+        for entry_account, entry_user, entry_amount in ((account, user_id, amount), (counter, None, -amount)):
+            conn.execute('INSERT INTO ledger_entries (tx_id, account, amount) VALUES (?, ?, ?)', (tx_id, entry_account, entry_amount))
+            conn.execute('''
+                INSERT INTO ledger_balances (account, user_id, balance) VALUES (?, ?, ?)
+                ON CONFLICT(account) DO UPDATE SET balance = balance + excluded.balance
+            ''', (entry_account, entry_user, entry_amount))
+
+def _referral_codes(conn: sqlite3.Connection):
+    """Move existing codes to legacy_code and give every row its derived code"""
+    from referral_codes import encode_referral_code
+
+    conn.execute('ALTER TABLE referrals ADD COLUMN legacy_code TEXT')
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_referrals_legacy_code ON referrals (legacy_code) WHERE legacy_code IS NOT NULL')
+    rows = conn.execute('SELECT user_id FROM referrals').fetchall()
+    conn.executemany(
+        'UPDATE referrals SET legacy_code = referral_code, referral_code = ? WHERE user_id = ?',
+        [(encode_referral_code(user_id), user_id) for user_id, in rows],
+    )
+
+def _metric_rollups(conn: sqlite3.Connection):
+    """Rollup table, backfilled with hour and day buckets and the pending gauge"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS metric_rollups (
+            bucket TEXT NOT NULL,
+            start TEXT NOT NULL,
+            metric TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            total REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (bucket, start, metric)
+        ) WITHOUT ROWID
+    ''')
+    sources = [
+        ('deposits', 'deposits', 'created_at', 'amount', '1'),
+        ('new_users', 'users', 'created_at', '0', '1'),
+        ('withdrawals_requested', 'pending_withdrawals', 'created_at', 'amount', '1'),
+        ('withdrawals_approved', 'pending_withdrawals', 'processed_at', 'amount', "status = 'approved'"),
+        ('withdrawals_rejected', 'pending_withdrawals', 'processed_at', 'amount', "status = 'rejected'"),
+    ]
+    for metric, table, column, amount, where in sources:
+        for bucket, start in (('hour', f"strftime('%Y-%m-%d %H:00', {column})"), ('day', f"date({column})")):
+            conn.execute(f'''
+                INSERT INTO metric_rollups (bucket, start, metric, count, total)
+                SELECT '{bucket}', {start}, '{metric}', COUNT(*), COALESCE(SUM({amount}), 0)
+                FROM {table}
+                WHERE {column} IS NOT NULL AND {where}
+                GROUP BY 2
+            ''')
+    conn.execute('''
+        INSERT INTO metric_rollups (bucket, start, metric, count, total)
+        SELECT 'gauge', '', 'pending_withdrawals', COUNT(*), COALESCE(SUM(amount), 0)
+        FROM pending_withdrawals
+        WHERE status = 'pending'
+    ''')
+
+# (version, name, SQL script or callable taking the connection)
+MIGRATIONS = [
+    (1, "baseline schema", _baseline),
+    (2, "hot query indexes", '''
+        CREATE INDEX IF NOT EXISTS idx_deposits_user_amount
+            ON deposits (user_id, amount);
+        CREATE INDEX IF NOT EXISTS idx_pending_withdrawals_queue
+            ON pending_withdrawals (created_at, user_id, amount, address, reason, status)
+            WHERE status = 'pending';
+        CREATE INDEX IF NOT EXISTS idx_users_wallet
+            ON users (public_key, language)
+            WHERE public_key IS NOT NULL;
+    '''),
+    (3, "telegram media file ids", '''
+        CREATE TABLE IF NOT EXISTS media_files (
+            name TEXT PRIMARY KEY,
+            source TEXT NOT NULL,
+            file_id TEXT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    '''),
+    (4, "double-entry ledger", _ledger),
+    (5, "deposit indexer", '''
+        ALTER TABLE deposits ADD COLUMN signature TEXT;
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_deposits_signature
+            ON deposits (signature)
+            WHERE signature IS NOT NULL;
+        CREATE TABLE IF NOT EXISTS wallet_cursors (
+            public_key TEXT PRIMARY KEY,
+            last_signature TEXT NOT NULL,
+            last_slot INTEGER,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    '''),
+    (6, "derived referral codes", _referral_codes),
+    (7, "referral rollups", '''
+        CREATE TABLE IF NOT EXISTS referral_daily (
+            referrer_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            deposits INTEGER NOT NULL DEFAULT 0,
+            deposit_volume REAL NOT NULL DEFAULT 0,
+            earnings REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (referrer_id, day)
+        ) WITHOUT ROWID;
+        INSERT OR IGNORE INTO referral_daily (referrer_id, day, deposits, earnings)
+            SELECT b.user_id, date(t.created_at), COUNT(*), SUM(e.amount) / 1e9
+            FROM ledger_transactions t
+            JOIN ledger_entries e ON e.tx_id = t.id
+            JOIN ledger_balances b ON b.account = e.account
+            WHERE t.kind = 'referral_earning' AND b.user_id IS NOT NULL
+            GROUP BY b.user_id, date(t.created_at);
+        CREATE INDEX IF NOT EXISTS idx_referrals_leaderboard
+            ON referrals (referral_earnings DESC, user_id)
+            WHERE referral_earnings > 0;
+    '''),
+    (8, "withdrawal queue keyset index", '''
+        DROP INDEX IF EXISTS idx_pending_withdrawals_queue;
+        CREATE INDEX IF NOT EXISTS idx_pending_withdrawals_pending
+            ON pending_withdrawals (id, user_id, amount, address, reason, created_at)
+            WHERE status = 'pending';
+    '''),
+    (9, "metric rollups", _metric_rollups),
+    (10, "database profile snapshots", '''
+        CREATE TABLE IF NOT EXISTS db_profile (
+            process TEXT NOT NULL,
+            function TEXT NOT NULL,
+            calls INTEGER NOT NULL,
+            total_seconds REAL NOT NULL,
+            max_seconds REAL NOT NULL,
+            p99_seconds REAL NOT NULL,
+            rows INTEGER NOT NULL,
+            slow INTEGER NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (process, function)
+        ) WITHOUT ROWID;
+    '''),
+    # Approved withdrawals are in flight until the indexer sees the payout
+    # leave the wallet; ones approved before this are taken as paid
+    (11, "withdrawal payouts", '''
+        ALTER TABLE pending_withdrawals ADD COLUMN payout_signature TEXT;
+        ALTER TABLE pending_withdrawals ADD COLUMN payout_landed_at TIMESTAMP NULL;
+        UPDATE pending_withdrawals SET payout_landed_at = processed_at WHERE status = 'approved';
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_pending_withdrawals_payout_signature
+            ON pending_withdrawals (payout_signature)
+            WHERE payout_signature IS NOT NULL;
+        CREATE INDEX IF NOT EXISTS idx_pending_withdrawals_in_flight
+            ON pending_withdrawals (user_id, address, id, amount)
+            WHERE status = 'approved' AND payout_landed_at IS NULL;
+    '''),
+]
+
+def _ensure_version_table(conn: sqlite3.Connection):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+def current_version(conn: sqlite3.Connection) -> int:
+    """Highest applied migration version (0 for a fresh database)"""
+    _ensure_version_table(conn)
+    row = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()
+    return row[0] or 0
+
+def pending_migrations(conn: sqlite3.Connection):
+    """Migrations that have not been applied yet, in order"""
+    version = current_version(conn)
+    return [m for m in MIGRATIONS if m[0] > version]
+
+def apply_migrations(conn: sqlite3.Connection, target: int = None):
+    """Apply pending migrations up to target (default: latest). Returns applied versions."""
+    applied = []
+    for version, name, step in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if target is not None and version > target:
+            break
+        # IMMEDIATE takes the write lock up front so the bot and the API
+        # starting together cannot both apply the same migration.
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if version <= current_version(conn):
+                conn.rollback()
+                continue
+            if callable(step):
+                step(conn)
+            else:
+                for statement in step.split(';'):
+                    if statement.strip():
+                        conn.execute(statement)
+            conn.execute('INSERT INTO schema_version (version, name) VALUES (?, ?)', (version, name))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+    return applied
+
+def main():
+    import database
+
+    parser = argparse.ArgumentParser(description="Inspect and apply zolt.db schema migrations")
+    parser.add_argument("--db", default=database.DB_NAME, help="database file (default: %(default)s)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="show applied and pending migrations")
+    apply_parser = sub.add_parser("apply", help="apply pending migrations")
+    apply_parser.add_argument("--target", type=int, default=None, help="stop after this version")
+    args = parser.parse_args()
+
+    database.DB_NAME = args.db
+    conn = database.get_connection()
+
+    if args.command == "status":
+        _ensure_version_table(conn)
+        applied = {row[0]: row[1] for row in conn.execute('SELECT version, applied_at FROM schema_version')}
+        for version, name, _ in MIGRATIONS:
+            state = f"applied {applied[version]}" if version in applied else "pending"
+            print(f"{version:>4}  {name:<40} {state}")
+        print(f"Current version: {current_version(conn)}")
+    elif args.command == "apply":
+        applied = apply_migrations(conn, args.target)
+        if applied:
+            print(f"Applied migrations: {', '.join(str(v) for v in applied)}")
+        else:
+            print("Database is up to date")
+
+if __name__ == "__main__":
+    main()
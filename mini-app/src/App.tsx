@@ -278,9 +278,29 @@ const App: React.FC = () => {
   useEffect(() => {
     if (wallet?.publicKey) {
       refreshRealBalance();
-      // Refresh every 30 seconds
-      const interval = setInterval(refreshRealBalance, 30000);
-      return () => clearInterval(interval);
+
+      // Balance changes are pushed over /ws/balance; poll every 30 seconds
+      // only while the socket is unavailable
+      const publicKey = wallet.publicKey;
+      const apiUrl = import.meta.env.VITE_API_BASE_URL || 'http://localhost:8001';
+      const telegramData = localStorage.getItem('surfsol_telegram_data') || '';
+      let interval: ReturnType<typeof setInterval> | null = null;
+      const startPolling = () => {
+        if (!interval) interval = setInterval(refreshRealBalance, 30000);
+      };
+
+      const socket = new WebSocket(`${apiUrl.replace(/^http/, 'ws')}/ws/balance?init_data=${encodeURIComponent(telegramData)}`);
+      socket.onmessage = (event) => {
+        const data = JSON.parse(event.data);
+        if (data.public_key === publicKey) setRealBalance(data.balance);
+      };
+      socket.onclose = startPolling;
+
+      return () => {
+        socket.onclose = null;
+        socket.close();
+        if (interval) clearInterval(interval);
+      };
     }
   }, [wallet?.publicKey, refreshRealBalance]);
 
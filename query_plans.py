@@ -0,0 +1,146 @@
+"""Query-plan regression check for the queries in database.py.
+
+Runs EXPLAIN QUERY PLAN on every statement database.py executes (read
+from its source, so nothing has to be kept in sync by hand) and exits
+non-zero when one of them falls back to a full table scan that isn't
+listed in EXPECTED_SCANS. Point it at a scratch database and pass --seed
+to load synthetic rows (and ANALYZE) first, so the planner works from
+realistic statistics (--seed refuses to touch the live database):
+
+    python query_plans.py --db /tmp/plans.db --seed 2000000
+"""
+import argparse
+import ast
+import inspect
+import os
+import random
+import re
+import sys
+
+# Functions whose statements read a whole table on purpose -> why
+EXPECTED_SCANS = {
+    "get_wallet_cursors": "the indexer loads every wallet's cursor once per pass",
+    "get_media_files": "one row per bot image asset",
+    "check_ledger": "the audit sums every account",
+    "save_db_profile": "one row per profiled function per process",
+    "get_db_profile": "one row per profiled function per process",
+}
+
+def _params(sql: str):
+    """NULL parameters for every placeholder (plans don't depend on the values)"""
+    code = re.sub(r"'[^']*'", "''", sql)
+    names = re.findall(r"(?<![:\w]):(\w+)", code)
+    if names:
+        return dict.fromkeys(names)
+    return (None,) * code.count("?")
+
+def database_queries():
+    """(name, SQL, params) for every literal statement database.py executes.
+
+    Read from database.py's source, so new or changed queries are checked
+    without being listed anywhere. Names are the enclosing function, with
+    #2, #3... for its later statements.
+    """
+    import database
+
+    tree = ast.parse(inspect.getsource(database))
+    queries = []
+    for function in tree.body:
+        if not isinstance(function, ast.FunctionDef):
+            continue
+        statements = [
+            node.args[0].value for node in ast.walk(function)
+            if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+            and node.func.attr in ("execute", "executemany") and node.args
+            and isinstance(node.args[0], ast.Constant) and isinstance(node.args[0].value, str)
+        ]
+        for i, sql in enumerate(statements):
+            name = function.name if i == 0 else f"{function.name}#{i + 1}"
+            queries.append((name, sql, _params(sql)))
+    return queries
+
+# A table step with no "USING ... INDEX" visits every row; automatic
+# indexes are rebuilt from a full scan on every execution.
+_FULL_SCAN = re.compile(r'^(SCAN|SEARCH) \w+$|USING AUTOMATIC')
+
+def explain(conn, sql, params=()):
+    """Return the EXPLAIN QUERY PLAN detail lines for one query"""
+    return [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params)]
+
+def full_scans(conn, queries):
+    """Return (name, plan detail) for every query that unexpectedly scans a whole table"""
+    offenders = []
+    for name, sql, params in queries:
+        if name.split("#")[0] in EXPECTED_SCANS:
+            continue
+        for detail in explain(conn, sql, params):
+            if _FULL_SCAN.match(detail):
+                offenders.append((name, detail))
+    return offenders
+
+def seed(conn, users: int):
+    """Fill the database with synthetic rows and refresh planner statistics"""
+    rng = random.Random(42)
+    with conn:
+        conn.executemany(
+            'INSERT OR IGNORE INTO users (user_id, public_key, encrypted_private_key, language, is_verified) VALUES (?, ?, ?, ?, 1)',
+            ((i, f"pk{i}" if i % 4 else None, "key", "en" if i % 3 else "es") for i in range(1, users + 1)),
+        )
+        conn.executemany(
+            'INSERT INTO deposits (user_id, amount) VALUES (?, ?)',
+            ((rng.randint(1, users), round(rng.uniform(1, 500), 2)) for _ in range(users * 2)),
+        )
+        conn.executemany(
+            'INSERT INTO pending_withdrawals (user_id, amount, address, reason, status) VALUES (?, ?, ?, ?, ?)',
+            ((rng.randint(1, users), 1.0, "addr", "winnings", "pending" if rng.random() < 0.05 else "approved")
+             for _ in range(users // 2)),
+        )
+        # Approved payouts have almost all landed on chain
+        conn.execute('''
+            UPDATE pending_withdrawals SET payout_landed_at = CURRENT_TIMESTAMP
+            WHERE status = 'approved' AND id % 50 != 0
+        ''')
+        conn.executemany(
+            'INSERT OR IGNORE INTO user_bonuses (user_id, bonus_balance, required_rollover) VALUES (?, 2, 120)',
+            ((i,) for i in range(1, users + 1, 2)),
+        )
+        conn.executemany(
+            'INSERT OR IGNORE INTO referrals (user_id, referral_code) VALUES (?, ?)',
+            ((i, f"R{i:07d}") for i in range(1, users + 1)),
+        )
+    conn.execute('ANALYZE')
+
+def main():
+    import database
+
+    parser = argparse.ArgumentParser(description="Fail when a hot database.py query does a full table scan")
+    parser.add_argument("--db", default=database.DB_NAME, help="database file (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, metavar="USERS",
+                        help="seed this many synthetic users first (needs --db: never the live database)")
+    args = parser.parse_args()
+    if args.seed and os.path.abspath(args.db) == os.path.abspath(database.DB_NAME):
+        parser.error("--seed writes synthetic rows; pass --db with a scratch database file")
+
+    database.DB_NAME = args.db
+    database.init_db()
+    conn = database.get_connection()
+    if args.seed:
+        print(f"Seeding {args.seed} users...")
+        seed(conn, args.seed)
+
+    queries = database_queries()
+    for name, sql, params in queries:
+        plan = explain(conn, sql, params)
+        if plan:
+            print(f"{name}: {' | '.join(plan)}")
+
+    offenders = full_scans(conn, queries)
+    if offenders:
+        print("\nFull table scans:")
+        for name, detail in offenders:
+            print(f"  {name}: {detail}")
+        sys.exit(1)
+    print("\nNo full table scans")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Periodic on-chain reconciliation of the ledger's wallet accounts.
+
+Hot paths read wallet balances from the ledger instead of the RPC. This
+loop keeps those balances honest: it fetches every user wallet's chain
+balance in bulk and posts the difference (fees, transfers the ledger
+never saw) as a reconciliation transaction.
+
+Deposits and payouts are the deposit indexer's to record, so each run
+snapshots the balances between reading the indexer's cursors and running
+an indexer pass. Only wallets the pass found nothing new on (cursor
+unchanged, no error) are reconciled; for the rest the snapshot may or
+may not include what was just indexed, so they wait for the next run.
+Approved payouts not yet seen leaving the wallet are taken off the chain
+balance, since the ledger already debited them.
+"""
+import asyncio
+import time
+
+from config import LEDGER_RECONCILE_INTERVAL
+from async_db import get_all_users, get_ledger_balance, get_wallet_cursors, reconcile_wallet_balances
+from deposit_indexer import index_deposits
+from solana_utils import get_balance, get_balances
+
+_reconcile_stats = {"runs": 0, "last_run_at": None, "last_checked": 0, "last_held_back": 0, "last_adjusted": 0, "last_drift": 0.0}
+_reconciler_task = None
+
+async def get_wallet_balance(user_id: int, public_key: str, fresh: bool = False) -> float:
+    """Wallet balance from the ledger; the RPC is only asked for wallets not reconciled yet.
+
+    fresh=True (for withdrawals) always asks the chain and returns the
+    lower of the chain and ledger balances, so nothing recorded in the
+    ledger can make more available than the wallet actually holds.
+    """
+    balance = await get_ledger_balance(user_id)
+    if fresh:
+        on_chain = await get_balance(public_key, fresh=True)
+        return on_chain if balance is None else min(on_chain, balance)
+    if balance is None:
+        balance = await get_balance(public_key)
+    return balance
+
+async def reconcile_ledger() -> list:
+    """Compare every fully indexed wallet account with the chain; returns [(user_id, drift)]"""
+    users = [user for user in await get_all_users() if user.get('public_key')]
+    cursors = await get_wallet_cursors()
+    balances = await get_balances([user['public_key'] for user in users], fresh=True, skip_failed=True)
+    # Whatever landed before the snapshot is recorded once this pass is done
+    failed = set()
+    await index_deposits(users, failed)
+    indexed = await get_wallet_cursors()
+    observed = {
+        user['user_id']: balances[user['public_key']]
+        for user in users
+        if user['public_key'] in balances and user['public_key'] not in failed
+        and indexed.get(user['public_key']) == cursors.get(user['public_key'])
+    }
+    adjustments = await reconcile_wallet_balances(observed)
+
+    _reconcile_stats["runs"] += 1
+    _reconcile_stats["last_run_at"] = time.time()
+    _reconcile_stats["last_checked"] = len(observed)
+    _reconcile_stats["last_held_back"] = len(balances) - len(observed)
+    _reconcile_stats["last_adjusted"] = len(adjustments)
+    _reconcile_stats["last_drift"] = round(sum(abs(drift) for _, drift in adjustments), 9)
+    return adjustments
+
+async def _reconciler():
+    while True:
+        try:
+            await reconcile_ledger()
+        except Exception as e:
+            print(f"Error reconciling ledger: {e}")
+        await asyncio.sleep(LEDGER_RECONCILE_INTERVAL)
+
+def start_reconciler():
+    """Start the background reconciliation loop (idempotent)"""
+    global _reconciler_task
+    if _reconciler_task is None:
+        _reconciler_task = asyncio.create_task(_reconciler())
+
+async def stop_reconciler():
+    global _reconciler_task
+    if _reconciler_task is not None:
+        _reconciler_task.cancel()
+        try:
+            await _reconciler_task
+        except asyncio.CancelledError:
+            pass
+        _reconciler_task = None
+
+def get_reconcile_stats() -> dict:
+    return dict(_reconcile_stats)
@@ -0,0 +1,76 @@
+"""Referral codes derived from the user id.
+
+A code is the user id run through a keyed 40-bit permutation (a small
+Feistel network) and written as 8 base32 characters. Ids too large for
+that (Telegram ids run to 52 bits) get a 12 character code from a 60-bit
+permutation instead. Distinct ids give distinct codes, so generating one
+needs no uniqueness check, and a code decodes straight back to its
+owner's id. The key keeps codes from being guessable from ids.
+
+Codes issued before this scheme (8 uppercase letters/digits) are kept in
+referrals.legacy_code and still resolve through a lookup.
+"""
+import hashlib
+
+from config import FERNET_KEY, REFERRAL_CODE_KEY
+
+ALPHABET = "abcdefghijklmnopqrstuvwxyz234567"
+CODE_LENGTH = 8
+# 5 bits per character; ids of 2^40 and up get a long code
+ID_BITS = 5 * CODE_LENGTH
+LONG_CODE_LENGTH = 12
+LONG_ID_BITS = 5 * LONG_CODE_LENGTH
+ROUNDS = 4
+
+_INDEX = {char: i for i, char in enumerate(ALPHABET)}
+
+# Per-round (addend, odd multiplier) pairs for a multiply-shift round function
+_seed = hashlib.sha256(f"referral:{REFERRAL_CODE_KEY or FERNET_KEY}".encode()).digest()
+_ROUND_KEYS = [
+    (int.from_bytes(block[:8], "big"), int.from_bytes(block[8:], "big") | 1)
+    for block in (hashlib.sha256(_seed + bytes([i])).digest()[:16] for i in range(ROUNDS))
+]
+
+def _round(i: int, half: int, half_bits: int) -> int:
+    addend, multiplier = _ROUND_KEYS[i]
+    return ((((half + addend) * multiplier) & 0xFFFFFFFFFFFFFFFF) >> (64 - half_bits))
+
+def _permute(value: int, bits: int) -> int:
+    half_bits = bits // 2
+    left, right = value >> half_bits, value & ((1 << half_bits) - 1)
+    for i in range(ROUNDS):
+        left, right = right, left ^ _round(i, right, half_bits)
+    return (left << half_bits) | right
+
+def _unpermute(value: int, bits: int) -> int:
+    half_bits = bits // 2
+    left, right = value >> half_bits, value & ((1 << half_bits) - 1)
+    for i in reversed(range(ROUNDS)):
+        left, right = right ^ _round(i, left, half_bits), left
+    return (left << half_bits) | right
+
+def encode_referral_code(user_id: int) -> str:
+    """The user's referral code"""
+    if not 0 < user_id < 1 << LONG_ID_BITS:
+        raise ValueError(f"user id {user_id} does not fit in a referral code")
+    bits = ID_BITS if user_id < 1 << ID_BITS else LONG_ID_BITS
+    value = _permute(user_id, bits)
+    return "".join(ALPHABET[(value >> shift) & 31] for shift in range(bits - 5, -1, -5))
+
+def decode_referral_code(code: str):
+    """User id a code belongs to, or None if it isn't a code of this scheme"""
+    code = code.lower()
+    if len(code) not in (CODE_LENGTH, LONG_CODE_LENGTH):
+        return None
+    value = 0
+    for char in code:
+        index = _INDEX.get(char)
+        if index is None:
+            return None
+        value = (value << 5) | index
+    bits = 5 * len(code)
+    user_id = _unpermute(value, bits)
+    # An id that fits a short code has no long one
+    if bits == LONG_ID_BITS and user_id < 1 << ID_BITS:
+        return None
+    return user_id or None
@@ -1,12 +1,68 @@
+import asyncio
+import time
+from collections import OrderedDict
 from solders.keypair import Keypair
 from solders.pubkey import Pubkey
 from solana.rpc.async_api import AsyncClient
 from cryptography.fernet import Fernet
 import base58
-from config import FERNET_KEY, RPC_URL, HOUSE_WALLET_ADDRESS
+from telemetry import RPC_REQUEST_SECONDS, RPC_ERRORS, register_cache
+from config import FERNET_KEY, RPC_URL, HOUSE_WALLET_ADDRESS, RPC_TIMEOUT, RPC_POOL_SIZE, RPC_KEEPALIVE_EXPIRY, RPC_BATCH_CONCURRENCY, BALANCE_CACHE_TTL, BALANCE_CACHE_SIZE
 
 cipher_suite = Fernet(FERNET_KEY.encode())
 
+# Process-wide RPC client; its keep-alive pool is reused across calls
+_rpc_client = None
+# Request type (e.g. GetBalance) -> (latency histogram, error counter) children
+_rpc_metrics = {}
+
+def _instrument(client: AsyncClient):
+    """Time every call the client's provider makes, labelled by RPC method"""
+    provider = client._provider
+    make_request = provider.make_request
+
+    async def timed_make_request(body, parser):
+        metrics = _rpc_metrics.get(type(body))
+        if metrics is None:
+            name = type(body).__name__
+            method = name[:1].lower() + name[1:]
+            metrics = _rpc_metrics[type(body)] = (RPC_REQUEST_SECONDS.labels(method), RPC_ERRORS.labels(method))
+        start = time.perf_counter()
+        try:
+            return await make_request(body, parser)
+        except Exception:
+            metrics[1].inc()
+            raise
+        finally:
+            metrics[0].observe(time.perf_counter() - start)
+
+    provider.make_request = timed_make_request
+
+def get_rpc_client() -> AsyncClient:
+    """Return the shared RPC client, creating it on first use"""
+    global _rpc_client
+    if _rpc_client is None:
+        _rpc_client = AsyncClient(
+            RPC_URL,
+            timeout=RPC_TIMEOUT,
+            max_connections=RPC_POOL_SIZE,
+            max_keepalive_connections=RPC_POOL_SIZE,
+            keepalive_expiry=RPC_KEEPALIVE_EXPIRY,
+        )
+        _instrument(_rpc_client)
+    return _rpc_client
+
+async def start_rpc_client():
+    """Open the shared RPC client at startup so the first request doesn't pay for it"""
+    get_rpc_client()
+
+async def close_rpc_client():
+    """Close the shared RPC client and its pooled connections"""
+    global _rpc_client
+    if _rpc_client is not None:
+        await _rpc_client.close()
+        _rpc_client = None
+
 def generate_keypair():
     kp = Keypair()
     return kp
@@ -17,15 +73,130 @@ def encrypt_key(private_key_bytes: bytes) -> str:
 def decrypt_key(encrypted_str: str) -> bytes:
     return cipher_suite.decrypt(encrypted_str.encode())
 
-async def get_balance(public_key_str: str) -> float:
-    async with AsyncClient(RPC_URL) as client:
+# Balance cache: public key -> (expires_at, balance), least recently used first
+_balance_cache = OrderedDict()
+# Public key -> in-flight getBalance task shared by concurrent callers
+_balance_inflight = {}
+_balance_cache_stats = {"hits": 0, "misses": 0, "coalesced": 0}
+
+def _cache_get(public_key_str: str):
+    entry = _balance_cache.get(public_key_str)
+    if entry is None:
+        return None
+    expires_at, balance = entry
+    if expires_at < time.monotonic():
+        del _balance_cache[public_key_str]
+        return None
+    _balance_cache.move_to_end(public_key_str)
+    return balance
+
+def _cache_put(public_key_str: str, balance: float):
+    _balance_cache[public_key_str] = (time.monotonic() + BALANCE_CACHE_TTL, balance)
+    _balance_cache.move_to_end(public_key_str)
+    while len(_balance_cache) > BALANCE_CACHE_SIZE:
+        _balance_cache.popitem(last=False)
+
+def remember_balance(public_key_str: str, balance: float):
+    """Store a balance learned elsewhere (e.g. a websocket notification)"""
+    _cache_put(public_key_str, balance)
+
+def invalidate_balance(public_key_str: str):
+    """Drop a cached balance, e.g. after a transfer touching the wallet"""
+    _balance_cache.pop(public_key_str, None)
+
+def get_balance_cache_stats() -> dict:
+    """Hit/miss counters for monitoring"""
+    stats = dict(_balance_cache_stats)
+    lookups = stats["hits"] + stats["misses"] + stats["coalesced"]
+    stats["size"] = len(_balance_cache)
+    stats["hit_ratio"] = round((stats["hits"] + stats["coalesced"]) / lookups, 4) if lookups else 0.0
+    return stats
+
+register_cache("balance", get_balance_cache_stats, hits=("hits", "coalesced"))
+
+async def _fetch_balance(public_key_str: str) -> float:
+    response = await get_rpc_client().get_balance(Pubkey.from_string(public_key_str))
+    balance = response.value / 10**9
+    _cache_put(public_key_str, balance)
+    return balance
+
+async def get_balance(public_key_str: str, fresh: bool = False) -> float:
+    """Wallet balance in SOL, served from a short TTL cache.
+
+    Pass fresh=True when the caller must see the current on-chain value
+    (e.g. validating a withdrawal). Concurrent lookups of the same key
+    share one RPC call either way.
+    """
+    if not fresh:
+        balance = _cache_get(public_key_str)
+        if balance is not None:
+            _balance_cache_stats["hits"] += 1
+            return balance
+
+    task = _balance_inflight.get(public_key_str)
+    if task is not None:
+        _balance_cache_stats["coalesced"] += 1
+    else:
+        _balance_cache_stats["misses"] += 1
+        task = asyncio.ensure_future(_fetch_balance(public_key_str))
+        _balance_inflight[public_key_str] = task
+        task.add_done_callback(lambda _: _balance_inflight.pop(public_key_str, None))
+    try:
+        # shield: one caller being cancelled must not cancel the shared call
+        return await asyncio.shield(task)
+    except Exception as e:
+        print(f"Error fetching balance: {e}")
+        return 0.0
+
+# getMultipleAccounts accepts at most 100 keys per request
+MULTIPLE_ACCOUNTS_LIMIT = 100
+
+async def get_balances(public_key_strs, fresh: bool = False, skip_failed: bool = False) -> dict:
+    """Fetch many balances (SOL) with getMultipleAccounts, 100 keys per request.
+
+    Cached balances are reused (unless fresh=True) and fetched ones are
+    cached. Unknown accounts read as 0.0. Invalid keys and failed chunks
+    also read as 0.0, matching get_balance, or are left out with
+    skip_failed=True.
+    """
+    balances = {}
+    valid = []
+    for key in dict.fromkeys(public_key_strs):
+        cached = None if fresh else _cache_get(key)
+        if cached is not None:
+            _balance_cache_stats["hits"] += 1
+            balances[key] = cached
+            continue
+        _balance_cache_stats["misses"] += 1
         try:
-            pubkey = Pubkey.from_string(public_key_str)
-            response = await client.get_balance(pubkey)
-            return response.value / 10**9
-        except Exception as e:
-            print(f"Error fetching balance: {e}")
-            return 0.0
+            valid.append((key, Pubkey.from_string(key)))
+        except Exception:
+            if not skip_failed:
+                balances[key] = 0.0
+
+    client = get_rpc_client()
+    semaphore = asyncio.Semaphore(RPC_BATCH_CONCURRENCY)
+
+    async def fetch_chunk(chunk):
+        async with semaphore:
+            try:
+                response = await client.get_multiple_accounts([pubkey for _, pubkey in chunk])
+                accounts = response.value
+            except Exception as e:
+                print(f"Error fetching balances: {e}")
+                if not skip_failed:
+                    for key, _ in chunk:
+                        balances[key] = 0.0
+                return
+        for (key, _), account in zip(chunk, accounts):
+            balances[key] = account.lamports / 10**9 if account else 0.0
+            _cache_put(key, balances[key])
+
+    await asyncio.gather(*(
+        fetch_chunk(valid[i:i + MULTIPLE_ACCOUNTS_LIMIT])
+        for i in range(0, len(valid), MULTIPLE_ACCOUNTS_LIMIT)
+    ))
+    return balances
 
 def create_transfer_transaction(user_private_key_bytes: bytes, amount_sol: float):
     # Placeholder for transaction logic
@@ -0,0 +1,75 @@
+"""Telegram Mini App initData verification.
+
+The HMAC secret is derived from BOT_TOKEN once at import, hashes are
+compared in constant time, and recently verified initData strings are
+kept in a small LRU so a client's repeated requests skip the HMAC and
+parsing work entirely.
+"""
+import hashlib
+import hmac
+import json
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qs
+
+from fastapi import HTTPException
+
+from config import BOT_TOKEN, INIT_DATA_CACHE_TTL, INIT_DATA_CACHE_SIZE
+from telemetry import register_cache
+
+# initData older than this is rejected
+INIT_DATA_MAX_AGE = 86400
+
+# Secret key is the HMAC-SHA256 of the bot token with "WebAppData"
+_SECRET_KEY = hmac.new(b"WebAppData", BOT_TOKEN.encode(), hashlib.sha256).digest()
+
+# initData string -> (cached_until, auth_date, user_info)
+_verified = OrderedDict()
+_verified_stats = {"hits": 0, "misses": 0}
+
+def _verify(init_data: str):
+    parsed_data = parse_qs(init_data)
+    hash_str = parsed_data.pop('hash')[0]
+
+    # Sort data alphabetically
+    data_check_string = "\n".join(f"{key}={parsed_data[key][0]}" for key in sorted(parsed_data))
+    calculated_hash = hmac.new(_SECRET_KEY, data_check_string.encode(), hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(calculated_hash, hash_str):
+        raise HTTPException(status_code=401, detail="Invalid data")
+
+    auth_date = int(parsed_data['auth_date'][0])
+    user_info = json.loads(parsed_data['user'][0])
+    return auth_date, user_info
+
+def verify_telegram_data(init_data: str) -> dict:
+    """Verifies the data received from the Telegram Mini App and returns the Telegram user."""
+    now = time.time()
+    entry = _verified.get(init_data)
+    if entry is not None and entry[0] >= now:
+        _verified_stats["hits"] += 1
+        _verified.move_to_end(init_data)
+        auth_date, user_info = entry[1], entry[2]
+    else:
+        _verified_stats["misses"] += 1
+        try:
+            auth_date, user_info = _verify(init_data)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=401, detail=str(e))
+        _verified[init_data] = (now + INIT_DATA_CACHE_TTL, auth_date, user_info)
+        while len(_verified) > INIT_DATA_CACHE_SIZE:
+            _verified.popitem(last=False)
+
+    # Check if data is expired (auth_date older than 24 hours)
+    if now - auth_date > INIT_DATA_MAX_AGE:
+        _verified.pop(init_data, None)
+        raise HTTPException(status_code=401, detail="Data expired")
+    return user_info
+
+def get_init_data_cache_stats() -> dict:
+    stats = dict(_verified_stats)
+    stats["size"] = len(_verified)
+    return stats
+
+register_cache("init_data", get_init_data_cache_stats)
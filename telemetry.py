@@ -0,0 +1,233 @@
+"""Prometheus metrics for the API and the bot.
+
+Metrics are created once at import; recording on a hot path is a bisect
+plus a few integer/float updates on a pre-resolved child, with no locks
+(each metric is written from one thread, and a scrape reading a value
+mid-update is off by one observation at worst). Every process serves its
+own registry in the text exposition format: api.py at /metrics and the
+standalone polling bot on BOT_METRICS_PORT.
+"""
+import bisect
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+_metrics = []
+_collectors = []
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        _metrics.append(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """The child for these label values; keep it around on hot paths"""
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def render(self):
+        lines = self._header()
+        for values, child in list(self._children.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, values)} {_number(child.value)}")
+        return lines
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def render(self):
+        lines = self._header()
+        for values, child in list(self._children.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), list(child.counts)):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, values)} {_number(child.sum)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, values)} {cumulative}")
+        return lines
+
+def register_collector(collect):
+    """Add a callable run at scrape time; it returns [(name, kind, help, [(labels, value)])]"""
+    _collectors.append(collect)
+
+def register_cache(cache: str, get_stats, hits=("hits",), misses=("misses",)):
+    """Export a module's cache counters (read from its stats function at scrape time)"""
+    def collect():
+        stats = get_stats()
+        hit = sum(stats.get(key, 0) for key in hits)
+        miss = sum(stats.get(key, 0) for key in misses)
+        samples = [
+            ("surfsol_cache_lookups_total", "counter", "Cache lookups by result",
+             [({"cache": cache, "result": "hit"}, hit), ({"cache": cache, "result": "miss"}, miss)]),
+            ("surfsol_cache_hit_ratio", "gauge", "Share of cache lookups served from the cache",
+             [({"cache": cache}, hit / (hit + miss) if hit + miss else 0.0)]),
+        ]
+        if "size" in stats:
+            samples.append(("surfsol_cache_entries", "gauge", "Entries currently cached", [({"cache": cache}, stats["size"])]))
+        return samples
+    register_collector(collect)
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in list(_metrics):
+        if metric._children:
+            lines.extend(metric.render())
+    # Collectors may report the same family (e.g. one per cache); group them
+    families = {}
+    for collect in list(_collectors):
+        try:
+            for name, kind, help, samples in collect():
+                family = families.setdefault(name, (kind, help, []))
+                family[2].extend(samples)
+        except Exception as e:
+            print(f"Error collecting metrics: {e}")
+    for name, (kind, help, samples) in families.items():
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            lines.append(f"{name}{_labels(labels.keys(), labels.values())} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "surfsol_http_request_duration_seconds", "API request latency by route",
+    ("method", "route", "status"),
+)
+RPC_REQUEST_SECONDS = Histogram(
+    "surfsol_rpc_request_duration_seconds", "Solana RPC call latency by method", ("method",),
+)
+RPC_ERRORS = Counter("surfsol_rpc_errors_total", "Solana RPC calls that raised, by method", ("method",))
+DB_CALL_SECONDS = Histogram(
+    "surfsol_db_call_duration_seconds", "Time a database.py call spent running on the DB thread",
+    ("function",), buckets=DB_BUCKETS,
+)
+DB_QUEUE_SECONDS = Histogram(
+    "surfsol_db_queue_wait_seconds", "Time a database call waited for the DB thread", buckets=DB_BUCKETS,
+)
+TELEGRAM_REQUEST_SECONDS = Histogram(
+    "surfsol_telegram_request_duration_seconds", "Bot API call latency by method", ("method",),
+)
+TELEGRAM_ERRORS = Counter(
+    "surfsol_telegram_errors_total", "Bot API calls that failed (HTTP error or transport), by method", ("method",),
+)
+
+class RequestMetricsMiddleware:
+    """ASGI middleware timing every HTTP request by its route template"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The route template, not the raw path, so ids don't explode cardinality
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUEST_SECONDS.labels(scope["method"], route, str(status[0])).observe(time.perf_counter() - start)
+
+class _ScrapeHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_metrics_server(host: str, port: int):
+    """Serve /metrics from a daemon thread (for processes without a web app)"""
+    server = ThreadingHTTPServer((host, port), _ScrapeHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
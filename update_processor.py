@@ -0,0 +1,56 @@
+"""Concurrent update processing that keeps each user's updates in order.
+
+With PTB's default processing one slow handler (e.g. an RPC call in the
+wallet screen) holds up every other user. This processor lets updates
+from different users run concurrently while updates from the same user
+are handled one at a time, in the order they arrived, so a double tap
+can't race itself (e.g. generating two wallets).
+"""
+import asyncio
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+# Updates allowed to wait for their user's earlier updates, per running slot
+WAITING_PER_SLOT = 8
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Run up to `max_running` updates at once, one at a time per user.
+
+    PTB's own semaphore (acquired before do_process_update) bounds the
+    updates admitted; the running limit is applied only after an update
+    holds its user's lock, so a user with a backlog can't occupy slots
+    other users could run in.
+    """
+    __slots__ = ("_running", "_user_locks")
+
+    def __init__(self, max_running: int):
+        super().__init__(max_running * WAITING_PER_SLOT)
+        self._running = asyncio.Semaphore(max_running)
+        # User id -> [lock, updates holding or waiting for it]
+        self._user_locks = {}
+
+    async def do_process_update(self, update, coroutine):
+        user = update.effective_user if isinstance(update, Update) else None
+        if user is None:
+            async with self._running:
+                await coroutine
+            return
+
+        entry = self._user_locks.get(user.id)
+        if entry is None:
+            entry = self._user_locks[user.id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0], self._running:
+                await coroutine
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._user_locks[user.id]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
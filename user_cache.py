@@ -0,0 +1,87 @@
+"""Write-through cache of bot user profiles.
+
+Menu handlers only need a user's language, age verification flag and
+wallet, so profiles are kept in a bounded LRU of slotted records. Every
+write the bot makes to a profile goes through this module, which updates
+the database and the cached record together, so reads stay correct
+without a TTL. The API process never changes an existing user row.
+"""
+from collections import OrderedDict
+
+from config import USER_CACHE_SIZE
+from telemetry import register_cache
+import async_db
+
+class UserProfile:
+    __slots__ = ("public_key", "encrypted_private_key", "language", "is_verified")
+
+    def __init__(self, public_key, encrypted_private_key, language, is_verified):
+        self.public_key = public_key
+        self.encrypted_private_key = encrypted_private_key
+        self.language = language
+        self.is_verified = is_verified
+
+# User id -> UserProfile, least recently used first
+_profiles = OrderedDict()
+_profile_stats = {"hits": 0, "misses": 0, "writes": 0}
+
+def _put(user_id: int, profile: UserProfile):
+    _profiles[user_id] = profile
+    _profiles.move_to_end(user_id)
+    while len(_profiles) > USER_CACHE_SIZE:
+        _profiles.popitem(last=False)
+
+async def get_user(user_id: int):
+    """The user's profile, or None if the bot has never seen them"""
+    profile = _profiles.get(user_id)
+    if profile is not None:
+        _profile_stats["hits"] += 1
+        _profiles.move_to_end(user_id)
+        return profile
+
+    _profile_stats["misses"] += 1
+    row = await async_db.get_user(user_id)
+    if row is None:
+        return None  # not cached: the API may create the user at any time
+    profile = UserProfile(row["public_key"], row["encrypted_private_key"], row["language"], row["is_verified"])
+    _put(user_id, profile)
+    return profile
+
+async def add_user(user_id: int, public_key=None, encrypted_private_key=None, language='en'):
+    if await async_db.add_user(user_id, public_key, encrypted_private_key, language):
+        _profile_stats["writes"] += 1
+        _put(user_id, UserProfile(public_key, encrypted_private_key, language, False))
+    else:
+        _profiles.pop(user_id, None)  # already existed; reload on next read
+
+async def update_user_language(user_id: int, language: str):
+    await async_db.update_user_language(user_id, language)
+    profile = _profiles.get(user_id)
+    if profile is not None:
+        _profile_stats["writes"] += 1
+        profile.language = language
+
+async def verify_user(user_id: int):
+    await async_db.verify_user(user_id)
+    profile = _profiles.get(user_id)
+    if profile is not None:
+        _profile_stats["writes"] += 1
+        profile.is_verified = True
+
+async def set_user_wallet(user_id: int, public_key: str, encrypted_private_key: str):
+    await async_db.set_user_wallet(user_id, public_key, encrypted_private_key)
+    profile = _profiles.get(user_id)
+    if profile is not None:
+        _profile_stats["writes"] += 1
+        profile.public_key = public_key
+        profile.encrypted_private_key = encrypted_private_key
+
+def get_user_cache_stats() -> dict:
+    """Hit/miss counters for monitoring"""
+    stats = dict(_profile_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["size"] = len(_profiles)
+    stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+    return stats
+
+register_cache("user_profile", get_user_cache_stats)